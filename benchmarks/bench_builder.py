@@ -0,0 +1,118 @@
+"""
+Wall time, peak traced memory and live allocations of building /write
+bodies from 1M rows of a 5-field, 3-tag measurement, before (the original
+bulk_save path: one Measurement instance per row, each line concatenated
+to a single `str_points` body) and after (rows encoded into
+LineProtocolBuilder batches, sent as a memoryview).
+
+Allocations are the blocks still traced by tracemalloc when the largest
+body is sent, the moment memory peaks. Time is measured on a separate,
+untraced run.
+
+    python benchmarks/bench_builder.py [nb_points] [batch_size]
+"""
+import sys
+import time
+import tracemalloc
+from common import setup_django
+
+setup_django()
+
+from django_influx import attributes  # noqa: E402
+from django_influx.builder import build_grouped_batches  # noqa: E402
+from django_influx.measurement import Measurement  # noqa: E402
+
+
+class BenchMeasurement(Measurement):
+    measurement_name = 'bench'
+    time = attributes.TimestampFieldAttribute()
+    host = attributes.TagFieldAttribute()
+    region = attributes.TagFieldAttribute()
+    service = attributes.TagFieldAttribute()
+    f0 = attributes.IntegerFieldAttribute()
+    f1 = attributes.IntegerFieldAttribute()
+    f2 = attributes.FloatFieldAttribute()
+    f3 = attributes.BooleanFieldAttribute()
+    f4 = attributes.StringFieldAttribute()
+
+
+FIELD_NAMES = ['time', 'host', 'region', 'service', 'f0', 'f1', 'f2', 'f3', 'f4']
+
+
+def iter_rows(nb_points):
+    for i in range(nb_points):
+        yield (1570481055 + i, 'host-{}'.format(i % 50), 'eu-west', 'api', i, i * 2, i / 3, bool(i % 2), 'ok')
+
+
+class Sender:
+    """Stands for the request, keeping a snapshot of the largest live memory."""
+
+    def __init__(self):
+        self.nb_bytes = 0
+        self.max_traced = 0
+        self.snapshot = None
+
+    def send(self, data):
+        self.nb_bytes += len(data)
+        if tracemalloc.is_tracing():
+            traced, _ = tracemalloc.get_traced_memory()
+            if traced > self.max_traced:
+                self.max_traced = traced
+                self.snapshot = tracemalloc.take_snapshot()
+
+
+def before(sender, nb_points, batch_size):
+    # bulk_save took a list of instances and sent them as one body
+    points = [BenchMeasurement(**dict(zip(FIELD_NAMES, row))) for row in iter_rows(nb_points)]
+    str_points = ''
+    for point in points:
+        prep_value = point.get_prep_value()
+        str_points += prep_value
+        str_points += '\n'
+    sender.send(str_points.encode('utf-8'))
+
+
+def after(sender, nb_points, batch_size):
+    encoder = BenchMeasurement._encoder
+    batches = build_grouped_batches(
+        ((None, row) for row in iter_rows(nb_points)),
+        lambda builder, row: builder.append_row(encoder, row),
+        batch_size,
+        sys.maxsize,
+    )
+    for _, builder in batches:
+        with builder.view() as data:
+            sender.send(data)
+
+
+def profile(func, *args):
+    BenchMeasurement._encoder.cache_clear()
+    start = time.perf_counter()
+    func(Sender(), *args)
+    elapsed = time.perf_counter() - start
+
+    BenchMeasurement._encoder.cache_clear()
+    sender = Sender()
+    tracemalloc.start()
+    func(sender, *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = sender.snapshot.statistics('filename')
+    nb_blocks = sum(stat.count for stat in stats)
+    return sender.nb_bytes, elapsed, peak, nb_blocks
+
+
+def main():
+    nb_points = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    print('points: {:,}  batch size: {:,}'.format(nb_points, batch_size))
+    print('{:>8} {:>14} {:>10} {:>12} {:>14}'.format('', 'bytes', 'seconds', 'peak MiB', 'allocations'))
+    for name, func in (('before', before), ('after', after)):
+        nb_bytes, elapsed, peak, nb_blocks = profile(func, nb_points, batch_size)
+        print('{:>8} {:>14,} {:>10.2f} {:>12.1f} {:>14,}'.format(
+            name, nb_bytes, elapsed, peak / 2 ** 20, nb_blocks,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Points/sec of Measurement.get_prep_value on a 10-field, 5-tag measurement,
+before (per-call attribute filtering) and after (compiled class encoder).
+
+    python benchmarks/bench_encoder.py [nb_points]
+"""
+import sys
+from common import measure, setup_django
+
+setup_django()
+
+from django_influx import attributes  # noqa: E402
+from django_influx.measurement import Measurement  # noqa: E402
+
+
+class BenchMeasurement(Measurement):
+    measurement_name = 'bench'
+    time = attributes.TimestampFieldAttribute()
+    host = attributes.TagFieldAttribute()
+    region = attributes.TagFieldAttribute()
+    service = attributes.TagFieldAttribute()
+    version = attributes.TagFieldAttribute()
+    zone = attributes.TagFieldAttribute()
+    f0 = attributes.IntegerFieldAttribute()
+    f1 = attributes.IntegerFieldAttribute()
+    f2 = attributes.IntegerFieldAttribute()
+    f3 = attributes.FloatFieldAttribute()
+    f4 = attributes.FloatFieldAttribute()
+    f5 = attributes.FloatFieldAttribute()
+    f6 = attributes.BooleanFieldAttribute()
+    f7 = attributes.StringFieldAttribute()
+    f8 = attributes.GenericFieldAttribute()
+    f9 = attributes.GenericFieldAttribute()
+
+
+def legacy_get_prep_value(point):
+    attributes_list = point.get_attributes()
+    groups = [
+        [a for a in attributes_list if isinstance(a, attributes.TagFieldAttribute)],
+        [a for a in attributes_list if isinstance(a, attributes.GenericFieldAttribute)],
+        [a for a in attributes_list if isinstance(a, attributes.TimestampFieldAttribute)],
+    ]
+    prep_value_groups = []
+    for group in groups:
+        prep_value_group = []
+        for attr in group:
+            attr_prep_value = attr.get_prep_value()
+            if not isinstance(attr, attributes.TimestampFieldAttribute):
+                prep_value_group.append('{}={}'.format(attr.name, attr_prep_value))
+            else:
+                prep_value_group.append('{}'.format(attr_prep_value))
+        prep_value_groups.append(','.join(prep_value_group))
+    prep_value_groups[0] = ','.join([point.measurement_name, prep_value_groups[0]])
+    return ' '.join(prep_value_groups)
+
+
+def make_points(nb_points):
+    return [
+        BenchMeasurement(
+            time=1570481055 + i,
+            host='host-{}'.format(i % 50),
+            region='eu-west',
+            service='api',
+            version='1.2.3',
+            zone='a',
+            f0=i, f1=i * 2, f2=i * 3,
+            f3=i / 3, f4=i / 7, f5=0.5,
+            f6=bool(i % 2), f7='ok',
+            f8=i, f9=1.5,
+        )
+        for i in range(nb_points)
+    ]
+
+
+def main():
+    nb_points = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    points = make_points(nb_points)
+    before = measure(lambda: [legacy_get_prep_value(p) for p in points])
+    after = measure(lambda: [p.get_prep_value() for p in points])
+    print('points: {}'.format(nb_points))
+    print('before: {:>12,.0f} points/sec'.format(nb_points / before))
+    print('after:  {:>12,.0f} points/sec'.format(nb_points / after))
+    print('speedup: {:.2f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Bytes on the wire and compression CPU cost of gzip request bodies for
+/write, for a batch of repetitive line protocol points.
+
+    python benchmarks/bench_gzip.py [nb_points]
+"""
+import sys
+import time
+from django_influx.api import InfluxDBApi
+
+
+class GzipSettings:
+    def __init__(self, gzip_level):
+        self.gzip = gzip_level is not None
+        self.gzip_level = gzip_level
+        self.gzip_min_size = 0
+
+
+def make_points(nb_points):
+    lines = [
+        'cpu,host=host-{},region=eu-west,service=api usage_user={},usage_system={},'
+        'usage_idle={}i {}'.format(i % 50, i / 7, i / 11, i % 100, 1570481055000000000 + i)
+        for i in range(nb_points)
+    ]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def main():
+    nb_points = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    data = make_points(nb_points)
+    print('points: {}  raw bytes: {:,}'.format(nb_points, len(data)))
+    print('{:>6} {:>12} {:>7} {:>10} {:>10}'.format('level', 'bytes', 'ratio', 'cpu ms', 'MB/s'))
+    for gzip_level in (None, 1, 3, 6, 9):
+        request = GzipSettings(gzip_level)
+        start = time.process_time()
+        body, _ = InfluxDBApi.compress_points(request, data)
+        cpu = time.process_time() - start
+        throughput = len(data) / cpu / 1e6 if cpu else float('inf')
+        print('{:>6} {:>12,} {:>6.1f}x {:>10.1f} {:>10.1f}'.format(
+            str(gzip_level or '-'),
+            len(body),
+            len(data) / len(body),
+            cpu * 1000,
+            throughput,
+        ))
+
+
+if __name__ == '__main__':
+    main()
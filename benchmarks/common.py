@@ -0,0 +1,29 @@
+import time
+
+
+def setup_django():
+    import django
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure(
+            INFLUXDB={
+                'HOST': 'localhost',
+                'PORT': 8086,
+                'USER': '',
+                'PASSWORD': '',
+                'NAME': 'benchmarks',
+                'OPTIONS': {},
+            },
+        )
+        django.setup()
+
+
+def measure(func, *args, repeat=5, **kwargs):
+    """Returns the best wall time, in seconds, of `repeat` calls."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import struct
+import threading
+from django.conf import settings
+from .exceptions import InfluxDBAttributeValueError, InfluxDBConnectionError
+from .writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('>II')
+
+DEFAULT_AGGREGATOR_SOCKET_NAME = 'django-influx.sock'
+
+
+def get_default_socket_path():
+    """
+    Socket in the private runtime directory of the user ($XDG_RUNTIME_DIR),
+    or else in the BASE_DIR of the project, rather than in a directory
+    writable by every user such as /tmp.
+    """
+    directory = os.environ.get('XDG_RUNTIME_DIR') or getattr(settings, 'BASE_DIR', None)
+    if not directory:
+        msg = 'the aggregator_socket option is required without XDG_RUNTIME_DIR nor BASE_DIR'
+        raise InfluxDBAttributeValueError(msg)
+    return os.path.join(str(directory), DEFAULT_AGGREGATOR_SOCKET_NAME)
+
+
+def get_direct_write_request():
+    from .app import Influxable
+    return Influxable.get_instance().connection.direct_write_request
+
+
+def encode_frame(params, data):
+    header = json.dumps(params, separators=(',', ':')).encode('utf-8')
+    return FRAME_HEADER.pack(len(header), len(data)) + header + data
+
+
+def read_frame(rfile):
+    """Returns the (params, data) of the next frame, or None at EOF."""
+    frame_header = rfile.read(FRAME_HEADER.size)
+    if len(frame_header) < FRAME_HEADER.size:
+        return None
+    header_length, data_length = FRAME_HEADER.unpack(frame_header)
+    header = rfile.read(header_length)
+    data = rfile.read(data_length)
+    if len(header) < header_length or len(data) < data_length:
+        return None
+    return json.loads(header.decode('utf-8')), data
+
+
+class AggregatorClient:
+    """
+    Stands for an InfluxDBRequest in worker processes: /write bodies are
+    forwarded to an Aggregator over the Unix socket at `path` instead of
+    being sent to InfluxDB. Writes are fire-and-forget, errors raised by
+    InfluxDB being handled by the aggregator.
+
+    The socket is opened lazily, and again after a fork.
+    """
+
+    gzip = False
+    write_profiler = None
+    query_cache = None
+
+    def __init__(self, path, database_name, timeout=1.0):
+        self.path = path
+        self.database_name = database_name
+        self.timeout = timeout
+        self._socket = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<AggregatorClient {}>'.format(self.path)
+
+    def _connect(self):
+        client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client_socket.settimeout(self.timeout)
+        try:
+            client_socket.connect(self.path)
+        except OSError:
+            client_socket.close()
+            raise
+        self._socket = client_socket
+        self._pid = os.getpid()
+
+    def close(self):
+        with self._lock:
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+
+    def post(self, url, params=None, data=b'', headers=None, **kwargs):
+        if url != '/write':
+            raise InfluxDBAttributeValueError('the aggregator only forwards /write requests')
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = b''.join(data)
+        frame = encode_frame(params or {}, data)
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._socket is None or self._pid != os.getpid():
+                        self._connect()
+                    self._socket.sendall(frame)
+                    return
+                except OSError as err:
+                    if self._socket is not None:
+                        self._socket.close()
+                        self._socket = None
+                    if attempt:
+                        raise InfluxDBConnectionError(
+                            'aggregator unreachable at {}: {}'.format(self.path, err)
+                        )
+
+
+class AggregatorRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                frame = read_frame(self.rfile)
+            except (OSError, ValueError) as err:
+                logger.warning('Invalid frame from an aggregator client: %s', err)
+                return
+            if frame is None:
+                return
+            params, data = frame
+            self.server.aggregator.write(params, data)
+
+
+class AggregatorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Aggregator:
+    """
+    Receives points forwarded by AggregatorClient from every worker process
+    on the Unix socket at `path`, and writes them to InfluxDB through a
+    single BatchWriter, so that small batches of many processes are merged
+    into large ones sharing one connection pool.
+
+    The default writer bypasses the `aggregator_socket` option of the
+    connection, so that points are not forwarded back to the aggregator.
+    The socket can only be connected to by the user running the aggregator,
+    which worker processes must run as.
+    """
+
+    def __init__(self, path=None, writer=None):
+        self.path = path or get_default_socket_path()
+        self.writer = writer or BatchWriter(request=get_direct_write_request())
+        self.received_count = 0
+        self.received_bytes = 0
+        self._server = None
+        self._lock = threading.Lock()
+
+    def write(self, params, data):
+        with self._lock:
+            self.received_count += 1
+            self.received_bytes += len(data)
+        try:
+            self.writer.write(
+                [line.decode('utf-8') for line in data.split(b'\n') if line],
+                database=params.get('db'),
+                precision=params.get('precision', 'ns'),
+                retention_policy=params.get('rp'),
+            )
+        except Exception as err:
+            logger.warning('Dropped %d bytes of points: %s', len(data), err)
+
+    def remove_stale_socket(self):
+        """
+        Removes the socket left at `path` by an aggregator that is gone,
+        refusing to remove anything else, or the socket of a live one.
+        """
+        try:
+            mode = os.lstat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise InfluxDBAttributeValueError('{} exists and is not a socket'.format(self.path))
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise InfluxDBAttributeValueError('an aggregator already listens on {}'.format(self.path))
+
+    def bind(self):
+        self.remove_stale_socket()
+        # only the user of the aggregator may connect, even for a moment
+        umask = os.umask(0o177)
+        try:
+            self._server = AggregatorServer(self.path, AggregatorRequestHandler)
+        finally:
+            os.umask(umask)
+        os.chmod(self.path, 0o600)
+        self._server.aggregator = self
+        return self._server
+
+    def serve_forever(self, poll_interval=0.5):
+        server = self._server or self.bind()
+        try:
+            server.serve_forever(poll_interval)
+        finally:
+            server.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self.writer.close()
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
@@ -1,3 +1,14 @@
+import gzip
+import time
+import zlib
+from .cache import get_modified_measurements, is_cacheable_query
+from .line_protocol import count_lines
+from .response import iter_json_lines, merge_chunked_responses
+
+STREAM_CHUNK_SIZE = 64 * 1024
+DEFAULT_QUERY_CHUNK_SIZE = 10000
+
+
 class InfluxDBApi:
     @staticmethod
     def get_debug_requests(request, seconds=10):
@@ -29,8 +40,21 @@ class InfluxDBApi:
         chunked=False,
         epoch='ns',
         pretty=False,
-        database=None
+        database=None,
+        cache_ttl=None,
+        measurements=None,
+        chunk_size=DEFAULT_QUERY_CHUNK_SIZE,
     ):
+        if chunked:
+            responses = InfluxDBApi.iter_query(
+                request,
+                query,
+                chunk_size=chunk_size,
+                method=method,
+                epoch=epoch,
+                database=database,
+            )
+            return merge_chunked_responses(responses)
         url = '/query'
         params = {
             'db': database or request.database_name,
@@ -39,8 +63,49 @@ class InfluxDBApi:
             'chunked': chunked,
             'pretty': pretty,
         }
-        res = request.request(method, url, params=params)
-        return res.json()
+        cache = getattr(request, 'query_cache', None)
+        if cache is not None and not is_cacheable_query(query):
+            try:
+                return request.request(method, url, params=params).json()
+            finally:
+                cache.invalidate(get_modified_measurements(query))
+        if cache is None or cache_ttl == 0:
+            res = request.request(method, url, params=params)
+            return res.json()
+        key = cache.get_key(query, params['db'], epoch)
+        response = cache.get(key)
+        if response is None:
+            response = request.request(method, url, params=params).json()
+            cache.set(key, response, ttl=cache_ttl, measurements=measurements)
+        return response
+
+    @staticmethod
+    def iter_query(
+        request,
+        query,
+        chunk_size=DEFAULT_QUERY_CHUNK_SIZE,
+        method='get',
+        epoch='ns',
+        database=None,
+    ):
+        """
+        Runs a query answered in chunks of at most `chunk_size` rows, and
+        yields the JSON object of each chunk as soon as it is read from the
+        streamed response, so that memory is bounded by the chunk size.
+        """
+        url = '/query'
+        params = {
+            'db': database or request.database_name,
+            'q': query,
+            'epoch': epoch,
+            'chunked': 'true',
+            'chunk_size': chunk_size,
+        }
+        res = request.request(method, url, params=params, stream=True)
+        try:
+            yield from iter_json_lines(res.iter_content(STREAM_CHUNK_SIZE))
+        finally:
+            res.close()
 
     @staticmethod
     def write_points(
@@ -48,16 +113,131 @@ class InfluxDBApi:
         points,
         precision='ns',
         consistency='all',
-        retention_policy_name='DEFAULT',
-        database=None
+        retention_policy_name=None,
+        database=None,
+        nb_points=None,
+        profile=True,
     ):
+        """
+        Writes points given as a str, bytes-like body or iterable of lines.
+        `nb_points` is the number of points of a body, when known, so that
+        the write scheduler does not have to count them. With `profile`
+        False, the write profiler of the request does not observe the
+        points, which the caller already did (see write_lines).
+        """
+        profiler = getattr(request, 'write_profiler', None) if profile else None
+        if profiler is not None:
+            points = profiler.observe(points)
+        split_lines = getattr(request, 'split_lines', None)
+        if split_lines is not None:
+            return InfluxDBApi.write_sharded_points(
+                split_lines,
+                points,
+                precision=precision,
+                consistency=consistency,
+                retention_policy_name=retention_policy_name,
+                database=database,
+            )
+        cache = getattr(request, 'query_cache', None)
+        written_measurements = None
+        if cache is not None:
+            points, written_measurements = cache.watch_writes(points)
         url = '/write'
         params = {
             'db': database or request.database_name,
             'precision': precision,
             'consistency': consistency,
-            'retention_policy_name': retention_policy_name,
         }
-        str_encoded_points = points.encode('utf-8')
-        request.post(url, params=params, data=str_encoded_points)
-        return True
\ No newline at end of file
+        if retention_policy_name is not None:
+            params['rp'] = retention_policy_name
+        if isinstance(points, str):
+            str_encoded_points = points.encode('utf-8')
+        elif isinstance(points, (bytes, bytearray, memoryview)):
+            str_encoded_points = points
+        else:
+            str_encoded_points = InfluxDBApi.stream_points(points)
+        scheduler = getattr(request, 'write_scheduler', None)
+        throttled_chunks = None
+        if scheduler is not None:
+            if isinstance(str_encoded_points, (bytes, bytearray, memoryview)):
+                if nb_points is None:
+                    nb_points = count_lines(str_encoded_points) or 1
+                if not scheduler.acquire(nb_points, len(str_encoded_points)):
+                    return False
+            else:
+                str_encoded_points = throttled_chunks = scheduler.throttle_chunks(str_encoded_points)
+        data, headers = InfluxDBApi.compress_points(request, str_encoded_points)
+        start = time.monotonic()
+        try:
+            request.post(url, params=params, data=data, headers=headers)
+        finally:
+            if scheduler is not None:
+                latency = time.monotonic() - start
+                if throttled_chunks is not None:
+                    # streamed chunks wait for their tokens during the request
+                    latency -= throttled_chunks.waited
+                scheduler.observe(latency)
+        if cache is not None:
+            cache.invalidate(written_measurements)
+        return True
+
+    @staticmethod
+    def write_sharded_points(split_lines, points, **kwargs):
+        """
+        Writes points through a ShardRouter, with one /write request per
+        node. Streamed points are buffered, since each node needs its own
+        request body.
+
+        Nodes are written one after another and the first error is raised
+        as is, with the nodes before it already written: retrying the whole
+        write is at-least-once. write_lines (and so BatchWriter and the
+        spool) writes every node instead and only retries the lines of the
+        nodes that failed.
+        """
+        if isinstance(points, (bytes, bytearray, memoryview)):
+            points = str(points, 'utf-8')
+        if isinstance(points, str):
+            points = points.split('\n')
+        lines = [line for line in points if line]
+        for node_request, node_lines in split_lines(lines):
+            str_points = '\n'.join(node_lines) + '\n'
+            InfluxDBApi.write_points(node_request, str_points, **kwargs)
+        return True
+
+    @staticmethod
+    def stream_points(lines, chunk_size=STREAM_CHUNK_SIZE):
+        chunk = []
+        chunk_bytes = 0
+        for line in lines:
+            if isinstance(line, str):
+                line = line.encode('utf-8')
+            chunk.append(line)
+            chunk.append(b'\n')
+            chunk_bytes += len(line) + 1
+            if chunk_bytes >= chunk_size:
+                yield b''.join(chunk)
+                chunk = []
+                chunk_bytes = 0
+        if chunk:
+            yield b''.join(chunk)
+
+    @staticmethod
+    def stream_compress(chunks, compresslevel):
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            compressed_chunk = compressor.compress(chunk)
+            if compressed_chunk:
+                yield compressed_chunk
+        yield compressor.flush()
+
+    @staticmethod
+    def compress_points(request, data):
+        if not getattr(request, 'gzip', False):
+            return data, {}
+        headers = {'Content-Encoding': 'gzip'}
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            return InfluxDBApi.stream_compress(data, request.gzip_level), headers
+        if len(data) < getattr(request, 'gzip_min_size', 0):
+            return data, {}
+        compressed_data = gzip.compress(data, compresslevel=request.gzip_level)
+        return compressed_data, headers
\ No newline at end of file
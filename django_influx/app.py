@@ -15,12 +15,16 @@ class Influxable:
         request = self.connection.request
         return InfluxDBApi.ping(request, *args, **kwargs)
 
-    def execute_query(self, *args, **kwargs):
-        request = self.connection.request
+    def execute_query(self, *args, measurement_name=None, **kwargs):
+        request = self.connection.get_read_request(measurement_name)
         return InfluxDBApi.execute_query(request, *args, **kwargs)
 
+    def iter_query(self, *args, measurement_name=None, **kwargs):
+        request = self.connection.get_read_request(measurement_name)
+        return InfluxDBApi.iter_query(request, *args, **kwargs)
+
     def write_points(self, *args, **kwargs):
-        request = self.connection.request
+        request = self.connection.write_request
         return InfluxDBApi.write_points(request, *args, **kwargs)
 
     @property
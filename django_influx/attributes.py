@@ -1,7 +1,11 @@
+import numbers
+import time
 from datetime import datetime, timezone
 from decimal import Decimal as D, InvalidOperation
+import numpy as np
 from .helpers.utils import inv
 from .exceptions import InfluxDBAttributeValueError
+from .line_protocol import escape_tag_value, quote_string
 
 
 class TimestampPrecision:
@@ -22,6 +26,46 @@ TIMESTAMP_CONVERT_RATIO = {
     TimestampPrecision.SECONDS: 1,
 }
 
+NANOSECONDS_PER_SECOND = 1000 * 1000 * 1000
+
+NANOSECONDS_PER_PRECISION = {
+    TimestampPrecision.HOURS: 60 * 60 * NANOSECONDS_PER_SECOND,
+    TimestampPrecision.MICROSECONDS: 1000,
+    TimestampPrecision.MILLISECONDS: 1000 * 1000,
+    TimestampPrecision.MINUTES: 60 * NANOSECONDS_PER_SECOND,
+    TimestampPrecision.NANOSECONDS: 1,
+    TimestampPrecision.SECONDS: NANOSECONDS_PER_SECOND,
+}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_nanoseconds(value):
+    """
+    Converts an epoch in seconds (int, float, Decimal or numeric string),
+    a datetime (naive ones being local time) or a numpy.datetime64 to
+    integer nanoseconds since epoch, using integer arithmetic only.
+    """
+    if isinstance(value, numbers.Integral):
+        return int(value) * NANOSECONDS_PER_SECOND
+    to_datetime64 = getattr(value, 'to_datetime64', None)
+    if to_datetime64 is not None:
+        value = to_datetime64()
+    if isinstance(value, np.datetime64):
+        return int(value.astype('datetime64[ns]').astype(np.int64))
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.astimezone()
+        delta = value - EPOCH
+        seconds = delta.days * 24 * 60 * 60 + delta.seconds
+        return seconds * NANOSECONDS_PER_SECOND + delta.microseconds * 1000
+    if isinstance(value, str):
+        value = D(value)
+    elif not hasattr(value, 'as_integer_ratio'):
+        value = float(value)
+    numerator, denominator = value.as_integer_ratio()
+    return (2 * numerator * NANOSECONDS_PER_SECOND + denominator) // (2 * denominator)
+
 
 class BaseAttribute:
     def __init__(self, **kwargs):
@@ -66,6 +110,21 @@ class BaseAttribute:
     def reset(self):
         self._value = None
 
+    def prepare_value(self, value):
+        """
+        Stateless counterpart of set_internal_value: validates and casts
+        `value` without storing it on the attribute.
+        """
+        self.validate(value)
+        if value is None:
+            return self.default
+        try:
+            return self.to_python(value)
+        except (InvalidOperation, ValueError) as exception:
+            if self.enforce_cast:
+                raise exception
+            return value
+
     def set_internal_value(self, value):
         self.validate(value)
         self.raw_value = value
@@ -93,18 +152,17 @@ class BaseAttribute:
 class GenericFieldAttribute(BaseAttribute):
 
     def to_influx(self, value):
-        if isinstance(value, int):
-            str_value = str(value)
-            return "{}i".format(str_value)
-        elif isinstance(value, float):
-            str_value = str(value)
+        if isinstance(value, (bool, np.bool_)):
+            str_value = str(bool(value)).lower()
             return str_value
-        elif isinstance(value, bool):
-            str_value = str(value).lower()
+        elif isinstance(value, numbers.Integral):
+            str_value = str(int(value))
+            return "{}i".format(str_value)
+        elif isinstance(value, numbers.Real):
+            str_value = repr(float(value))
             return str_value
         else:
-            str_value = str(value)
-            return '\"{}\"'.format(str_value)
+            return quote_string(value)
 
 
 class IntegerFieldAttribute(GenericFieldAttribute):
@@ -158,6 +216,13 @@ class FloatFieldAttribute(IntegerFieldAttribute):
             precision = '.' + '0' * (self.max_nb_decimals - 1) + '1'
             self._value = self.to_python(value).quantize(D(precision))
 
+    def prepare_value(self, value):
+        value = super(FloatFieldAttribute, self).prepare_value(value)
+        if value is not None and self.max_nb_decimals is not None:
+            precision = '.' + '0' * (self.max_nb_decimals - 1) + '1'
+            value = self.to_python(value).quantize(D(precision))
+        return value
+
     def to_influx(self, value):
         str_value = str(value)
         return str_value
@@ -185,8 +250,7 @@ class StringFieldAttribute(GenericFieldAttribute):
         super(StringFieldAttribute, self).__init__(**kwargs)
 
     def to_influx(self, value):
-        str_value = str(value)
-        return '\"{}\"'.format(str_value)
+        return quote_string(value)
 
     def to_python(self, value):
         return str(value)
@@ -238,7 +302,7 @@ class BooleanFieldAttribute(GenericFieldAttribute):
 class TagFieldAttribute(BaseAttribute):
 
     def to_influx(self, value):
-        return str(value).strip().replace(" ", "\\").replace(",", "\\,")
+        return escape_tag_value(value)
 
 
 class TimestampFieldAttribute(BaseAttribute):
@@ -249,47 +313,30 @@ class TimestampFieldAttribute(BaseAttribute):
 
     def clean(self, value):
         super(TimestampFieldAttribute, self).clean(value)
-        timestamp = None
-        if value is None and self.auto_now:
-            self._value = datetime.now()
-            timestamp = self._value.timestamp
-            # self._value = self.to_python(timestamp)
-            self.formatted_timestamp = self.convert_to_nanoseconds(timestamp)
-        elif value:
-            timestamp = None
-            if isinstance(value, datetime):
-                timestamp = value.timestamp()
-            else:
-                t = datetime.fromtimestamp(value)
-                self._value = t
-                timestamp = t.timestamp()
-            self.formatted_timestamp = self.convert_to_nanoseconds(timestamp)
-        else:
-            self.formatted_timestamp = None
+        if value is None and self._value is not None:
+            self._value = self.to_python(self._value)
+        elif value is None and self.auto_now:
+            self._value = self.from_nanoseconds(time.time_ns())
+        self.formatted_timestamp = self._value
+
+    def from_nanoseconds(self, nanoseconds):
+        return nanoseconds // NANOSECONDS_PER_PRECISION[self.precision]
 
     def convert_to_nanoseconds(self, timestamp):
-        precision = TimestampPrecision.NANOSECONDS
-        if isinstance(timestamp, datetime):
-            timestamp = timestamp.timestamp()
-        return self.convert_to_precision(timestamp, precision)
+        return to_nanoseconds(timestamp)
 
     def convert_to_precision(self, timestamp, precision):
-        convert_ratio = TIMESTAMP_CONVERT_RATIO[precision]
-        return D(timestamp) * convert_ratio
+        return to_nanoseconds(timestamp) // NANOSECONDS_PER_PRECISION[precision]
 
     def to_influx(self, value):
-        self.formatted_timestamp = int(self.formatted_timestamp)
-        timestamp = D(self.formatted_timestamp)
-        str_value = str(timestamp)
-        return "{}".format(str_value)
+        return str(int(value))
 
     def to_python(self, value):
-        timestamp = D(value)
-        return self.convert_to_precision(timestamp, self.precision)
+        return self.from_nanoseconds(to_nanoseconds(value))
 
     def validate_options(self):
         super(TimestampFieldAttribute, self).validate_options()
-        if self.precision not in TIMESTAMP_CONVERT_RATIO:
+        if self.precision not in NANOSECONDS_PER_PRECISION:
             raise InfluxDBAttributeValueError(
                 'precision must be one of [ns,u,ms,s,m,h]'
             )
@@ -322,15 +369,12 @@ class DateTimeFieldAttribute(TimestampFieldAttribute):
 
     def to_influx(self, value):
         timestamp = value
-        if isinstance(value, datetime):
-            timestamp = value.timestamp()
-        elif isinstance(value, str):
+        if isinstance(value, str):
             if value.isnumeric():
                 timestamp = value
             else:
-                timestamp = datetime.strptime(value, self.str_format).timestamp()
-        nanoseconds = self.convert_to_nanoseconds(timestamp)
-        str_value = str(nanoseconds)
+                timestamp = datetime.strptime(value, self.str_format)
+        str_value = str(self.convert_to_precision(timestamp, self.precision))
         return "{}".format(str_value)
 
     def to_python(self, value):
@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+
+
+class LineProtocolBuilder:
+    """
+    Line protocol points appended as encoded fragments to a bytearray, to
+    be sent as a memoryview of it: the request body is built without
+    intermediate lines, nor a final join and encode of the whole batch.
+
+    The builder is reusable once cleared. While a view is exported, the
+    buffer cannot be resized, so points cannot be appended.
+    """
+
+    def __init__(self):
+        self.nb_points = 0
+        self._buffer = bytearray()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def __repr__(self):
+        return '<LineProtocolBuilder {} points, {} bytes>'.format(self.nb_points, len(self))
+
+    @property
+    def nb_bytes(self):
+        return len(self._buffer)
+
+    def append_line(self, line):
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        self._buffer += line
+        self._buffer += b'\n'
+        self.nb_points += 1
+
+    def append_point(self, point):
+        point._encoder.encode_into(self._buffer, point)
+        self.nb_points += 1
+
+    def append_row(self, encoder, row):
+        encoder.encode_row_into(self._buffer, row)
+        self.nb_points += 1
+
+    @contextmanager
+    def view(self):
+        view = memoryview(self._buffer)
+        try:
+            yield view
+        finally:
+            view.release()
+
+    def lines(self):
+        # not splitlines(): \r and other separators are legal in string fields
+        lines = self._buffer.decode('utf-8').split('\n')
+        lines.pop()
+        return lines
+
+    def split(self, offset):
+        """
+        Moves the last point, starting at `offset`, to a new builder, which
+        is returned.
+        """
+        builder = LineProtocolBuilder()
+        builder._buffer += self._buffer[offset:]
+        builder.nb_points = 1
+        del self._buffer[offset:]
+        self.nb_points -= 1
+        return builder
+
+    def clear(self):
+        self._buffer.clear()
+        self.nb_points = 0
+
+
+def build_grouped_batches(items, append, batch_size, max_batch_bytes):
+    """
+    Encodes (group, item) items with `append(builder, item)` into one
+    LineProtocolBuilder per group, yielding (group, builder) batches of at
+    most `batch_size` points and `max_batch_bytes` bytes, unless a single
+    point is larger. Full batches are yielded as soon as they are full,
+    the remaining ones once `items` is exhausted.
+    """
+    builders = {}
+    for group, item in items:
+        builder = builders.get(group)
+        if builder is None:
+            builder = builders[group] = LineProtocolBuilder()
+        offset = len(builder)
+        append(builder, item)
+        if len(builder) > max_batch_bytes and builder.nb_points > 1:
+            overflow = builder.split(offset)
+            yield group, builder
+            builder = builders[group] = overflow
+        if builder.nb_points >= batch_size:
+            yield group, builder
+            builders[group] = LineProtocolBuilder()
+    for group, builder in builders.items():
+        if builder.nb_points:
+            yield group, builder
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from .exceptions import InfluxDBAttributeValueError, InfluxDBInvalidChoiceError
+from .line_protocol import escape_measurement, get_measurement_name
+
+DEFAULT_QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_QUERY_CACHE_TTL = 60.0
+DEFAULT_DJANGO_CACHE_KEY_PREFIX = 'influx:query'
+DEFAULT_DJANGO_CACHE_LOCK_TIMEOUT = 10.0
+
+QUOTED_OR_WHITESPACE = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")|\s+")
+CACHEABLE_STATEMENTS = ('SELECT', 'SHOW')
+MEASUREMENT_STATEMENT = re.compile(r'\s*(?:DROP\s+MEASUREMENT|DELETE\s+FROM|DROP\s+SERIES\s+FROM)\s', re.IGNORECASE)
+MEASUREMENT_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|([^\s",;]+)|\s*[,;]?\s*')
+
+
+def normalize_query(query):
+    """Query with whitespace collapsed, outside of quoted identifiers and strings."""
+    return QUOTED_OR_WHITESPACE.sub(lambda match: match.group(1) or ' ', query).strip()
+
+
+def is_cacheable_query(query):
+    """
+    Whether a normalized query only reads: a single SELECT, without INTO,
+    or SHOW statement.
+    """
+    statement = QUOTED_OR_WHITESPACE.sub(lambda match: '' if match.group(1) else ' ', query).upper()
+    if ';' in statement.rstrip(';'):
+        return False
+    return statement.startswith(CACHEABLE_STATEMENTS) and ' INTO ' not in statement
+
+
+def get_modified_measurements(query):
+    """
+    Measurements whose points a DROP MEASUREMENT, DELETE or DROP SERIES
+    statement removes, or None when the query may modify any of them:
+    other statements, regular expressions or qualified names.
+    """
+    match = MEASUREMENT_STATEMENT.match(query)
+    if match is None or ';' in query.rstrip().rstrip(';'):
+        return None
+    measurements = set()
+    for quoted, name in MEASUREMENT_TOKEN.findall(query, match.end()):
+        if name.upper() == 'WHERE':
+            break
+        if name and not re.fullmatch(r'\w+', name):
+            return None
+        if quoted or name:
+            measurements.add(name or re.sub(r'\\(.)', r'\1', quoted))
+    return measurements or None
+
+
+def has_error(response):
+    if not isinstance(response, dict) or 'error' in response:
+        return True
+    return any('error' in result for result in response.get('results', []))
+
+
+class QueryResultCache:
+    """
+    LRU cache of /query responses, keyed on the normalized query, the
+    database and the epoch, holding at most `max_bytes` of responses (as
+    measured by their JSON size). Entries expire after their TTL, and are
+    invalidated by the writes to the measurements they read; entries of
+    queries whose measurements are unknown are invalidated by any write.
+    Statements other than SELECT and SHOW, such as DROP or DELETE, also
+    invalidate the entries of the measurements they name, or every entry.
+
+    Only successful SELECT and SHOW queries are cached. Cached responses
+    are shared between callers, which must not mutate them.
+    """
+
+    def __init__(
+        self,
+        max_bytes=DEFAULT_QUERY_CACHE_MAX_BYTES,
+        ttl=DEFAULT_QUERY_CACHE_TTL,
+        clock=time.monotonic,
+    ):
+        if type(max_bytes) != int or max_bytes <= 0:
+            raise InfluxDBAttributeValueError('max_bytes must be a positive integer')
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.nb_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        # key -> (response, nb_bytes, expires_at, measurements)
+        self._entries = OrderedDict()
+        self._measurements = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return '<QueryResultCache {} entries, {} bytes>'.format(len(self), self.nb_bytes)
+
+    @staticmethod
+    def get_key(query, database, epoch):
+        return normalize_query(query), database, epoch
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, response, ttl=None, measurements=None):
+        """
+        Caches a response for `ttl` seconds, the default TTL when None.
+        Responses with errors, or larger than the cache, are not cached.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or has_error(response):
+            return False
+        nb_bytes = len(json.dumps(response, separators=(',', ':')))
+        if nb_bytes > self.max_bytes:
+            return False
+        measurements = frozenset(measurements) if measurements else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (response, nb_bytes, self.clock() + ttl, measurements)
+            self.nb_bytes += nb_bytes
+            for name in measurements or (None,):
+                self._measurements.setdefault(name, set()).add(key)
+            while self.nb_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def _remove(self, key):
+        response, nb_bytes, expires_at, measurements = self._entries.pop(key)
+        self.nb_bytes -= nb_bytes
+        for name in measurements or (None,):
+            keys = self._measurements.get(name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._measurements[name]
+
+    def invalidate(self, measurements=None):
+        """
+        Drops the entries reading any of `measurements`, along with those of
+        unknown measurements, or every entry when `measurements` is None.
+        """
+        with self._lock:
+            if measurements is None:
+                keys = list(self._entries)
+            else:
+                keys = set(self._measurements.get(None, ()))
+                for name in measurements:
+                    keys.update(self._measurements.get(name, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self):
+        self.invalidate()
+
+    def get_cached_measurements(self):
+        with self._lock:
+            return [name for name in self._measurements if name is not None]
+
+    def get_written_measurements(self, data):
+        """
+        Cached measurements that a /write body writes points to, searched
+        in place in bytes-like bodies.
+        """
+        names = {escape_measurement(name).encode('utf-8'): name for name in self.get_cached_measurements()}
+        if not names:
+            return set()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        pattern = re.compile(b'(?m)^(' + b'|'.join(re.escape(name) for name in names) + b')[, ]')
+        return {names[match] for match in pattern.findall(data)}
+
+    def watch_writes(self, points):
+        """
+        Returns the points to write, and the set of the cached measurements
+        they write to, filled as streamed points are consumed.
+        """
+        if isinstance(points, (str, bytes, bytearray, memoryview)):
+            return points, self.get_written_measurements(points)
+        written = set()
+        return self._watch_lines(points, written), written
+
+    def _watch_lines(self, lines, written):
+        cached_measurements = set(self.get_cached_measurements())
+        for line in lines:
+            if cached_measurements:
+                text = line.decode('utf-8') if isinstance(line, bytes) else line
+                name = get_measurement_name(text)
+                if name in cached_measurements:
+                    written.add(name)
+            yield line
+
+    def stats(self):
+        return {
+            'entries': len(self),
+            'bytes': self.nb_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+
+def dumps_response(response):
+    """Compact form of a /query response, as stored in a Django cache."""
+    return zlib.compress(json.dumps(response, separators=(',', ':')).encode('utf-8'))
+
+
+def loads_response(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+class DjangoQueryCache:
+    """
+    /query responses shared between processes through the Django cache
+    `alias`, stored compressed under a hash of the normalized query, the
+    database and the epoch.
+
+    On a miss, a single process runs the query while holding a lock key
+    added to the cache; the others poll the cache for its result for up to
+    `lock_timeout` seconds, then run the query themselves. Entries are not
+    invalidated by writes: they are kept for their timeout.
+    """
+
+    def __init__(
+        self,
+        alias=None,
+        key_prefix=DEFAULT_DJANGO_CACHE_KEY_PREFIX,
+        lock_timeout=DEFAULT_DJANGO_CACHE_LOCK_TIMEOUT,
+        poll_interval=0.05,
+        sleep=time.sleep,
+        clock=time.monotonic,
+    ):
+        self.alias = alias or get_default_cache_alias()
+        if self.alias not in settings.CACHES:
+            msg = 'cache alias `{}` must be one of value of {}'.format(self.alias, list(settings.CACHES))
+            raise InfluxDBInvalidChoiceError(msg)
+        self.key_prefix = key_prefix
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+        self.clock = clock
+
+    def __repr__(self):
+        return '<DjangoQueryCache {}>'.format(self.alias)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get_key(self, query, database, epoch):
+        digest = hashlib.sha1(
+            '\n'.join([normalize_query(query), str(database), str(epoch)]).encode('utf-8'),
+        ).hexdigest()
+        return '{}:{}'.format(self.key_prefix, digest)
+
+    def get(self, key):
+        data = self.cache.get(key)
+        return None if data is None else loads_response(data)
+
+    def set(self, key, response, timeout=DEFAULT_TIMEOUT):
+        if has_error(response):
+            return False
+        self.cache.set(key, dumps_response(response), timeout)
+        return True
+
+    def get_or_execute(self, key, execute, timeout=DEFAULT_TIMEOUT):
+        response = self.get(key)
+        if response is not None:
+            return response
+        lock_key = '{}:lock'.format(key)
+        deadline = self.clock() + self.lock_timeout
+        locked = self.cache.add(lock_key, 1, self.lock_timeout)
+        while not locked and self.clock() < deadline:
+            self.sleep(self.poll_interval)
+            response = self.get(key)
+            if response is not None:
+                return response
+            locked = self.cache.add(lock_key, 1, self.lock_timeout)
+        try:
+            response = execute()
+            self.set(key, response, timeout)
+        finally:
+            if locked:
+                self.cache.delete(lock_key)
+        return response
+
+
+def get_default_cache_alias():
+    return settings.INFLUXDB.get('OPTIONS', {}).get('query_cache_alias', DEFAULT_CACHE_ALIAS)
@@ -0,0 +1,82 @@
+from itertools import count
+from .exceptions import InfluxDBInvalidChoiceError
+from .line_protocol import join_line, split_fields, split_line
+
+COALESCE_LAST = 'last'
+COALESCE_MERGE = 'merge'
+COALESCE_CHOICES = (None, COALESCE_LAST, COALESCE_MERGE)
+
+
+def validate_coalesce(coalesce):
+    if coalesce not in COALESCE_CHOICES:
+        msg = 'coalesce `{}` must be one of value of {}'.format(
+            coalesce,
+            COALESCE_CHOICES,
+        )
+        raise InfluxDBInvalidChoiceError(msg)
+
+
+def merge_fields(previous_fields, fields):
+    merged_fields = dict(split_fields(previous_fields))
+    merged_fields.update(split_fields(fields))
+    return ','.join(key + '=' + value for key, value in merged_fields.items())
+
+
+class LineBuffer:
+    """
+    Buffer of line protocol points which, depending on `coalesce`, keeps a
+    single point per series key and timestamp:
+
+    - None: every point is kept
+    - 'last': the last point replaces the previous ones
+    - 'merge': fields of the last point are merged over the previous ones,
+      which is what InfluxDB does with points written separately
+
+    Points without timestamp are never coalesced, since InfluxDB timestamps
+    them on arrival.
+    """
+
+    def __init__(self, coalesce=None):
+        validate_coalesce(coalesce)
+        self.coalesce = coalesce
+        self.nb_bytes = 0
+        self._points = {}
+        self._counter = count()
+
+    def __len__(self):
+        return len(self._points)
+
+    def get_key(self, line):
+        if self.coalesce is not None:
+            try:
+                series_key, fields, timestamp = split_line(line)
+            except ValueError:
+                timestamp = None
+            if timestamp is not None:
+                return series_key, timestamp
+        return next(self._counter)
+
+    def add(self, line):
+        key = self.get_key(line)
+        previous_line = self._points.get(key)
+        if previous_line is not None:
+            self.nb_bytes -= len(previous_line) + 1
+            if self.coalesce == COALESCE_MERGE:
+                series_key, timestamp = key
+                fields = merge_fields(split_line(previous_line)[1], split_line(line)[1])
+                line = join_line(series_key, fields, timestamp)
+        self._points[key] = line
+        self.nb_bytes += len(line) + 1
+
+    def extend(self, lines):
+        for line in lines:
+            self.add(line)
+
+    def lines(self):
+        return list(self._points.values())
+
+
+def coalesce_lines(lines, coalesce=COALESCE_LAST):
+    buffer = LineBuffer(coalesce)
+    buffer.extend(lines)
+    return buffer.lines()
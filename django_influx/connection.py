@@ -1,6 +1,30 @@
 from django.conf import settings
+from .aggregator import AggregatorClient
 from .api import InfluxDBApi
+from .cache import DEFAULT_QUERY_CACHE_MAX_BYTES, DEFAULT_QUERY_CACHE_TTL, QueryResultCache
 from .request import InfluxDBRequest
+from .helpers.utils import to_bool
+from .sharding import DEFAULT_REPLICAS, ShardKey, ShardRouter
+from .profiler import DEFAULT_CARDINALITY_THRESHOLD, DEFAULT_DUMP_INTERVAL, DEFAULT_TOP_K, \
+    WriteProfiler
+from .throttling import WriteScheduler
+from .exceptions import InfluxDBAttributeValueError
+from .udp import DEFAULT_UDP_MTU, DEFAULT_UDP_PORT, UDPClient
+from .writer import Transport
+
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_GZIP_MIN_SIZE = 1024
+
+WRITE_SCHEDULER_OPTIONS = {
+    'write_points_per_second': ('points_per_second', float),
+    'write_bytes_per_second': ('bytes_per_second', float),
+    'write_burst': ('burst', float),
+    'write_overflow': ('overflow', str),
+    'write_max_wait': ('max_wait', float),
+    'write_target_latency': ('target_latency', float),
+    'write_min_batch_size': ('min_batch_size', int),
+    'write_max_batch_size': ('max_batch_size', int),
+}
 
 
 class Connection:
@@ -15,22 +39,159 @@ class Connection:
             f'{"https://" if eval(options.get("ssl", "False")) else "http://"}{self.influx_host}:{settings.INFLUXDB["PORT"]}'
         )
 
+        self.gzip = to_bool(kwargs.get('gzip', options.get('gzip', False)))
+        self.gzip_level = int(kwargs.get(
+            'gzip_level',
+            options.get('gzip_level', DEFAULT_GZIP_LEVEL),
+        ))
+        self.gzip_min_size = int(kwargs.get(
+            'gzip_min_size',
+            options.get('gzip_min_size', DEFAULT_GZIP_MIN_SIZE),
+        ))
+        self.pool_maxsize = kwargs.get('pool_maxsize', options.get('pool_maxsize', None))
+        if self.pool_maxsize is not None:
+            self.pool_maxsize = int(self.pool_maxsize)
+        self.timeout = kwargs.get('timeout', options.get('timeout', None))
+        if self.timeout is not None:
+            self.timeout = float(self.timeout)
+        self.write_scheduler_options = {
+            name: cast(kwargs.get(option, options.get(option)))
+            for option, (name, cast) in WRITE_SCHEDULER_OPTIONS.items()
+            if kwargs.get(option, options.get(option)) is not None
+        }
+
+        self.write_profiler = None
+        if to_bool(kwargs.get('profile', options.get('profile', False))):
+            self.write_profiler = WriteProfiler(
+                top_k=int(kwargs.get('profile_top_k', options.get('profile_top_k', DEFAULT_TOP_K))),
+                cardinality_threshold=int(kwargs.get(
+                    'profile_cardinality_threshold',
+                    options.get('profile_cardinality_threshold', DEFAULT_CARDINALITY_THRESHOLD),
+                )),
+                directory=kwargs.get('profile_directory', options.get('profile_directory')),
+                dump_interval=float(kwargs.get(
+                    'profile_dump_interval',
+                    options.get('profile_dump_interval', DEFAULT_DUMP_INTERVAL),
+                )),
+            )
+
+        self.query_cache = None
+        if to_bool(kwargs.get('query_cache', options.get('query_cache', False))):
+            self.query_cache = QueryResultCache(
+                max_bytes=int(kwargs.get(
+                    'query_cache_max_bytes',
+                    options.get('query_cache_max_bytes', DEFAULT_QUERY_CACHE_MAX_BYTES),
+                )),
+                ttl=float(kwargs.get('query_cache_ttl', options.get('query_cache_ttl', DEFAULT_QUERY_CACHE_TTL))),
+            )
+
         self.auth = (self.user, self.password)
-        self.request = InfluxDBRequest(
-            self.base_url,
-            self.database_name,
-            auth=self.auth,
-        )
+        self.router = None
+        nodes = kwargs.get('nodes', settings.INFLUXDB.get('NODES'))
+        if nodes:
+            node_requests = self.create_node_requests(nodes)
+            self.router = ShardRouter(
+                node_requests,
+                replicas=int(kwargs.get('replicas', options.get('replicas', DEFAULT_REPLICAS))),
+                shard_key=kwargs.get('shard_key', options.get('shard_key', ShardKey.MEASUREMENT)),
+                routes=kwargs.get('routes', options.get('routes', None)),
+            )
+            self.request = next(iter(node_requests.values()))
+            self.base_url = self.request.base_url
+        else:
+            self.request = self.create_request(self.base_url, self.auth)
+        self.aggregator = None
+        aggregator_socket = kwargs.get('aggregator_socket', options.get('aggregator_socket'))
+        if aggregator_socket:
+            self.aggregator = AggregatorClient(aggregator_socket, self.database_name)
+        self.udp = None
+        if to_bool(kwargs.get('udp', options.get('udp', False))):
+            self.udp = UDPClient(
+                kwargs.get('udp_host', options.get('udp_host', self.influx_host)),
+                int(kwargs.get('udp_port', options.get('udp_port', DEFAULT_UDP_PORT))),
+                database_name=kwargs.get('udp_database', options.get('udp_database', self.database_name)),
+                precision=kwargs.get('udp_precision', options.get('udp_precision', 'ns')),
+                mtu=int(kwargs.get('udp_mtu', options.get('udp_mtu', DEFAULT_UDP_MTU))),
+            )
+        self.write_request.write_profiler = self.write_profiler
+        for client in (self.aggregator, self.udp):
+            if client is not None:
+                client.query_cache = self.query_cache
+        if self.udp is not None:
+            self.udp.write_profiler = self.write_profiler
         self.stream = False
         self.check_if_connection_reached()
 
+    def create_request(self, base_url, auth):
+        return InfluxDBRequest(
+            base_url,
+            self.database_name,
+            auth=auth,
+            gzip=self.gzip,
+            gzip_level=self.gzip_level,
+            gzip_min_size=self.gzip_min_size,
+            pool_maxsize=self.pool_maxsize,
+            write_scheduler=self.create_write_scheduler(),
+            query_cache=self.query_cache,
+            timeout=self.timeout,
+        )
+
+    def create_write_scheduler(self):
+        """
+        One WriteScheduler per node, when any of the `write_*` options
+        (see WRITE_SCHEDULER_OPTIONS) is set.
+        """
+        if not self.write_scheduler_options:
+            return None
+        return WriteScheduler(**self.write_scheduler_options)
+
+    def create_node_requests(self, nodes):
+        """
+        Nodes are base URLs, or dicts with a `base_url` (or `host` and
+        `port`) and optionally a `name`, a `user` and a `password`.
+        """
+        node_requests = {}
+        for node in nodes:
+            if isinstance(node, str):
+                node = {'base_url': node}
+            base_url = node.get('base_url') or 'http://{}:{}'.format(
+                node['host'],
+                node.get('port', 8086),
+            )
+            auth = (node.get('user', self.user), node.get('password', self.password))
+            node_requests[node.get('name', base_url)] = self.create_request(base_url, auth)
+        return node_requests
+
+    @property
+    def write_request(self):
+        return self.aggregator or self.direct_write_request
+
+    def get_write_request(self, transport=Transport.HTTP):
+        if transport == Transport.UDP:
+            if self.udp is None:
+                raise InfluxDBAttributeValueError('the udp option is required to write over UDP')
+            return self.udp
+        return self.write_request
+
+    @property
+    def direct_write_request(self):
+        """Request writing to InfluxDB itself, bypassing the aggregator."""
+        return self.router or self.request
+
+    def get_read_request(self, measurement_name=None):
+        if self.router is not None and measurement_name is not None:
+            return self.router.get_request_for_measurement(measurement_name)
+        return self.request
+
     @staticmethod
     def create(base_url, database_name, user='', password=''):
         return Connection(base_url, database_name, user, password)
 
     def check_if_connection_reached(self):
         query = 'SHOW DATABASES'
-        InfluxDBApi.execute_query(self.request, query)
+        requests = self.router.requests.values() if self.router else [self.request]
+        for request in requests:
+            InfluxDBApi.execute_query(request, query)
 
     @property
     def policy_name(self):
@@ -9,6 +9,7 @@ def _generate_function(identifier):
             else:
                 field = self.field
             return '{}({})'.format(identifier, field)
+    Function.identifier = identifier
     return Function
 
 
@@ -21,4 +22,5 @@ def _generate_function_with_param(identifier):
         def evaluate(self):
             fields = ', '.join(self.fields)
             return '{}({}, {})'.format(identifier, fields, self.n)
+    Function.identifier = identifier
     return Function
@@ -1,9 +1,16 @@
-from functools import lru_cache
-from datetime import timedelta
+import threading
+from collections import OrderedDict
+from datetime import date, time, timedelta
+from decimal import Decimal
+from enum import Enum
+from functools import wraps
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from .criteria import Criteria, DisjunctionCriteria, WhereOperatorEnum, InjunctionCriteria, MathCriteria, Field
 from .function import aggregations
+from ..cache import DjangoQueryCache, is_cacheable_query
 from ..response import InfluxDBResponse
-from ..serializers import BaseSerializer
+from ..api import DEFAULT_QUERY_CHUNK_SIZE
+from ..serializers import BaseSerializer, iter_formatted_rows
 from ..helpers.utils import generate_interval_string, generate_seconds
 from .. import exceptions
 from ..app import Influxable
@@ -99,10 +106,93 @@ class AS:
         return self.filter
 
 
+COMPILED_QUERIES_MAX_SIZE = 1024
+_compiled_queries = OrderedDict()
+_compiled_queries_lock = threading.Lock()
+UNHASHABLE = object()
+FROZEN_TYPES = (str, int, float, bool, type(None), Decimal, date, time, timedelta, Enum)
+
+
+def freeze(value):
+    """
+    Hashable stand-in of chained method arguments, or UNHASHABLE. Values
+    are keyed on their type and repr, since equal values such as 1, 1.0
+    and True, or Decimal('1.5') and Decimal('1.50'), may compile to
+    different InfluxQL. Criteria and functions are keyed on their text;
+    other objects are not memoized, since they hash by identity.
+    """
+    if isinstance(value, (list, tuple)):
+        items = tuple(freeze(item) for item in value)
+        return UNHASHABLE if any(item is UNHASHABLE for item in items) else (type(value), items)
+    if isinstance(value, FROZEN_TYPES):
+        return type(value), repr(value)
+    if hasattr(value, 'evaluate') and not isinstance(value, RawQuery):
+        return type(value), value.evaluate()
+    return UNHASHABLE
+
+
+def clone_query(query):
+    clone = object.__new__(type(query))
+    clone.__dict__ = attributes = query.__dict__.copy()
+    for name, value in attributes.items():
+        if value.__class__ is list:
+            attributes[name] = value[:]
+    clone._prepared_query = None
+    return clone
+
+
+def get_chain_key(query):
+    """Key of the chain of calls that built a query, None when unhashable."""
+    if '_chain_key' in query.__dict__:
+        return query._chain_key
+    return type(query).__module__, type(query).__qualname__
+
+
+def chain(func):
+    """
+    Applies a query method to a clone of the query, which is returned, so
+    that a query is never modified once built and can be shared.
+
+    The clone is keyed on the key of the query and on the call, so that the
+    InfluxQL of identical chains is compiled once (see get_compiled_query).
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        clone = clone_query(self)
+        parent_key = get_chain_key(self)
+        call_key = freeze((func.__name__, args, tuple(sorted(kwargs.items())) if kwargs else ()))
+        if parent_key is None or call_key is UNHASHABLE:
+            clone._chain_key = None
+        else:
+            clone._chain_key = (parent_key, call_key)
+        return func(clone, *args, **kwargs)
+
+    return wrapper
+
+
+def get_compiled_query(key, compile_query):
+    if key is None:
+        return compile_query()
+    with _compiled_queries_lock:
+        compiled_query = _compiled_queries.get(key)
+        if compiled_query is not None:
+            _compiled_queries.move_to_end(key)
+            return compiled_query
+    compiled_query = compile_query()
+    with _compiled_queries_lock:
+        _compiled_queries[key] = compiled_query
+        if len(_compiled_queries) > COMPILED_QUERIES_MAX_SIZE:
+            _compiled_queries.popitem(last=False)
+    return compiled_query
+
+
 class RawQuery:
     def __init__(self, str_query=''):
         # self.db = db
         self.str_query = str_query
+        self.cache_ttl = None
+        self.django_cache = None
+        self.django_cache_timeout = DEFAULT_TIMEOUT
 
     def execute(self):
         return self.raw_response
@@ -115,10 +205,46 @@ class RawQuery:
     def raw_response(self):
         return self._resolve(db=getattr(self, "db", None))
 
-    @lru_cache(maxsize=None)
+    @chain
+    def ttl(self, seconds):
+        """
+        Caches the result for `seconds` in the query cache of the
+        connection, instead of its default TTL. 0 bypasses the cache.
+        """
+        if not isinstance(seconds, (int, float)) or seconds < 0:
+            msg = 'seconds must be a positive number'
+            raise exceptions.InfluxDBInvalidTypeError(msg)
+        self.cache_ttl = seconds
+        return self
+
+    @chain
+    def cache(self, timeout=DEFAULT_TIMEOUT, alias=None):
+        """
+        Reads and writes the result through the Django cache `alias` (the
+        query_cache_alias option by default), shared between processes.
+        """
+        self.django_cache = DjangoQueryCache(alias)
+        self.django_cache_timeout = timeout
+        return self
+
     def _resolve(self, *args, **kwargs):
         instance = Influxable.get_instance()
-        return instance.execute_query(query=self.str_query, method='post', database=kwargs.get('db'))
+        measurements = getattr(self, 'measurements', None)
+
+        def execute():
+            return instance.execute_query(
+                query=self.str_query,
+                method='post',
+                database=kwargs.get('db'),
+                measurement_name=measurements[0] if measurements else None,
+                cache_ttl=self.cache_ttl,
+                measurements=measurements or None,
+            )
+
+        if self.django_cache is None or not is_cacheable_query(self.str_query):
+            return execute()
+        key = self.django_cache.get_key(self.str_query, kwargs.get('db') or instance.database_name, 'ns')
+        return self.django_cache.get_or_execute(key, execute, self.django_cache_timeout)
 
 
 class SelectQueryClause:
@@ -135,6 +261,7 @@ class SelectQueryClause:
             msg = 'field type must be <str>'
             raise exceptions.InfluxDBInvalidTypeError(msg)
 
+    @chain
     def select(self, *fields):
         selected_fields = self.selected_fields
         for field in fields:
@@ -169,6 +296,7 @@ class IntoQueryClause:
             msg = 'measurement type must be <str>'
             raise exceptions.InfluxDBInvalidTypeError(msg)
 
+    @chain
     def into(self, measurement):
         self.validate_measurement(measurement)
         self.selected_into_measurement = measurement
@@ -188,6 +316,7 @@ class FromQueryClause:
         super(FromQueryClause, self).__init__()
         self.from_clause = 'FROM {measurements}'
         self.selected_measurements = 'default'
+        self.measurements = []
 
     def validate_measurements(self, measurements):
         if len(measurements) == 0:
@@ -198,8 +327,10 @@ class FromQueryClause:
                 msg = 'measurement type must be <str>'
                 raise exceptions.InfluxDBInvalidTypeError(msg)
 
+    @chain
     def from_measurements(self, *measurements):
         self.validate_measurements(measurements)
+        self.measurements = list(measurements)
         quoted_measurements = ['"{}"'.format(m) for m in measurements]
         self.selected_measurements = ','.join(quoted_measurements)
         return self
@@ -207,6 +338,7 @@ class FromQueryClause:
     def _prepare_from_clause(self):
         return self.from_clause.format(measurements=self.selected_measurements)
 
+    @chain
     def subquery(self, subquery):
         if not isinstance(subquery, Query):
             msg = 'subquery must be a Query instance'
@@ -230,11 +362,13 @@ class WhereQueryClause:
                 msg = 'Invalid criteria'
                 raise exceptions.InfluxDBInvalidTypeError(msg)
 
+    @chain
     def where(self, *criteria):
         self.validate_criteria(criteria)
         self.selected_criteria = list(criteria)
         return self
 
+    @chain
     def filter(self, *args, **kwargs):
         all_criteria = list(args) or []
         for key, value in kwargs.items():
@@ -243,12 +377,14 @@ class WhereQueryClause:
         self.selected_criteria.extend(all_criteria)
         return self
 
+    @chain
     def exclude(self, *args, **kwargs):
-        all_criteria = args or []
+        all_criteria = list(args) or []
         for key, value in kwargs.items():
             all_criteria.append(~process_filter(key, value))
         self.validate_criteria(all_criteria)
         self.selected_criteria.extend(all_criteria)
+        return self
 
     def _prepare_where_clause(self):
         where_clause = ''
@@ -269,6 +405,7 @@ class LimitQueryClause:
             msg = 'value must be a positive integer'
             raise exceptions.InfluxDBInvalidTypeError(msg)
 
+    @chain
     def limit(self, value):
         self.validate_value(value)
         self.limit_value = value
@@ -291,6 +428,7 @@ class SLimitQueryClause:
             msg = 'value must be a positive integer'
             raise exceptions.InfluxDBInvalidTypeError(msg)
 
+    @chain
     def slimit(self, value):
         self.validate_value(value)
         self.slimit_value = value
@@ -313,6 +451,7 @@ class OffsetQueryClause:
             msg = 'value must be a positive integer'
             raise exceptions.InfluxDBInvalidTypeError(msg)
 
+    @chain
     def offset(self, value):
         self.validate_value(value)
         self.offset_value = value
@@ -335,6 +474,7 @@ class SOffsetQueryClause:
             msg = 'value must be a positive integer'
             raise exceptions.InfluxDBInvalidTypeError(msg)
 
+    @chain
     def soffset(self, value):
         self.validate_value(value)
         self.soffset_value = value
@@ -385,6 +525,7 @@ class GroupByQueryClause:
         if fill is not None:
             self.validate_fill(fill)
 
+    @chain
     def group_by(self, *tags, shift=None, fill=None):
         if len(tags):
             interval = next((tag for tag in tags if isinstance(tag, timedelta)), None)
@@ -400,6 +541,7 @@ class GroupByQueryClause:
         self.has_group_by_tags = True
         return self
 
+    @chain
     def range_by(self, interval, shift=None, fill=None, tags=[]):
         if isinstance(interval, timedelta):
             interval = generate_interval_string(interval)
@@ -463,14 +605,17 @@ class OrderByQueryClause:
         self.is_chronological_sort = None
         self.field = None
 
+    @chain
     def asc(self):
         self.is_chronological_sort = True
         return self
 
+    @chain
     def desc(self):
         self.is_chronological_sort = False
         return self
 
+    @chain
     def order_by(self, field):
         self.is_chronological_sort = True
         self.field = field
@@ -505,6 +650,7 @@ class TimezoneClause:
             msg = 'value is an invalid timezone'
             raise exceptions.InfluxDBInvalidTypeError(msg)
 
+    @chain
     def tz(self, value):
         self.validate_timezone(value)
         self.timezone_value = value
@@ -583,11 +729,30 @@ class GenericQuery(
         super(GenericQuery, self).__init__()
 
 
+RESET_CLAUSES = {
+    'select': {'selected_fields': []},
+    'limit': {'limit_value': None},
+    'offset': {'offset_value': None},
+    'order_by': {'is_chronological_sort': None, 'field': None},
+}
+
+
 class Query(GenericQuery, RawQuery):
     def __init__(self, db=None):
         self.db = db
         super(Query, self).__init__()
 
+    @chain
+    def reset(self, *clauses):
+        """Clears clauses among 'select', 'limit', 'offset' and 'order_by'."""
+        for clause in clauses:
+            if clause not in RESET_CLAUSES:
+                msg = 'clause `{}` must be one of value of {}'.format(clause, list(RESET_CLAUSES))
+                raise exceptions.InfluxDBInvalidChoiceError(msg)
+            for name, value in RESET_CLAUSES[clause].items():
+                setattr(self, name, list(value) if isinstance(value, list) else value)
+        return self
+
     def _get_initial_query(self):
         initial_query = ' '.join([
             '{select_clause}',
@@ -607,7 +772,22 @@ class Query(GenericQuery, RawQuery):
     def explain(self):
         return self._get_prepared_query()
 
+    def __eq__(self, other):
+        if not isinstance(other, Query):
+            return NotImplemented
+        return (self.db, self._get_prepared_query()) == (other.db, other._get_prepared_query())
+
+    def __hash__(self):
+        return hash((self.db, self._get_prepared_query()))
+
     def _get_prepared_query(self):
+        prepared_query = getattr(self, '_prepared_query', None)
+        if prepared_query is None:
+            prepared_query = get_compiled_query(get_chain_key(self), self._compile_query)
+            self._prepared_query = prepared_query
+        return prepared_query
+
+    def _compile_query(self):
         initial_query = self._get_initial_query()
         select_clause = self._prepare_select_clause()
         into_clause = self._prepare_into_clause()
@@ -643,6 +823,21 @@ class Query(GenericQuery, RawQuery):
         self.str_query = prepared_query
         return super().execute()
 
+    def iterator(self, chunk_size=DEFAULT_QUERY_CHUNK_SIZE):
+        """
+        Rows of the query, streamed from a chunked response of at most
+        `chunk_size` rows per chunk instead of being loaded at once.
+        """
+        measurements = self.measurements
+        responses = Influxable.get_instance().iter_query(
+            query=self._get_prepared_query(),
+            chunk_size=chunk_size,
+            method='post',
+            database=self.db,
+            measurement_name=measurements[0] if measurements else None,
+        )
+        return iter_formatted_rows(responses)
+
     def format(self, result, parser_class=BaseSerializer, **kwargs):
         return parser_class(result, **kwargs).convert()
 
@@ -655,11 +850,17 @@ class Query(GenericQuery, RawQuery):
 
 class BulkInsertQuery(RawQuery):
 
-    def __init__(self, str_points, db=None):
+    def __init__(self, str_points, db=None, precision='ns', retention_policy=None):
         super(BulkInsertQuery, self).__init__(str_points)
         self.db = db
+        self.precision = precision
+        self.retention_policy = retention_policy
 
-    @lru_cache(maxsize=None)
     def _resolve(self, *args, **kwargs):
         instance = Influxable.get_instance()
-        return instance.write_points(points=self.str_query, database=kwargs.get('db'))
+        return instance.write_points(
+            points=self.str_query,
+            precision=self.precision,
+            retention_policy_name=self.retention_policy,
+            database=kwargs.get('db'),
+        )
@@ -1,9 +1,19 @@
+import gzip
 import json
 import requests
 from . import exceptions
 from simplejson import JSONDecodeError
 
 
+def get_sent_points(kwargs):
+    points = kwargs.get('data', '')
+    headers = kwargs.get('headers') or {}
+    if headers.get('Content-Encoding') == 'gzip' \
+            and isinstance(points, (bytes, bytearray)):
+        points = gzip.decompress(points)
+    return points
+
+
 def raise_if_error(func):
     def func_wrapper(*args, **kwargs):
         json_res = {}
@@ -11,10 +21,12 @@ def raise_if_error(func):
         try:
             request = args[0]
             res = func(*args, **kwargs)
-            try:
-                json_res = res.json()
-            except (json.decoder.JSONDecodeError, JSONDecodeError):
-                json_res = {}
+            # the body of a streamed response is left to the caller
+            if not kwargs.get('stream') or not res.ok:
+                try:
+                    json_res = res.json()
+                except (json.decoder.JSONDecodeError, JSONDecodeError):
+                    json_res = {}
             res.raise_for_status()
 
         except requests.exceptions.MissingSchema as err:
@@ -32,19 +44,24 @@ def raise_if_error(func):
 
             if json_res and 'error' in json_res and \
                     json_res['error'].endswith('invalid number'):
-                points = kwargs['data']
+                points = get_sent_points(kwargs)
                 raise exceptions.InfluxDBInvalidNumberError(points)
 
             if json_res and 'error' in json_res and \
                     json_res['error'].endswith('invalid boolean'):
-                points = kwargs['data']
+                points = get_sent_points(kwargs)
                 raise exceptions.InfluxDBInvalidBooleanError(points)
 
             if json_res and 'error' in json_res and \
                     json_res['error'].endswith('bad timestamp'):
-                points = kwargs['data']
+                points = get_sent_points(kwargs)
                 raise exceptions.InfluxDBInvalidTimestampError(points)
 
+            # the points of the other lines were written
+            if json_res and 'error' in json_res and \
+                    json_res['error'].startswith('partial write: unable to parse'):
+                raise exceptions.InfluxDBUnparsableLinesError(json_res['error'])
+
             if res.status_code == 400:
                 query = params.get('q', kwargs.get('data', ''))
                 if query == '':
@@ -0,0 +1,275 @@
+import math
+import time
+from datetime import timedelta
+from .attributes import NANOSECONDS_PER_PRECISION, NANOSECONDS_PER_SECOND
+from .exceptions import InfluxDBAttributeValueError, InfluxDBInvalidChoiceError
+from .line_protocol import escape_key, join_line, split_fields, split_line
+
+DOWNSAMPLING_FUNCTIONS = (
+    'COUNT',
+    'FIRST',
+    'LAST',
+    'MAX',
+    'MEAN',
+    'MIN',
+    'SPREAD',
+    'STDDEV',
+    'SUM',
+)
+
+ALL_FIELDS = '*'
+
+
+def get_window_nanoseconds(window):
+    if isinstance(window, timedelta):
+        nanoseconds = window // timedelta(microseconds=1) * 1000
+    elif isinstance(window, (int, float)) and not isinstance(window, bool):
+        nanoseconds = round(window * NANOSECONDS_PER_SECOND)
+    else:
+        raise InfluxDBAttributeValueError('window must be a number of seconds or a timedelta')
+    if nanoseconds <= 0:
+        raise InfluxDBAttributeValueError('window must be positive')
+    return nanoseconds
+
+
+def parse_number(value):
+    """Returns the number and integer suffix of a field value, if numeric."""
+    last_char = value[-1]
+    if last_char == '"' or value[0] in 'tTfF':
+        return None, None
+    if last_char in ('i', 'u'):
+        return int(value[:-1]), last_char
+    return float(value), ''
+
+
+def format_number(value, suffix):
+    if suffix:
+        return '{}{}'.format(int(value), suffix)
+    return str(float(value))
+
+
+class FieldStats:
+    """Running aggregates of the values of one field in one window."""
+
+    __slots__ = (
+        'count',
+        'first',
+        'last',
+        'nb_numbers',
+        'suffix',
+        'sum',
+        'min',
+        'max',
+        'mean',
+        'm2',
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.nb_numbers = 0
+        self.suffix = None
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value, timestamp):
+        self.count += 1
+        if self.first is None or timestamp < self.first[0]:
+            self.first = (timestamp, value)
+        if self.last is None or timestamp >= self.last[0]:
+            self.last = (timestamp, value)
+        number, suffix = parse_number(value)
+        if number is None:
+            return
+        self.nb_numbers += 1
+        self.suffix = suffix if self.suffix in (None, suffix) else ''
+        self.sum += number
+        if self.min is None or number < self.min:
+            self.min = number
+        if self.max is None or number > self.max:
+            self.max = number
+        delta = number - self.mean
+        self.mean += delta / self.nb_numbers
+        self.m2 += delta * (number - self.mean)
+
+    def get_value(self, identifier):
+        """Formatted value of an aggregation, or None when it has no value."""
+        if identifier == 'COUNT':
+            return '{}i'.format(self.count)
+        if identifier == 'FIRST':
+            return self.first[1]
+        if identifier == 'LAST':
+            return self.last[1]
+        if not self.nb_numbers:
+            return None
+        if identifier == 'MEAN':
+            return format_number(self.sum / self.nb_numbers, '')
+        if identifier == 'STDDEV':
+            if self.nb_numbers < 2:
+                return None
+            return format_number(math.sqrt(self.m2 / (self.nb_numbers - 1)), '')
+        if identifier == 'SUM':
+            return format_number(self.sum, self.suffix)
+        if identifier == 'MIN':
+            return format_number(self.min, self.suffix)
+        if identifier == 'MAX':
+            return format_number(self.max, self.suffix)
+        return format_number(self.max - self.min, self.suffix)
+
+
+class Downsampling:
+    """
+    Pre-aggregation of the points of each series into one point per
+    `window` (in seconds, or a timedelta), timestamped at the start of the
+    window like GROUP BY time() does.
+
+    `functions` are instances of the query functions Count, First, Last,
+    Max, Mean, Min, Spread, StdDev and Sum, e.g. Mean('value'), or
+    Count('*') for every field. Each one gives a field named like InfluxDB
+    names the result of `SELECT mean(*)`, e.g. mean_value.
+    """
+
+    def __init__(self, window, functions):
+        self.window = get_window_nanoseconds(window)
+        if not functions:
+            raise InfluxDBAttributeValueError('at least one aggregation function is required')
+        specs = []
+        for function in functions:
+            identifier = getattr(function, 'identifier', None)
+            if identifier not in DOWNSAMPLING_FUNCTIONS:
+                msg = 'aggregation `{}` must be one of value of {}'.format(
+                    identifier or function,
+                    DOWNSAMPLING_FUNCTIONS,
+                )
+                raise InfluxDBInvalidChoiceError(msg)
+            if not isinstance(function.field, str):
+                raise InfluxDBAttributeValueError('aggregations must be applied to a field name')
+            field = function.field
+            if field != ALL_FIELDS:
+                field = escape_key(field)
+            specs.append((identifier, field))
+        self.functions = tuple(specs)
+        self._all_field_functions = tuple(
+            identifier for identifier, field in specs if field == ALL_FIELDS
+        )
+        self._field_functions = {
+            field: tuple(dict.fromkeys(
+                identifier for identifier, f in specs if f in (field, ALL_FIELDS)
+            ))
+            for _, field in specs
+            if field != ALL_FIELDS
+        }
+
+    def __repr__(self):
+        return '<Downsampling {}ns {}>'.format(self.window, self.functions)
+
+    def __eq__(self, other):
+        if not isinstance(other, Downsampling):
+            return NotImplemented
+        return (self.window, self.functions) == (other.window, other.functions)
+
+    def __hash__(self):
+        return hash((self.window, self.functions))
+
+    def get_window(self, precision):
+        """Window in units of `precision`."""
+        nanoseconds_per_unit = NANOSECONDS_PER_PRECISION[precision]
+        if self.window % nanoseconds_per_unit:
+            raise InfluxDBAttributeValueError(
+                'window must be a multiple of the precision `{}`'.format(precision)
+            )
+        return self.window // nanoseconds_per_unit
+
+    def get_functions(self, field):
+        return self._field_functions.get(field, self._all_field_functions)
+
+    def format_fields(self, stats):
+        fields = []
+        for field, field_stats in stats.items():
+            for identifier in self.get_functions(field):
+                value = field_stats.get_value(identifier)
+                if value is not None:
+                    fields.append('{}_{}={}'.format(identifier.lower(), field, value))
+        return ','.join(fields)
+
+
+class AggregationBuffer:
+    """
+    Buffer folding line protocol points into one aggregated point per
+    series key and window of `downsampling`. Points without timestamp are
+    put in the current window.
+
+    `nb_bytes` only accounts for series keys, the size of aggregated points
+    being known once they are formatted.
+    """
+
+    def __init__(self, downsampling, precision='ns'):
+        self.downsampling = downsampling
+        self.precision = precision
+        self.window = downsampling.get_window(precision)
+        self.nb_bytes = 0
+        self._windows = {}
+
+    def __len__(self):
+        return len(self._windows)
+
+    def get_current_timestamp(self):
+        return time.time_ns() // NANOSECONDS_PER_PRECISION[self.precision]
+
+    def add(self, line):
+        series_key, fields, timestamp = split_line(line)
+        if timestamp is None:
+            timestamp = self.get_current_timestamp()
+        else:
+            timestamp = int(timestamp)
+        key = (series_key, timestamp - timestamp % self.window)
+        stats = self._windows.get(key)
+        if stats is None:
+            stats = self._windows[key] = {}
+            self.nb_bytes += len(series_key) + 1
+        get_functions = self.downsampling.get_functions
+        for field, value in split_fields(fields):
+            if not get_functions(field):
+                continue
+            field_stats = stats.get(field)
+            if field_stats is None:
+                field_stats = stats[field] = FieldStats()
+            field_stats.add(value, timestamp)
+
+    def extend(self, lines):
+        for line in lines:
+            self.add(line)
+
+    def split(self, until=None):
+        """
+        Moves the windows not ended at `until` (the current time by
+        default) to a new buffer, which is returned.
+        """
+        if until is None:
+            until = self.get_current_timestamp()
+        open_buffer = AggregationBuffer(self.downsampling, self.precision)
+        open_keys = [key for key in self._windows if key[1] + self.window > until]
+        for key in open_keys:
+            open_buffer._windows[key] = self._windows.pop(key)
+            nb_bytes = len(key[0]) + 1
+            self.nb_bytes -= nb_bytes
+            open_buffer.nb_bytes += nb_bytes
+        return open_buffer
+
+    def lines(self):
+        lines = []
+        for (series_key, start), stats in self._windows.items():
+            fields = self.downsampling.format_fields(stats)
+            if fields:
+                lines.append(join_line(series_key, fields, str(start)))
+        return lines
+
+
+def aggregate_lines(lines, downsampling, precision='ns'):
+    buffer = AggregationBuffer(downsampling, precision)
+    buffer.extend(lines)
+    return buffer.lines()
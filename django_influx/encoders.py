@@ -0,0 +1,464 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from .attributes import NANOSECONDS_PER_PRECISION, BooleanFieldAttribute, \
+    FloatFieldAttribute, GenericFieldAttribute, IntegerFieldAttribute, \
+    StringFieldAttribute, TagFieldAttribute, TimestampFieldAttribute, \
+    TimestampPrecision
+from .exceptions import InfluxDBAttributeValueError
+from .line_protocol import KEY_ESCAPE_CHARS, STRING_ESCAPE_CHARS, \
+    escape_key, escape_measurement, escape_tag_value, quote_string
+
+NANOSECONDS_PER_SECOND = 1000 * 1000 * 1000
+DEFAULT_SERIES_KEY_CACHE_SIZE = 4096
+
+
+class FieldKind:
+    BOOLEAN = 'boolean'
+    FLOAT = 'float'
+    INTEGER = 'integer'
+    STRING = 'string'
+
+
+def _format_integer(value):
+    return '{}i'.format(value)
+
+
+def _format_boolean(value):
+    return 'true' if value else 'false'
+
+
+FIELD_FORMATTERS = {
+    GenericFieldAttribute.to_influx: None,
+    IntegerFieldAttribute.to_influx: _format_integer,
+    FloatFieldAttribute.to_influx: str,
+    StringFieldAttribute.to_influx: quote_string,
+    BooleanFieldAttribute.to_influx: _format_boolean,
+}
+
+
+def _format_integer_bytes(value):
+    if type(value) is int:
+        return b'%di' % value
+    return _format_integer(value).encode('utf-8')
+
+
+def _format_float_bytes(value):
+    return str(value).encode('utf-8')
+
+
+def _format_string_bytes(value):
+    return quote_string(value).encode('utf-8')
+
+
+def _format_boolean_bytes(value):
+    return b'true' if value else b'false'
+
+
+BYTES_FIELD_FORMATTERS = {
+    GenericFieldAttribute.to_influx: None,
+    IntegerFieldAttribute.to_influx: _format_integer_bytes,
+    FloatFieldAttribute.to_influx: _format_float_bytes,
+    StringFieldAttribute.to_influx: _format_string_bytes,
+    BooleanFieldAttribute.to_influx: _format_boolean_bytes,
+}
+
+
+def _escape_series(series, chars):
+    series = series.astype(str)
+    for char in chars:
+        series = series.str.replace(char, '\\' + char, regex=False)
+    return series
+
+
+def _empty_series(index):
+    return pd.Series('', index=index, dtype=object)
+
+
+class DataFrameEncoder:
+    """
+    Encodes a pandas DataFrame to line protocol column by column, using the
+    declared attributes of a Measurement class to choose how each column is
+    formatted. Undeclared columns are formatted from their dtype.
+
+    Numeric timestamps are epoch seconds, like TimestampFieldAttribute, and
+    naive datetimes are considered UTC. Lines are written in nanoseconds.
+    """
+
+    def __init__(self, measurement_cls, tag_columns=None, time_column=None, field_columns=None):
+        self.measurement_cls = measurement_cls
+        self.tag_columns = tag_columns
+        self.time_column = time_column
+        self.field_columns = field_columns
+        self.attributes = self.get_declared_attributes(measurement_cls)
+
+    @staticmethod
+    def get_declared_attributes(measurement_cls):
+        declared_attributes = {}
+        for attr in measurement_cls._get_attributes():
+            declared_attributes[attr.name] = attr
+            declared_attributes[attr.attribute_name] = attr
+        return declared_attributes
+
+    def resolve_columns(self, df):
+        columns = list(df.columns)
+        tag_columns = self.tag_columns
+        if tag_columns is None:
+            tag_columns = [
+                c for c in columns
+                if isinstance(self.attributes.get(c), TagFieldAttribute)
+            ]
+        time_column = self.time_column
+        if time_column is None:
+            time_column = next((
+                c for c in columns
+                if isinstance(self.attributes.get(c), TimestampFieldAttribute)
+            ), None)
+        field_columns = self.field_columns
+        if field_columns is None:
+            field_columns = [
+                c for c in columns
+                if c not in tag_columns and c != time_column
+            ]
+        for column in list(tag_columns) + list(field_columns):
+            if column not in columns:
+                msg = 'Unknown column : {}'.format(column)
+                raise InfluxDBAttributeValueError(msg)
+        if time_column is not None and time_column not in columns:
+            msg = 'Unknown time column : {}'.format(time_column)
+            raise InfluxDBAttributeValueError(msg)
+        if not field_columns:
+            raise InfluxDBAttributeValueError('at least one field column is required')
+        return tag_columns, field_columns, time_column
+
+    def get_field_kind(self, column, series):
+        attr = self.attributes.get(column)
+        if isinstance(attr, BooleanFieldAttribute):
+            return FieldKind.BOOLEAN
+        if isinstance(attr, FloatFieldAttribute):
+            return FieldKind.FLOAT
+        if isinstance(attr, IntegerFieldAttribute):
+            return FieldKind.INTEGER
+        if isinstance(attr, StringFieldAttribute):
+            return FieldKind.STRING
+        dtype = series.dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            return FieldKind.BOOLEAN
+        if pd.api.types.is_integer_dtype(dtype):
+            return FieldKind.INTEGER
+        if pd.api.types.is_float_dtype(dtype):
+            return FieldKind.FLOAT
+        return FieldKind.STRING
+
+    def get_key(self, column):
+        attr = self.attributes.get(column)
+        name = attr.name if attr is not None else column
+        return escape_key(name)
+
+    def encode_field(self, column, series):
+        kind = self.get_field_kind(column, series)
+        if kind == FieldKind.FLOAT:
+            values = pd.to_numeric(series, errors='raise').astype('float64')
+            mask = np.isfinite(values.to_numpy())
+            values = values[mask]
+            max_nb_decimals = getattr(self.attributes.get(column), 'max_nb_decimals', None)
+            if max_nb_decimals is None:
+                values = values.astype(str)
+            else:
+                # rounded half to even from the exact value, as Decimal.quantize
+                values = pd.Series(
+                    np.char.mod('%.{}f'.format(max_nb_decimals), values.to_numpy()),
+                    index=values.index,
+                    dtype=object,
+                )
+        else:
+            mask = series.notna().to_numpy(dtype=bool)
+            values = series[mask]
+            if kind == FieldKind.INTEGER:
+                values = pd.to_numeric(values, errors='raise')
+                if pd.api.types.is_float_dtype(values.dtype) and (values % 1 != 0).any():
+                    msg = 'Non-integral value for integer column : {}'.format(column)
+                    raise InfluxDBAttributeValueError(msg)
+                values = values.astype('int64').astype(str) + 'i'
+            elif kind == FieldKind.BOOLEAN:
+                if not pd.api.types.is_bool_dtype(values.dtype) \
+                        and not values.map(lambda value: isinstance(value, (bool, np.bool_))).all():
+                    msg = 'Non-boolean value for boolean column : {}'.format(column)
+                    raise InfluxDBAttributeValueError(msg)
+                values = values.map({True: 'true', False: 'false'})
+            else:
+                values = '"' + _escape_series(values, STRING_ESCAPE_CHARS) + '"'
+        encoded = _empty_series(series.index)
+        encoded[mask] = (',' + self.get_key(column) + '=' + values).to_numpy(dtype=object)
+        return encoded
+
+    def encode_tag(self, column, series):
+        values = series.astype(object).where(series.notna(), '')
+        values = values.astype(str).str.strip()
+        mask = (values != '').to_numpy()
+        values = _escape_series(values[mask], KEY_ESCAPE_CHARS)
+        encoded = _empty_series(series.index)
+        encoded[mask] = (',' + self.get_key(column) + '=' + values).to_numpy(dtype=object)
+        return encoded
+
+    def encode_time(self, series):
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            if getattr(series.dt, 'tz', None) is not None:
+                series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+            mask = series.notna().to_numpy()
+            nanoseconds = series[mask].to_numpy().astype('datetime64[ns]').astype('int64')
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            mask = np.ones(len(series), dtype=bool)
+            nanoseconds = series.to_numpy().astype('int64') * NANOSECONDS_PER_SECOND
+        elif pd.api.types.is_float_dtype(series.dtype):
+            mask = np.isfinite(series.to_numpy())
+            nanoseconds = np.round(
+                series.to_numpy()[mask] * NANOSECONDS_PER_SECOND
+            ).astype('int64')
+        else:
+            msg = 'time column must be datetime or numeric'
+            raise InfluxDBAttributeValueError(msg)
+        encoded = _empty_series(series.index)
+        encoded[mask] = (' ' + pd.Series(nanoseconds).astype(str)).to_numpy(dtype=object)
+        return encoded
+
+    def encode(self, df):
+        tag_columns, field_columns, time_column = self.resolve_columns(df)
+        index = df.index
+        lines = pd.Series(escape_measurement(self.measurement_cls.measurement_name), index=index, dtype=object)
+        for column in tag_columns:
+            lines += self.encode_tag(column, df[column])
+
+        fields = _empty_series(index)
+        for column in field_columns:
+            fields += self.encode_field(column, df[column])
+        has_fields = (fields != '').to_numpy()
+        lines += ' ' + fields.str[1:]
+
+        if time_column is not None:
+            lines += self.encode_time(df[time_column])
+        elif isinstance(index, pd.DatetimeIndex):
+            lines += self.encode_time(index.to_series(index=index))
+        return lines[has_fields]
+
+
+class MeasurementEncoder:
+    """
+    Line protocol encoder compiled once per Measurement class: attribute
+    order, escaped keys and value formatters are resolved when the class is
+    created, so encoding a point is a single pass over its attributes.
+
+    Attributes whose to_influx is overridden by a custom subclass keep
+    being formatted through their own to_influx.
+
+    Timestamps are written in the precision of the first timestamp
+    attribute, which is the precision points must be sent with.
+
+    Series keys are cached by raw tag values, along with their encoded
+    form, in a LRU cache of `series_key_cache_size` entries (unbounded when
+    None, disabled when 0), whose statistics are returned by cache_info().
+
+    encode_into() and encode_row_into() append encoded points to a
+    bytearray (see LineProtocolBuilder) from pre-encoded keys, without
+    building an intermediate line.
+    """
+
+    def __init__(
+        self,
+        measurement_cls,
+        ext_attribute_prefix='',
+        series_key_cache_size=DEFAULT_SERIES_KEY_CACHE_SIZE,
+    ):
+        self.prefix = escape_measurement(measurement_cls.measurement_name)
+        self.prefix_bytes = self.prefix.encode('utf-8')
+        self.attributes = measurement_cls._get_attributes()
+        self.ext_names = [attr.ext_attribute_name for attr in self.attributes]
+        self.indexes = {}
+        self.tags = []
+        self.fields = []
+        self.timestamps = []
+        self.precision = TimestampPrecision.NANOSECONDS
+        for index, attr in enumerate(self.attributes):
+            ext_name = attr.ext_attribute_name
+            self.indexes[ext_name[len(ext_attribute_prefix):]] = index
+            self.indexes[attr.name] = index
+            if isinstance(attr, TimestampFieldAttribute):
+                if not self.timestamps:
+                    self.precision = attr.precision
+                is_default = type(attr).to_influx is TimestampFieldAttribute.to_influx
+                self.timestamps.append((index, is_default))
+            elif isinstance(attr, TagFieldAttribute):
+                self.tags.append((index, ',' + escape_key(attr.name) + '='))
+            else:
+                formatter = FIELD_FORMATTERS.get(type(attr).to_influx, None)
+                self.fields.append((index, escape_key(attr.name) + '=', formatter))
+        self.tag_keys = [key for _, key in self.tags]
+        self.tag_indexes = [index for index, _ in self.tags]
+        self.byte_fields = [
+            (
+                index,
+                key.encode('utf-8'),
+                BYTES_FIELD_FORMATTERS.get(type(self.attributes[index]).to_influx, None),
+            )
+            for index, key, _ in self.fields
+        ]
+        self._get_series_keys = lru_cache(maxsize=series_key_cache_size, typed=True)(
+            self.build_series_keys
+        )
+
+    def cache_info(self):
+        return self._get_series_keys.cache_info()
+
+    def cache_clear(self):
+        self._get_series_keys.cache_clear()
+
+    def build_series_key(self, tag_values):
+        series_key = self.prefix
+        for key, value in zip(self.tag_keys, tag_values):
+            if value is None:
+                continue
+            tag_value = escape_tag_value(value)
+            if tag_value:
+                series_key += key + tag_value
+        return series_key
+
+    def build_series_key_bytes(self, tag_values):
+        return self.build_series_key(tag_values).encode('utf-8')
+
+    def build_series_keys(self, tag_values):
+        series_key = self.build_series_key(tag_values)
+        return series_key, series_key.encode('utf-8')
+
+    def encode_series_key(self, values):
+        if not self.tags:
+            return self.prefix
+        tag_values = tuple([values[index] for index in self.tag_indexes])
+        try:
+            return self._get_series_keys(tag_values)[0]
+        except TypeError:
+            return self.build_series_key(tag_values)
+
+    def encode_series_key_bytes(self, values):
+        if not self.tags:
+            return self.prefix_bytes
+        tag_values = tuple([values[index] for index in self.tag_indexes])
+        try:
+            return self._get_series_keys(tag_values)[1]
+        except TypeError:
+            return self.build_series_key_bytes(tag_values)
+
+    def encode_fields(self, values):
+        fields = []
+        for index, key, formatter in self.fields:
+            value = values[index]
+            if value is None:
+                continue
+            if formatter is None:
+                fields.append(key + self.attributes[index].to_influx(value))
+            else:
+                fields.append(key + formatter(value))
+        return ','.join(fields)
+
+    def format_timestamp(self, attr, value):
+        if attr.precision != self.precision:
+            value = value * NANOSECONDS_PER_PRECISION[attr.precision] \
+                // NANOSECONDS_PER_PRECISION[self.precision]
+        return str(int(value))
+
+    def encode_line(self, values, timestamp):
+        line = self.encode_series_key(values) + ' ' + self.encode_fields(values)
+        if timestamp is not None:
+            line += ' ' + timestamp
+        return line
+
+    def encode_line_into(self, buffer, values, timestamp):
+        buffer += self.encode_series_key_bytes(values)
+        separator = b' '
+        for index, key, formatter in self.byte_fields:
+            value = values[index]
+            if value is None:
+                continue
+            buffer += separator
+            buffer += key
+            if formatter is None:
+                buffer += self.attributes[index].to_influx(value).encode('utf-8')
+            else:
+                buffer += formatter(value)
+            separator = b','
+        if timestamp is not None:
+            buffer += b' '
+            buffer += timestamp.encode('utf-8')
+        buffer += b'\n'
+
+    def get_point_values(self, point):
+        """Returns the internal values and the formatted timestamp of a point."""
+        point_attributes = point.__dict__
+        attributes = [point_attributes[ext_name] for ext_name in self.ext_names]
+        timestamp = None
+        for index, is_default in self.timestamps:
+            attr = attributes[index]
+            if is_default:
+                formatted_timestamp = getattr(attr, 'formatted_timestamp', None)
+                if formatted_timestamp is not None:
+                    timestamp = self.format_timestamp(attr, formatted_timestamp)
+                    break
+            elif attr._value is not None:
+                timestamp = attr.get_prep_value()
+                break
+        return [attr._value for attr in attributes], timestamp
+
+    def encode(self, point):
+        return self.encode_line(*self.get_point_values(point))
+
+    def encode_into(self, buffer, point):
+        self.encode_line_into(buffer, *self.get_point_values(point))
+
+    def get_row_values(self, row):
+        nb_attributes = len(self.attributes)
+        if isinstance(row, dict):
+            values = [None] * nb_attributes
+            for key, value in row.items():
+                index = self.indexes.get(key)
+                if index is None:
+                    msg = 'Unknown attribute : {}'.format(key)
+                    raise InfluxDBAttributeValueError(msg)
+                values[index] = value
+            return values
+        values = list(row)
+        if len(values) > nb_attributes:
+            msg = 'row has {} values for {} attributes'.format(len(values), nb_attributes)
+            raise InfluxDBAttributeValueError(msg)
+        return values + [None] * (nb_attributes - len(values))
+
+    def prepare_row_values(self, values):
+        prepared_values = []
+        for attr, value in zip(self.attributes, values):
+            try:
+                prepared_values.append(attr.prepare_value(value))
+            except Exception as err:
+                msg = '<\'{key}\'> : {msg}'.format(key=attr.name, msg=err)
+                raise InfluxDBAttributeValueError(msg)
+        return prepared_values
+
+    def get_row_timestamp(self, values):
+        for index, is_default in self.timestamps:
+            value = values[index]
+            if value is None:
+                continue
+            attr = self.attributes[index]
+            if is_default:
+                return self.format_timestamp(attr, value)
+            return attr.to_influx(value)
+        return None
+
+    def encode_row(self, row):
+        """
+        Encodes a tuple, in declared attribute order, or a dict keyed by
+        attribute name, without instantiating the Measurement.
+        """
+        values = self.prepare_row_values(self.get_row_values(row))
+        return self.encode_line(values, self.get_row_timestamp(values))
+
+    def encode_row_into(self, buffer, row):
+        values = self.prepare_row_values(self.get_row_values(row))
+        self.encode_line_into(buffer, values, self.get_row_timestamp(values))
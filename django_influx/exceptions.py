@@ -81,6 +81,15 @@ class InfluxDBInvalidTimestampError(InfluxDBError):
         super().__init__(self.message)
 
 
+class InfluxDBUnparsableLinesError(InfluxDBError):
+    MESSAGE_PLACEHOLDER = 'Unparsable lines : {error}'
+
+    def __init__(self, error):
+        self.error = error
+        self.message = self.MESSAGE_PLACEHOLDER.format(error=error)
+        super().__init__(self.message)
+
+
 class InfluxDBUnauthorizedError(InfluxDBError):
     MESSAGE = 'Authorization Failed (Bad credentials)'
 
@@ -91,3 +100,56 @@ class InfluxDBUnauthorizedError(InfluxDBError):
 
 class InfluxDBAttributeValueError(InfluxDBError):
     pass
+
+
+class InfluxDBBulkSaveError(InfluxDBError):
+    MESSAGE_PLACEHOLDER = '{nb_failed} of {nb_batches} batches failed : {errors}'
+
+    def __init__(self, result):
+        self.result = result
+        failed_batches = result.failed_batches
+        self.message = self.MESSAGE_PLACEHOLDER.format(
+            nb_failed=len(failed_batches),
+            nb_batches=len(result.batches),
+            errors='; '.join(
+                'batch {} ({})'.format(
+                    b.index,
+                    b.exception or '{} rejected lines'.format(len(b.rejected)),
+                )
+                for b in failed_batches
+            ),
+        )
+        super().__init__(self.message)
+
+
+class InfluxDBWriteDroppedError(InfluxDBError):
+    MESSAGE_PLACEHOLDER = 'Write rate exceeded, dropped {nb_points} points'
+
+    def __init__(self, nb_points):
+        self.nb_points = nb_points
+        self.message = self.MESSAGE_PLACEHOLDER.format(nb_points=nb_points)
+        super().__init__(self.message)
+
+
+class InfluxDBWriteThrottledError(InfluxDBError):
+    MESSAGE_PLACEHOLDER = 'Write rate exceeded, {delay:.3f}s of tokens missing'
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.message = self.MESSAGE_PLACEHOLDER.format(delay=delay)
+        super().__init__(self.message)
+
+
+class InfluxDBShardWriteError(InfluxDBError):
+    MESSAGE_PLACEHOLDER = '{nb_points} points not written to {nb_nodes} nodes : {errors}'
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.lines = [line for lines, _ in failures for line in lines]
+        self.error = failures[0][1]
+        self.message = self.MESSAGE_PLACEHOLDER.format(
+            nb_points=len(self.lines),
+            nb_nodes=len(failures),
+            errors='; '.join(str(err) for _, err in failures),
+        )
+        super().__init__(self.message)
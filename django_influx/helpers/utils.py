@@ -11,6 +11,15 @@ INTERVAL_MAPPING = {
 }
 
 
+TRUE_STRINGS = ('1', 'true', 'yes', 'on')
+
+
+def to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_STRINGS
+    return bool(value)
+
+
 def inv(x):
     return 1 / x if x else 0
 
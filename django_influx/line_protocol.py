@@ -0,0 +1,141 @@
+MEASUREMENT_ESCAPE_CHARS = (',', ' ')
+KEY_ESCAPE_CHARS = (',', '=', ' ')
+STRING_ESCAPE_CHARS = ('\\', '"')
+
+
+def _escape(value, chars):
+    for char in chars:
+        if char in value:
+            value = value.replace(char, '\\' + char)
+    return value
+
+
+def escape_measurement(value):
+    return _escape(str(value), MEASUREMENT_ESCAPE_CHARS)
+
+
+def escape_key(value):
+    return _escape(str(value), KEY_ESCAPE_CHARS)
+
+
+def escape_tag_value(value):
+    return _escape(str(value).strip(), KEY_ESCAPE_CHARS)
+
+
+def quote_string(value):
+    return '"{}"'.format(_escape(str(value), STRING_ESCAPE_CHARS))
+
+
+def _find(line, char, start=0, quoted=False):
+    """
+    Index of the first unescaped `char` in `line` from `start`, ignoring
+    double-quoted sections when `quoted` is set, or -1.
+    """
+    in_quotes = False
+    index = start
+    length = len(line)
+    while index < length:
+        current = line[index]
+        if current == '\\':
+            index += 2
+            continue
+        if quoted and current == '"':
+            in_quotes = not in_quotes
+        elif current == char and not in_quotes:
+            return index
+        index += 1
+    return -1
+
+
+def split_line(line):
+    """
+    Splits a line into its series key (measurement and tag set), field set
+    and timestamp, which is None when the line has none.
+    """
+    if '\\' not in line and '"' not in line:
+        parts = line.split(' ')
+        if len(parts) == 2:
+            return parts[0], parts[1], None
+        if len(parts) == 3:
+            return parts[0], parts[1], parts[2]
+        raise ValueError('invalid line : {}'.format(line))
+    end_of_key = _find(line, ' ')
+    if end_of_key == -1:
+        raise ValueError('invalid line : {}'.format(line))
+    series_key = line[:end_of_key]
+    end_of_fields = _find(line, ' ', end_of_key + 1, quoted=True)
+    if end_of_fields == -1:
+        return series_key, line[end_of_key + 1:], None
+    return series_key, line[end_of_key + 1:end_of_fields], line[end_of_fields + 1:]
+
+
+def split_fields(fields):
+    """Splits a field set into (key, formatted value) pairs."""
+    if '\\' not in fields and '"' not in fields:
+        return [field.split('=', 1) for field in fields.split(',')]
+    pairs = []
+    start = 0
+    while start < len(fields):
+        end = _find(fields, ',', start, quoted=True)
+        if end == -1:
+            end = len(fields)
+        field = fields[start:end]
+        separator = _find(field, '=')
+        pairs.append((field[:separator], field[separator + 1:]))
+        start = end + 1
+    return pairs
+
+
+def join_line(series_key, fields, timestamp=None):
+    line = series_key + ' ' + fields
+    if timestamp is not None:
+        line += ' ' + timestamp
+    return line
+
+
+def get_measurement_name(line):
+    """Unescaped measurement name of a line or a series key."""
+    index = 0
+    length = len(line)
+    while index < length:
+        current = line[index]
+        if current == '\\':
+            index += 2
+            continue
+        if current in MEASUREMENT_ESCAPE_CHARS:
+            break
+        index += 1
+    name = line[:index]
+    if '\\' in name:
+        for char in MEASUREMENT_ESCAPE_CHARS:
+            name = name.replace('\\' + char, char)
+    return name
+
+
+def count_lines(data):
+    """
+    Number of newline terminated lines of a /write body, counted in place
+    when it is a view of a whole buffer.
+    """
+    if isinstance(data, memoryview):
+        obj = data.obj
+        if isinstance(obj, (bytes, bytearray)) and len(obj) == data.nbytes:
+            data = obj
+        else:
+            data = data.tobytes()
+    return data.count(b'\n')
+
+
+def split_tags(series_key):
+    """(key, value) pairs of the tag set of a series key, left escaped."""
+    if '\\' not in series_key:
+        return [tag.split('=', 1) for tag in series_key.split(',')[1:]]
+    pairs = []
+    start = _find(series_key, ',')
+    while start != -1:
+        end = _find(series_key, ',', start + 1)
+        tag = series_key[start + 1:] if end == -1 else series_key[start + 1:end]
+        separator = _find(tag, '=')
+        pairs.append((tag[:separator], tag[separator + 1:]))
+        start = end
+    return pairs
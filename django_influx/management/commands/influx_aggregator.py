@@ -0,0 +1,55 @@
+import signal
+import threading
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ...aggregator import Aggregator, get_direct_write_request
+from ...spool import SpoolReplayer, WriteSpool
+from ...writer import DEFAULT_BATCH_SIZE, DEFAULT_MAX_BATCH_BYTES, BatchWriter
+
+
+class Command(BaseCommand):
+    help = 'Receives points of every worker process on a Unix socket and writes them in large batches'
+
+    def add_arguments(self, parser):
+        options = settings.INFLUXDB.get('OPTIONS', {})
+        parser.add_argument('--socket', default=options.get('aggregator_socket'))
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--max-batch-bytes', type=int, default=DEFAULT_MAX_BATCH_BYTES)
+        parser.add_argument('--flush-interval', type=float, default=1.0)
+        parser.add_argument('--max-workers', type=int, default=4)
+        parser.add_argument('--spool-directory', default=None)
+
+    def handle(self, *args, **options):
+        request = get_direct_write_request()
+        spool = replayer = None
+        if options['spool_directory']:
+            spool = WriteSpool(options['spool_directory'])
+            replayer = SpoolReplayer(spool, request=request)
+        writer = BatchWriter(
+            request=request,
+            batch_size=options['batch_size'],
+            max_batch_bytes=options['max_batch_bytes'],
+            flush_interval=options['flush_interval'],
+            max_workers=options['max_workers'],
+            spool=spool,
+        )
+        aggregator = Aggregator(options['socket'], writer=writer)
+        aggregator.bind()
+
+        def stop(signum, frame):
+            threading.Thread(target=aggregator.shutdown).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write('Aggregating points on {}'.format(aggregator.path))
+        if replayer is not None:
+            replayer.start()
+        try:
+            aggregator.serve_forever()
+        finally:
+            if replayer is not None:
+                replayer.stop()
+        self.stdout.write('Received {} writes ({} bytes)'.format(
+            aggregator.received_count,
+            aggregator.received_bytes,
+        ))
@@ -0,0 +1,43 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ...profiler import DEFAULT_CARDINALITY_THRESHOLD, DEFAULT_TOP_K, load_profiles
+
+
+class Command(BaseCommand):
+    help = 'Reports the write traffic profiled by every process, per measurement'
+
+    def add_arguments(self, parser):
+        options = settings.INFLUXDB.get('OPTIONS', {})
+        parser.add_argument('--directory', default=options.get('profile_directory'))
+        parser.add_argument('--measurement', action='append', default=None)
+        parser.add_argument('--top', type=int, default=DEFAULT_TOP_K)
+        parser.add_argument(
+            '--threshold',
+            type=int,
+            default=int(options.get('profile_cardinality_threshold', DEFAULT_CARDINALITY_THRESHOLD)),
+        )
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['directory']:
+            raise CommandError('--directory or the profile_directory option is required')
+        profiles = load_profiles(options['directory']).values()
+        if options['measurement']:
+            profiles = [p for p in profiles if p.name in options['measurement']]
+        profiles = sorted(profiles, key=lambda p: p.nb_points, reverse=True)
+        reports = [profile.report(options['top']) for profile in profiles]
+        if options['json']:
+            self.stdout.write(json.dumps(reports, indent=2))
+            return
+        for report in reports:
+            self.stdout.write('{measurement}: {points} points, {points_per_second:.1f} points/s, '
+                              '{bytes_per_second:.1f} bytes/s'.format(**report))
+            cardinalities = sorted(report['tag_cardinalities'].items(), key=lambda item: -item[1])
+            for tag_key, cardinality in cardinalities:
+                line = '  tag {}: ~{} values'.format(tag_key, cardinality)
+                if cardinality > options['threshold']:
+                    line = self.style.WARNING(line + ' (over {})'.format(options['threshold']))
+                self.stdout.write(line)
+            for series_key, count, error in report['top_series']:
+                self.stdout.write('  series {}: {} points (+/- {})'.format(series_key, count, error))
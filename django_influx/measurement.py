@@ -1,14 +1,26 @@
 import os
-from datetime import datetime, timezone
+from itertools import chain
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from jinja2 import Environment, FileSystemLoader
-from .attributes import BaseAttribute, GenericFieldAttribute, \
-    TagFieldAttribute, TimestampFieldAttribute
+from .attributes import NANOSECONDS_PER_PRECISION, NANOSECONDS_PER_SECOND, \
+    BaseAttribute, TimestampFieldAttribute
+from .api import DEFAULT_QUERY_CHUNK_SIZE, InfluxDBApi
 from .db.query import Query, BulkInsertQuery
 from .db.criteria import Field
+from .builder import LineProtocolBuilder, build_grouped_batches
+from .coalesce import coalesce_lines, validate_coalesce
+from .downsampling import AggregationBuffer, Downsampling, aggregate_lines
+from .encoders import DEFAULT_SERIES_KEY_CACHE_SIZE, DataFrameEncoder, \
+    MeasurementEncoder
 from .response import InfluxDBResponse
-from .serializers import MeasurementPointSerializer
+from .serializers import MeasurementPointSerializer, MeasurementQuerySet, iter_measurement_points
+from .sharding import register_route
 from .exceptions import InfluxDBAttributeValueError
+from .writer import DEFAULT_BATCH_SIZE, DEFAULT_MAX_BATCH_BYTES, Transport, \
+    WriteGroup, get_default_request, split_batches, split_grouped_batches, \
+    validate_batch_options, validate_transport, write_batches, \
+    write_grouped_batches, write_stream
 from django.conf import settings
 
 
@@ -39,6 +51,16 @@ class MeasurementMeta(type):
         super(MeasurementMeta, cls).__init__(name, *args, **kwargs)
         attribute_names = cls._get_attribute_names()
         cls._extend_attributes(attribute_names)
+        validate_coalesce(cls.coalesce)
+        validate_transport(cls.transport)
+        cls._downsampling = cls._get_downsampling()
+        if cls.shard is not None:
+            register_route(cls.measurement_name, cls.shard)
+        cls._encoder = MeasurementEncoder(
+            cls,
+            EXTENDED_ATTRIBUTE_PREFIX_NAME,
+            cls.series_key_cache_size,
+        )
 
         get_query = cls._factory_get_query()
         setattr(cls, 'get_query', get_query)
@@ -49,6 +71,15 @@ class MeasurementMeta(type):
         instance = type.__call__(cls, *args, **kwargs)
         return instance
 
+    def _get_downsampling(cls):
+        if not cls.aggregations:
+            return None
+        if cls.aggregation_window is None:
+            raise InfluxDBAttributeValueError('aggregations require an aggregation_window')
+        if cls.coalesce is not None:
+            raise InfluxDBAttributeValueError('coalesce and aggregations cannot be combined')
+        return Downsampling(cls.aggregation_window, cls.aggregations)
+
     def _factory_get_query(cls):
         def get_query(from_db=None):
             class MeasurementQuery(Query):
@@ -60,12 +91,18 @@ class MeasurementMeta(type):
                     return parser_class(result, cls).convert()
 
                 def evaluate(self, parser_class=cls.parser_class, **kwargs):
+                    if parser_class is MeasurementPointSerializer:
+                        return MeasurementQuerySet(None, cls, query=self)
                     return super(MeasurementQuery, self).evaluate(parser_class=parser_class, **kwargs)
                     # result = InfluxDBResponse(self.execute())
                     # result.raise_if_error()
                     # formatted_result = self.format(result, parser_class, **kwargs)
                     # return formatted_result
 
+                def iterator(self, chunk_size=DEFAULT_QUERY_CHUNK_SIZE):
+                    rows = super(MeasurementQuery, self).iterator(chunk_size=chunk_size)
+                    return iter_measurement_points(rows, cls)
+
             return MeasurementQuery().from_measurements(cls.measurement_name)
 
         return get_query
@@ -125,6 +162,15 @@ class Measurement(object, metaclass=MeasurementMeta):
     parser_class = MeasurementPointSerializer
     measurement_name = 'default'
     database = None
+    retention_policy = None
+    shard = None
+    transport = Transport.HTTP
+    writer = None
+    retry_policy = None
+    coalesce = None
+    aggregation_window = None
+    aggregations = ()
+    series_key_cache_size = DEFAULT_SERIES_KEY_CACHE_SIZE
 
     def __repr__(self):
         from django.db.models.query import QuerySet
@@ -146,8 +192,12 @@ class Measurement(object, metaclass=MeasurementMeta):
 
     @property
     def timestamp(self):
-        if type(getattr(self, 'time', None)) in [int, float]:
-            return datetime.fromtimestamp(getattr(self, 'time'), timezone.utc)
+        attr = getattr(self, EXTENDED_ATTRIBUTE_PREFIX_NAME + 'time', None)
+        if isinstance(attr, TimestampFieldAttribute) and type(attr._value) == int:
+            nanoseconds = attr._value * NANOSECONDS_PER_PRECISION[attr.precision]
+            seconds, nanoseconds = divmod(nanoseconds, NANOSECONDS_PER_SECOND)
+            return datetime.fromtimestamp(seconds, timezone.utc) \
+                + timedelta(microseconds=nanoseconds // 1000)
 
     def check_attribute_values(self, **kwargs):
         def filter_required_attributes(x):
@@ -210,49 +260,7 @@ class Measurement(object, metaclass=MeasurementMeta):
         return timestamp_attributes
 
     def get_prep_value(self):
-        def factory_filter_func(cls):
-            def filter_func(attr):
-                return isinstance(attr, cls)
-
-            return filter_func
-
-        attributes = self.get_attributes()
-        field_attributes = list(filter(
-            factory_filter_func(GenericFieldAttribute),
-            attributes,
-        ))
-        tag_attributes = list(filter(
-            factory_filter_func(TagFieldAttribute),
-            attributes,
-        ))
-        timestamp_attributes = list(filter(
-            factory_filter_func(TimestampFieldAttribute),
-            attributes,
-        ))
-
-        prep_value_groups = []
-        attributes_groups = [tag_attributes, field_attributes, timestamp_attributes]
-        for attr_group in attributes_groups:
-            prep_value_group = []
-            for attr in attr_group:
-                attr_prep_value = attr.get_prep_value()
-                attr_name = attr.name or attr.attribute_name
-                if not isinstance(attr, TimestampFieldAttribute):
-                    prep_value = '{}={}'.format(attr_name, attr_prep_value)
-                else:
-                    prep_value = '{}'.format(attr_prep_value)
-                prep_value_group.append(prep_value)
-            str_prep_value_group = ','.join(prep_value_group)
-            prep_value_groups.append(str_prep_value_group)
-
-        if prep_value_groups[0]:
-            prep_value_groups[0] = ','.join(
-                [self.measurement_name] + [prep_value_groups[0]]
-            )
-        else:
-            prep_value_groups[0] = self.measurement_name
-        final_prep_value = ' '.join(prep_value_groups)
-        return final_prep_value
+        return self._encoder.encode(self)
 
     def fill_values(self, **kwargs):
         try:
@@ -266,30 +274,331 @@ class Measurement(object, metaclass=MeasurementMeta):
     def items(self):
         return self.dict().items()
 
-    def save(self, db=None):
-        database = db or self.database
-        if hasattr(self, 'time') and getattr(self, 'time', None) is None:
-            delattr(self.__class__, 'time')
+    def save(self, db=None, writer=None):
+        writer = writer or self.writer
+        if writer is not None:
+            writer.write_measurements([self], database=db)
+            return True
+        if self._downsampling is not None:
+            # the aggregate of a single point would replace that of its window
+            raise InfluxDBAttributeValueError(
+                'points of measurements with aggregations must be saved through a writer'
+            )
+        group = self.get_write_group(db)
         str_points = self.get_prep_value() + "\n"
-        return BulkInsertQuery(str_points, db=database).execute()
+        if group.transport != Transport.HTTP:
+            return InfluxDBApi.write_points(
+                get_default_request(group.transport),
+                str_points,
+                **group.get_params()
+            )
+        return BulkInsertQuery(
+            str_points,
+            db=group.database,
+            precision=group.precision,
+            retention_policy=group.retention_policy,
+        ).execute()
 
     @classmethod
-    def bulk_save(cls, points, db=None):
-        database = db or cls.database
-        if not isinstance(points, list):
-            raise InfluxDBAttributeValueError('points must be a list')
-        str_points = ''
+    def get_write_group(cls, db=None):
+        return WriteGroup(
+            db or cls.database,
+            cls.retention_policy,
+            cls._encoder.precision,
+            cls.transport,
+        )
+
+    @classmethod
+    def get_write_key(cls, db=None):
+        """Destination and buffering options of the points of the class."""
+        return cls.get_write_group(db), cls.coalesce, cls._downsampling
+
+    @classmethod
+    def _write_items(
+        cls,
+        items,
+        writer,
+        batch_size,
+        max_batch_bytes,
+        max_workers,
+        stream,
+        fail_silently,
+    ):
+        """
+        Writes ((WriteGroup, coalesce, downsampling), line) items, one batch
+        per destination at a time.
+        """
+        if writer is not None:
+            batches = split_grouped_batches(items, batch_size, max_batch_bytes)
+            for (group, coalesce, downsampling), batch in batches:
+                writer.write(
+                    batch,
+                    database=group.database,
+                    precision=group.precision,
+                    coalesce=coalesce,
+                    retention_policy=group.retention_policy,
+                    downsampling=downsampling,
+                    transport=group.transport,
+                )
+            return True
+        if not stream:
+            batches = cls._iter_line_batches(items, batch_size, max_batch_bytes)
+            return cls._write_batches(batches, max_workers, fail_silently)
+        result = cls._write_stream_items(cls._aggregate_items(items))
+        if not fail_silently:
+            result.raise_if_error()
+        return result
+
+    @classmethod
+    def _write_batches(cls, batches, max_workers, fail_silently):
+        result = write_grouped_batches(
+            batches,
+            max_workers=max_workers,
+            retry_policy=cls.retry_policy,
+        )
+        if not fail_silently:
+            result.raise_if_error()
+        return result
+
+    @staticmethod
+    def _iter_line_batches(items, batch_size, max_batch_bytes):
+        """
+        Splits ((WriteGroup, coalesce, downsampling), line) items into
+        (WriteGroup, lines) batches, once coalesced or aggregated.
+        """
+        items = Measurement._aggregate_items(items)
+        for (group, coalesce, _), batch in split_grouped_batches(items, batch_size, max_batch_bytes):
+            yield group, coalesce_lines(batch, coalesce) if coalesce else batch
+
+    @staticmethod
+    def _iter_point_batches(points, db, batch_size, max_batch_bytes):
+        """
+        Encodes points straight into (WriteGroup, LineProtocolBuilder)
+        batches. Points of classes with coalesce or aggregations are
+        batched as lines once `points` is exhausted.
+        """
+        line_items = []
+
+        def iter_builder_items():
+            for key, point in Measurement._iter_keyed_points(points, db):
+                group, coalesce, downsampling = key
+                if coalesce is None and downsampling is None:
+                    yield group, point
+                else:
+                    line_items.append((key, point.get_prep_value()))
+
+        yield from build_grouped_batches(
+            iter_builder_items(),
+            LineProtocolBuilder.append_point,
+            batch_size,
+            max_batch_bytes,
+        )
+        yield from Measurement._iter_line_batches(line_items, batch_size, max_batch_bytes)
+
+    @staticmethod
+    def _write_stream_items(items):
+        items = iter(items)
+        first_item = next(items, None)
+        if first_item is None:
+            return write_stream([])
+        key, first_line = first_item
+
+        def iter_lines():
+            yield first_line
+            for item_key, line in items:
+                if item_key != key:
+                    raise InfluxDBAttributeValueError(
+                        'stream=True requires points of a single destination'
+                    )
+                yield line
+
+        group = key[0]
+        return write_stream(
+            iter_lines(),
+            database=group.database,
+            precision=group.precision,
+            retention_policy=group.retention_policy,
+            transport=group.transport,
+        )
+
+    @staticmethod
+    def _aggregate_items(items):
+        """
+        Folds the items to downsample, which are yielded once `items` is
+        exhausted, the other ones being yielded as they come.
+        """
+        buffers = {}
+        for key, line in items:
+            downsampling = key[2]
+            if downsampling is None:
+                yield key, line
+                continue
+            buffer = buffers.get(key)
+            if buffer is None:
+                buffer = buffers[key] = AggregationBuffer(downsampling, key[0].precision)
+            buffer.add(line)
+        for key, buffer in buffers.items():
+            for line in buffer.lines():
+                yield key, line
+
+    @staticmethod
+    def _iter_point_items(points, db=None):
+        for key, point in Measurement._iter_keyed_points(points, db):
+            yield key, point.get_prep_value()
+
+    @staticmethod
+    def _iter_keyed_points(points, db=None):
+        keys = {}
         for point in points:
             if not isinstance(point, Measurement):
                 raise InfluxDBAttributeValueError(
                     'type of point must be Measurement'
                 )
-            if hasattr(point, 'time') and getattr(point, 'time', None) is None:
-                delattr(point.__class__, 'time')
-            prep_value = point.get_prep_value()
-            str_points += prep_value
-            str_points += '\n'
-        return BulkInsertQuery(str_points, db=database).execute()
+            measurement_cls = type(point)
+            key = keys.get(measurement_cls)
+            if key is None:
+                key = keys[measurement_cls] = measurement_cls.get_write_key(db)
+            yield key, point
+
+    @classmethod
+    def bulk_save(
+        cls,
+        points,
+        db=None,
+        writer=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+        max_workers=1,
+        stream=False,
+        fail_silently=False,
+    ):
+        """
+        Writes points of any Measurement class, each one to the database,
+        retention policy and precision of its own class unless `db` is
+        given.
+
+        Without a writer, the points of classes with aggregations are
+        aggregated over this call only: a window written by several calls
+        keeps the aggregate of the last one, so use a BatchWriter (or the
+        Aggregator) unless each call holds whole windows.
+        """
+        writer = writer or cls.writer
+        if isinstance(points, (str, bytes)) or not hasattr(points, '__iter__'):
+            raise InfluxDBAttributeValueError('points must be an iterable')
+        validate_batch_options(batch_size, max_batch_bytes)
+        if writer is None and not stream:
+            batches = cls._iter_point_batches(points, db, batch_size, max_batch_bytes)
+            return cls._write_batches(batches, max_workers, fail_silently)
+        return cls._write_items(
+            cls._iter_point_items(points, db),
+            writer,
+            batch_size,
+            max_batch_bytes,
+            max_workers,
+            stream,
+            fail_silently,
+        )
+
+    @classmethod
+    def series_key_cache_info(cls):
+        return cls._encoder.cache_info()
+
+    @classmethod
+    def encode_points(cls, rows):
+        encode_row = cls._encoder.encode_row
+        for row in rows:
+            yield encode_row(row)
+
+    @classmethod
+    def write_rows(
+        cls,
+        rows,
+        db=None,
+        writer=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+        max_workers=1,
+        stream=False,
+        fail_silently=False,
+    ):
+        writer = writer or cls.writer
+        if isinstance(rows, (str, bytes)) or not hasattr(rows, '__iter__'):
+            raise InfluxDBAttributeValueError('rows must be an iterable')
+        validate_batch_options(batch_size, max_batch_bytes)
+        key = cls.get_write_key(db)
+        group, coalesce, downsampling = key
+        if writer is None and not stream and coalesce is None and downsampling is None:
+            encoder = cls._encoder
+            batches = build_grouped_batches(
+                ((group, row) for row in rows),
+                lambda builder, row: builder.append_row(encoder, row),
+                batch_size,
+                max_batch_bytes,
+            )
+            return cls._write_batches(batches, max_workers, fail_silently)
+        return cls._write_items(
+            ((key, line) for line in cls.encode_points(rows)),
+            writer,
+            batch_size,
+            max_batch_bytes,
+            max_workers,
+            stream,
+            fail_silently,
+        )
+
+    @classmethod
+    def write_dataframe(
+        cls,
+        df,
+        tag_columns=None,
+        time_column=None,
+        field_columns=None,
+        db=None,
+        writer=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_workers=1,
+        fail_silently=False,
+    ):
+        database = db or cls.database
+        writer = writer or cls.writer
+        validate_batch_options(batch_size, DEFAULT_MAX_BATCH_BYTES)
+        encoder = DataFrameEncoder(
+            cls,
+            tag_columns=tag_columns,
+            time_column=time_column,
+            field_columns=field_columns,
+        )
+        batches = (
+            encoder.encode(df.iloc[start:start + batch_size]).tolist()
+            for start in range(0, len(df), batch_size)
+        )
+        if writer is not None:
+            for batch in batches:
+                writer.write(
+                    batch,
+                    database=database,
+                    coalesce=cls.coalesce,
+                    retention_policy=cls.retention_policy,
+                    downsampling=cls._downsampling,
+                    transport=cls.transport,
+                )
+            return True
+        if cls._downsampling is not None:
+            lines = aggregate_lines(chain.from_iterable(batches), cls._downsampling)
+            batches = split_batches(lines, batch_size)
+        elif cls.coalesce is not None:
+            batches = (coalesce_lines(batch, cls.coalesce) for batch in batches)
+        result = write_batches(
+            (batch for batch in batches if batch),
+            database=database,
+            max_workers=max_workers,
+            retry_policy=cls.retry_policy,
+            retention_policy=cls.retention_policy,
+            transport=cls.transport,
+        )
+        if not fail_silently:
+            result.raise_if_error()
+        return result
 
 
 def SimpleMeasurement(measurement_name, field_names, tag_names=[], database=None, precision=None):
@@ -0,0 +1,403 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from .exceptions import InfluxDBAttributeValueError
+from .line_protocol import get_measurement_name, split_line, split_tags
+from .signals import tag_cardinality_exceeded
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HLL_PRECISION = 12
+DEFAULT_TOP_K = 10
+DEFAULT_CARDINALITY_THRESHOLD = 100000
+DEFAULT_DUMP_INTERVAL = 60.0
+PROFILE_SUFFIX = '.profile.json'
+# series key of a line (up to its first unescaped space), and the rest of the line
+SERIES_KEY = re.compile(rb'^((?:[^ \\\n]|\\.)+) [^\n]*', re.MULTILINE)
+
+
+class HyperLogLog:
+    """
+    Estimate of the number of distinct values added, within about
+    1.04 / sqrt(2 ** precision), using 2 ** precision one-byte registers.
+    Sketches of the same precision merge into the sketch of the union.
+    """
+
+    def __init__(self, precision=DEFAULT_HLL_PRECISION, registers=None):
+        if type(precision) != int or not 4 <= precision <= 16:
+            raise InfluxDBAttributeValueError('precision must be an integer from 4 to 16')
+        self.precision = precision
+        self.nb_registers = 1 << precision
+        self.registers = bytearray(self.nb_registers)
+        # Sum of 2 ** -register and number of empty registers, kept up to
+        # date so that count() does not scan the registers.
+        self._sum = float(self.nb_registers)
+        self._zeros = self.nb_registers
+        if registers is not None:
+            for index, rank in enumerate(registers):
+                self._set(index, rank)
+
+    def _set(self, index, rank):
+        previous_rank = self.registers[index]
+        if rank <= previous_rank:
+            return False
+        self.registers[index] = rank
+        self._sum += 2.0 ** -rank - 2.0 ** -previous_rank
+        if previous_rank == 0:
+            self._zeros -= 1
+        return True
+
+    def add(self, value):
+        """Adds a value, returning whether the estimate may have changed."""
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        hashed = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+        nb_bits = 64 - self.precision
+        rank = nb_bits - (hashed & ((1 << nb_bits) - 1)).bit_length() + 1
+        return self._set(hashed >> nb_bits, rank)
+
+    def count(self):
+        nb_registers = self.nb_registers
+        if nb_registers >= 128:
+            alpha = 0.7213 / (1 + 1.079 / nb_registers)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[nb_registers]
+        estimate = alpha * nb_registers * nb_registers / self._sum
+        if estimate <= 2.5 * nb_registers and self._zeros:
+            estimate = nb_registers * math.log(nb_registers / self._zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise InfluxDBAttributeValueError('cannot merge sketches of different precisions')
+        for index, rank in enumerate(other.registers):
+            self._set(index, rank)
+
+
+class TopK:
+    """
+    Heaviest keys, counted with the space-saving algorithm in at most
+    `capacity` counters: any key weighing more than 1 / capacity of the
+    total is tracked, and its count is over-estimated by at most its error.
+    """
+
+    def __init__(self, k=DEFAULT_TOP_K, capacity=None):
+        if type(k) != int or k < 1:
+            raise InfluxDBAttributeValueError('k must be a positive integer')
+        self.k = k
+        self.capacity = capacity or 10 * k
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, key, weight=1):
+        counts = self.counts
+        if key in counts:
+            counts[key] += weight
+        elif len(counts) < self.capacity:
+            counts[key] = weight
+            self.errors[key] = 0
+        else:
+            victim = min(counts, key=counts.get)
+            minimum = counts.pop(victim)
+            del self.errors[victim]
+            counts[key] = minimum + weight
+            self.errors[key] = minimum
+
+    def most_common(self, k=None):
+        """(key, count, error) of the `k` heaviest keys."""
+        keys = sorted(self.counts, key=self.counts.get, reverse=True)[:k or self.k]
+        return [(key, self.counts[key], self.errors[key]) for key in keys]
+
+    def merge(self, other):
+        for key, weight in other.counts.items():
+            self.add(key, weight)
+            self.errors[key] += other.errors[key]
+
+
+class MeasurementProfile:
+    """Write traffic of one measurement since `started_at`."""
+
+    def __init__(self, name, top_k=DEFAULT_TOP_K, precision=DEFAULT_HLL_PRECISION, started_at=None):
+        self.name = name
+        self.precision = precision
+        self.nb_points = 0
+        self.nb_bytes = 0
+        self.started_at = started_at
+        self.updated_at = started_at
+        self.series = TopK(top_k)
+        self.tags = {}
+        self.exceeded_tags = set()
+
+    def __repr__(self):
+        return '<MeasurementProfile {} {} points>'.format(self.name, self.nb_points)
+
+    def add(self, series_key, tags, nb_bytes, threshold=None):
+        """
+        Accounts for one point, returning the (tag key, cardinality) of the
+        tags whose cardinality crosses `threshold` for the first time.
+        """
+        self.nb_points += 1
+        self.nb_bytes += nb_bytes
+        self.series.add(series_key)
+        exceeded = []
+        for key, value in tags:
+            sketch = self.tags.get(key)
+            if sketch is None:
+                sketch = self.tags[key] = HyperLogLog(self.precision)
+            if sketch.add(value) and threshold is not None and key not in self.exceeded_tags:
+                cardinality = sketch.count()
+                if cardinality > threshold:
+                    self.exceeded_tags.add(key)
+                    exceeded.append((key, cardinality))
+        return exceeded
+
+    @property
+    def duration(self):
+        if self.started_at is None or self.updated_at is None:
+            return 0.0
+        return self.updated_at - self.started_at
+
+    @property
+    def points_per_second(self):
+        return self.nb_points / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.nb_bytes / self.duration if self.duration > 0 else 0.0
+
+    def get_tag_cardinalities(self):
+        return {key: sketch.count() for key, sketch in self.tags.items()}
+
+    def merge(self, other):
+        self.nb_points += other.nb_points
+        self.nb_bytes += other.nb_bytes
+        starts = [t for t in (self.started_at, other.started_at) if t is not None]
+        ends = [t for t in (self.updated_at, other.updated_at) if t is not None]
+        self.started_at = min(starts) if starts else None
+        self.updated_at = max(ends) if ends else None
+        self.series.merge(other.series)
+        for key, sketch in other.tags.items():
+            if key in self.tags:
+                self.tags[key].merge(sketch)
+            else:
+                self.tags[key] = HyperLogLog(sketch.precision, sketch.registers)
+        self.exceeded_tags |= other.exceeded_tags
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'precision': self.precision,
+            'nb_points': self.nb_points,
+            'nb_bytes': self.nb_bytes,
+            'started_at': self.started_at,
+            'updated_at': self.updated_at,
+            'top_k': self.series.k,
+            'series': [[key, count, error] for key, count, error in self.series.most_common(self.series.capacity)],
+            'tags': {key: sketch.registers.hex() for key, sketch in self.tags.items()},
+            'exceeded_tags': sorted(self.exceeded_tags),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        profile = cls(data['name'], data['top_k'], data['precision'], data['started_at'])
+        profile.nb_points = data['nb_points']
+        profile.nb_bytes = data['nb_bytes']
+        profile.updated_at = data['updated_at']
+        for key, count, error in data['series']:
+            profile.series.counts[key] = count
+            profile.series.errors[key] = error
+        for key, registers in data['tags'].items():
+            profile.tags[key] = HyperLogLog(data['precision'], bytes.fromhex(registers))
+        profile.exceeded_tags = set(data['exceeded_tags'])
+        return profile
+
+    def report(self, k=None):
+        return {
+            'measurement': self.name,
+            'points': self.nb_points,
+            'bytes': self.nb_bytes,
+            'points_per_second': self.points_per_second,
+            'bytes_per_second': self.bytes_per_second,
+            'top_series': self.series.most_common(k),
+            'tag_cardinalities': self.get_tag_cardinalities(),
+            'exceeded_tags': sorted(self.exceeded_tags),
+        }
+
+
+class WriteProfiler:
+    """
+    Profiles the points written through a request, per measurement: points
+    and bytes per second, the `top_k` heaviest series and a HyperLogLog
+    estimate of the number of values of each tag key.
+
+    When the estimated cardinality of a tag crosses `cardinality_threshold`,
+    a warning is logged and `signals.tag_cardinality_exceeded` is sent.
+
+    With a `directory`, profiles are dumped to a file of this process every
+    `dump_interval` seconds, for the influx_profile command to merge the
+    profiles of every process.
+    """
+
+    def __init__(
+        self,
+        top_k=DEFAULT_TOP_K,
+        cardinality_threshold=DEFAULT_CARDINALITY_THRESHOLD,
+        precision=DEFAULT_HLL_PRECISION,
+        directory=None,
+        dump_interval=DEFAULT_DUMP_INTERVAL,
+        clock=time.time,
+    ):
+        # validates the parameters
+        HyperLogLog(precision)
+        TopK(top_k)
+        self.top_k = top_k
+        self.cardinality_threshold = cardinality_threshold
+        self.precision = precision
+        self.directory = directory
+        self.dump_interval = dump_interval
+        self.clock = clock
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._dumped_at = clock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return '<WriteProfiler {} measurements>'.format(len(self._profiles))
+
+    def observe(self, points):
+        """
+        Profiles a /write body, or the lines of a stream as they are
+        consumed, returning what is to be written.
+        """
+        if isinstance(points, (bytes, bytearray, memoryview)):
+            self.observe_buffer(points)
+            return points
+        if isinstance(points, str):
+            self.observe_lines(points.split('\n'))
+            return points
+        return self._observe_stream(points)
+
+    def _observe_stream(self, lines):
+        for line in lines:
+            self.observe_lines([line.decode('utf-8') if isinstance(line, bytes) else line])
+            yield line
+
+    def observe_buffer(self, data):
+        """
+        Profiles the lines of a bytes-like body in place: only their series
+        keys are decoded.
+        """
+        self._add_series([
+            (match.group(1).decode('utf-8'), match.end() - match.start() + 1)
+            for match in SERIES_KEY.finditer(data)
+        ])
+
+    def observe_lines(self, lines):
+        series = []
+        for line in lines:
+            if not line:
+                continue
+            try:
+                series_key = split_line(line)[0]
+            except ValueError:
+                continue
+            series.append((series_key, len(line.encode('utf-8')) + 1))
+        self._add_series(series)
+
+    def _add_series(self, series):
+        exceeded = []
+        now = self.clock()
+        with self._lock:
+            for series_key, nb_bytes in series:
+                name = get_measurement_name(series_key)
+                profile = self._profiles.get(name)
+                if profile is None:
+                    profile = MeasurementProfile(name, self.top_k, self.precision, started_at=now)
+                    self._profiles[name] = profile
+                profile.updated_at = now
+                for tag_key, cardinality in profile.add(
+                    series_key,
+                    split_tags(series_key),
+                    nb_bytes,
+                    self.cardinality_threshold,
+                ):
+                    exceeded.append((name, tag_key, cardinality))
+        for name, tag_key, cardinality in exceeded:
+            logger.warning(
+                'Tag `%s` of measurement `%s` has about %d values, over %d',
+                tag_key,
+                name,
+                cardinality,
+                self.cardinality_threshold,
+            )
+            tag_cardinality_exceeded.send(
+                sender=self.__class__,
+                measurement=name,
+                tag_key=tag_key,
+                cardinality=cardinality,
+            )
+        if self.directory is not None and now - self._dumped_at >= self.dump_interval:
+            self.dump()
+
+    def get_profile(self, name):
+        return self._profiles.get(name)
+
+    def get_profiles(self):
+        with self._lock:
+            return dict(self._profiles)
+
+    def report(self, k=None):
+        """Profiles as dicts, busiest measurement first."""
+        profiles = sorted(self.get_profiles().values(), key=lambda p: p.nb_points, reverse=True)
+        return [profile.report(k) for profile in profiles]
+
+    def reset(self):
+        with self._lock:
+            self._profiles = {}
+
+    def get_dump_path(self):
+        return os.path.join(self.directory, '{}{}'.format(os.getpid(), PROFILE_SUFFIX))
+
+    def dump(self, path=None):
+        path = path or self.get_dump_path()
+        with self._lock:
+            data = [profile.to_dict() for profile in self._profiles.values()]
+            self._dumped_at = self.clock()
+        tmp_path = '{}.tmp'.format(path)
+        with open(tmp_path, 'w') as profile_file:
+            json.dump(data, profile_file)
+        os.replace(tmp_path, path)
+        return path
+
+
+def load_profiles(directory):
+    """Profiles dumped by every process to `directory`, merged per measurement."""
+    profiles = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(PROFILE_SUFFIX):
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as profile_file:
+                data = json.load(profile_file)
+        except (OSError, ValueError):
+            logger.warning('Could not read profile %s', filename)
+            continue
+        for item in data:
+            profile = MeasurementProfile.from_dict(item)
+            if profile.name in profiles:
+                profiles[profile.name].merge(profile)
+            else:
+                profiles[profile.name] = profile
+    return profiles
+
+
+def get_write_profiler():
+    """WriteProfiler of the connection, set by its `profile` option."""
+    from .app import Influxable
+    return Influxable.get_instance().connection.write_profiler
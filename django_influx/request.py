@@ -1,19 +1,46 @@
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin
 from .decorators import raise_if_error
 
 
 class InfluxDBRequest(requests.Session):
-    def __init__(self, base_url, database_name, auth):
+    def __init__(
+        self,
+        base_url,
+        database_name,
+        auth,
+        gzip=False,
+        gzip_level=6,
+        gzip_min_size=1024,
+        pool_maxsize=None,
+        write_scheduler=None,
+        write_profiler=None,
+        query_cache=None,
+        timeout=None,
+    ):
         super().__init__()
         self.trust_env = False
         self.verify = False
         self.base_url = base_url
         self.database_name = database_name
         self.auth = auth
+        self.gzip = gzip
+        self.gzip_level = gzip_level
+        self.gzip_min_size = gzip_min_size
+        self.write_scheduler = write_scheduler
+        self.write_profiler = write_profiler
+        self.query_cache = query_cache
+        # seconds, or a (connect, read) tuple, for every request
+        self.timeout = timeout
+        if pool_maxsize is not None:
+            adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+            self.mount('http://', adapter)
+            self.mount('https://', adapter)
 
     @raise_if_error
     def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
         full_url = urljoin(self.base_url, url)
         return super().request(method, url=full_url, **kwargs)
 
@@ -1,3 +1,52 @@
+import json
+
+
+def iter_json_lines(chunks):
+    """
+    JSON objects of a newline delimited body, received as chunks of bytes,
+    each decoded as soon as its line is complete.
+    """
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        if b'\n' not in chunk:
+            continue
+        lines = b''.join(parts).split(b'\n')
+        parts = [lines.pop()]
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    rest = b''.join(parts)
+    if rest.strip():
+        yield json.loads(rest)
+
+
+def merge_chunked_responses(responses):
+    """
+    Single response of the responses of a chunked query, the parts of a
+    series sent in consecutive chunks being merged back.
+    """
+    results = {}
+    for response in responses:
+        if 'error' in response:
+            return response
+        for result in response.get('results', []):
+            statement_id = result.get('statement_id', 0)
+            merged = results.setdefault(statement_id, {'statement_id': statement_id})
+            if 'error' in result:
+                merged['error'] = result['error']
+            for serie in result.get('series', []):
+                series = merged.setdefault('series', [])
+                previous = series[-1] if series else None
+                if previous is not None and all(
+                    previous.get(key) == serie.get(key) for key in ('name', 'tags', 'columns')
+                ):
+                    previous.setdefault('values', []).extend(serie.get('values', []))
+                else:
+                    series.append({key: value for key, value in serie.items() if key != 'partial'})
+    return {'results': [results[statement_id] for statement_id in sorted(results)]}
+
+
 class InfluxDBResponse:
     def __init__(self, raw_json):
         self._raw_json = raw_json
@@ -0,0 +1,212 @@
+import random
+import re
+import time
+from collections import namedtuple
+import requests
+from .api import InfluxDBApi
+from .builder import LineProtocolBuilder
+from .exceptions import InfluxDBAttributeValueError, InfluxDBConnectionError, \
+    InfluxDBInvalidBooleanError, InfluxDBInvalidNumberError, \
+    InfluxDBInvalidTimestampError, InfluxDBShardWriteError, InfluxDBUnparsableLinesError, \
+    InfluxDBWriteDroppedError, InfluxDBWriteThrottledError
+from .sharding import ShardRouter
+
+PARSE_ERRORS = (
+    InfluxDBInvalidBooleanError,
+    InfluxDBInvalidNumberError,
+    InfluxDBInvalidTimestampError,
+)
+UNPARSABLE_LINE = re.compile(r"^(?:partial write: )?unable to parse '(.*)': ", re.MULTILINE)
+
+RejectedLine = namedtuple('RejectedLine', ['line', 'exception'])
+
+
+def is_transient_error(err):
+    """
+    Whether a failed write may succeed later as is: the server was
+    unreachable, timed out or answered with a 5xx (or 429) status, or the
+    write was throttled by a WriteScheduler. A sharded write is transient
+    when the error of every failed node is.
+    """
+    if isinstance(err, InfluxDBShardWriteError):
+        return all(is_transient_error(node_err) for _, node_err in err.failures)
+    if isinstance(err, (
+        InfluxDBConnectionError,
+        InfluxDBWriteThrottledError,
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+    )):
+        return True
+    if isinstance(err, requests.exceptions.HTTPError):
+        response = err.response
+        return response is None or response.status_code >= 500 \
+            or response.status_code == 429
+    return False
+
+
+def get_transient_lines(err, lines):
+    """
+    The `lines` of a failed write that may be written later as is: all of
+    them after a transient error, and only those of the nodes that failed
+    transiently after an InfluxDBShardWriteError.
+    """
+    if isinstance(err, InfluxDBShardWriteError):
+        return [
+            line
+            for node_lines, node_err in err.failures
+            if is_transient_error(node_err)
+            for line in node_lines
+        ]
+    return list(lines) if is_transient_error(err) else []
+
+
+class RetryPolicy:
+    """
+    Retries transient write errors up to `max_retries` times, waiting a
+    random delay between 0 and min(backoff_max, backoff_base * 2 ** attempt)
+    seconds before each retry ("full jitter" exponential backoff).
+    """
+
+    def __init__(self, max_retries=3, backoff_base=0.5, backoff_max=30.0, sleep=time.sleep):
+        if type(max_retries) != int or max_retries < 0:
+            raise InfluxDBAttributeValueError('max_retries must be a positive integer')
+        if backoff_base < 0 or backoff_max < 0:
+            raise InfluxDBAttributeValueError('backoff values must be positive')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+
+    def get_delay(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as err:
+                if attempt >= self.max_retries or not is_transient_error(err):
+                    raise
+            self.sleep(self.get_delay(attempt))
+            attempt += 1
+
+
+NO_RETRY = RetryPolicy(max_retries=0)
+
+
+def get_unparsable_lines(lines, err):
+    """
+    RejectedLine of the `lines` named by a partial write error, raising
+    the error when none of them is.
+    """
+    unparsable_lines = set(UNPARSABLE_LINE.findall(err.error))
+    rejected = [RejectedLine(line, err) for line in lines if line in unparsable_lines]
+    if not rejected:
+        raise err
+    return rejected
+
+
+def write_lines(request, lines, retry_policy=None, bisect=True, **kwargs):
+    """
+    Writes `lines` with InfluxDBApi.write_points, retrying transient errors
+    according to `retry_policy`. When InfluxDB rejects the batch because of
+    malformed lines, the batch is bisected so that every valid line is
+    still written; the offending lines are returned as RejectedLine. On a
+    partial write, InfluxDB has already written the valid lines, so the
+    offending ones are read from its error instead, and nothing is resent.
+
+    `lines` may be a LineProtocolBuilder, whose buffer is sent as is; it
+    is only split into lines to be bisected.
+
+    Raises InfluxDBWriteDroppedError when a WriteScheduler drops the points.
+    Through a ShardRouter, see write_sharded_lines.
+    """
+    retry_policy = retry_policy or NO_RETRY
+    rejected = []
+    # observed once, rather than on every retry or bisected half
+    profiler = getattr(request, 'write_profiler', None)
+
+    if isinstance(request, ShardRouter):
+        lines = lines.lines() if isinstance(lines, LineProtocolBuilder) else list(lines)
+        if profiler is not None:
+            profiler.observe_lines(lines)
+        return write_sharded_lines(request, lines, retry_policy, bisect, **kwargs)
+
+    if isinstance(lines, LineProtocolBuilder):
+        with lines.view() as data:
+            if profiler is not None:
+                profiler.observe_buffer(data)
+                profiler = None
+            try:
+                written = retry_policy.call(
+                    InfluxDBApi.write_points,
+                    request,
+                    data,
+                    nb_points=lines.nb_points,
+                    profile=False,
+                    **kwargs
+                )
+                if written is False:
+                    raise InfluxDBWriteDroppedError(lines.nb_points)
+                return rejected
+            except InfluxDBUnparsableLinesError as err:
+                if not bisect:
+                    raise
+                return get_unparsable_lines(lines.lines(), err)
+            except PARSE_ERRORS:
+                if not bisect:
+                    raise
+        lines = lines.lines()
+
+    def write(lines):
+        str_points = '\n'.join(lines) + '\n'
+        try:
+            written = retry_policy.call(InfluxDBApi.write_points, request, str_points, profile=False, **kwargs)
+        except InfluxDBUnparsableLinesError as err:
+            if not bisect:
+                raise
+            rejected.extend(get_unparsable_lines(lines, err))
+            return
+        except PARSE_ERRORS as err:
+            if not bisect:
+                raise
+            if len(lines) == 1:
+                rejected.append(RejectedLine(lines[0], err))
+                return
+            middle = len(lines) // 2
+            write(lines[:middle])
+            write(lines[middle:])
+            return
+        if written is False:
+            raise InfluxDBWriteDroppedError(len(lines))
+
+    lines = list(lines)
+    if profiler is not None:
+        profiler.observe_lines(lines)
+    write(lines)
+    return rejected
+
+
+def write_sharded_lines(router, lines, retry_policy=None, bisect=True, **kwargs):
+    """
+    Writes `lines` through a ShardRouter with write_lines, node by node, so
+    that each node is retried and bisected with its own lines only. Nodes
+    that fail do not stop the others: once every node was written to,
+    InfluxDBShardWriteError is raised with the lines of the failed nodes,
+    so that only those are retried or spooled by the caller, or the error
+    of the single node that was written to.
+    """
+    rejected = []
+    failures = []
+    node_lines_list = router.split_lines(lines)
+    for node_request, node_lines in node_lines_list:
+        try:
+            rejected.extend(write_lines(node_request, node_lines, retry_policy, bisect, **kwargs))
+        except Exception as err:
+            failures.append((node_lines, err))
+    if failures and len(node_lines_list) == 1:
+        raise failures[0][1]
+    if failures:
+        raise InfluxDBShardWriteError(failures)
+    return rejected
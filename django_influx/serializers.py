@@ -1,6 +1,8 @@
 import json
 import itertools
 import pandas as pd
+from .attributes import TagFieldAttribute, TimestampFieldAttribute
+from .db.function.aggregations import Count
 from .exceptions import InfluxDBInvalidResponseError
 from .response import InfluxDBResponse
 
@@ -86,6 +88,42 @@ class PandasSerializer(FlatFormattedSerieSerializer):
         return df
 
 
+def iter_formatted_rows(responses):
+    """
+    Rows of the responses of a chunked query, formatted as those of
+    FlatFormattedSerieSerializer, as the responses are received.
+    """
+    groups = {}
+    for raw_response in responses:
+        response = InfluxDBResponse(raw_response)
+        response.raise_if_error()
+        for serie in response.series:
+            name = serie.name
+            columns = serie.columns
+            tags = serie.tags
+            group_id = groups.setdefault((name, tuple(sorted(tags.items()))), len(groups))
+            for v in serie.values or []:
+                yield {**dict(zip(columns, v)), **tags, 'tags': tags, 'measurement': name, 'group_id': group_id}
+
+
+def get_timestamp_attribute_names(measurement):
+    timestamp_attributes = measurement._get_timestamp_attributes()
+    timestamp_attributes_names = [
+        ta.attribute_name
+        for ta in timestamp_attributes
+    ]
+    if 'time' not in timestamp_attributes_names:
+        timestamp_attributes_names.append('time')
+    return timestamp_attributes_names
+
+
+def iter_measurement_points(rows, measurement):
+    timestamp_attributes_names = get_timestamp_attribute_names(measurement)
+    for row in rows:
+        MeasurementQuerySet.convert_to_seconds(timestamp_attributes_names, [row])
+        yield measurement(**row)
+
+
 class MeasurementPointSerializer(FlatFormattedSerieSerializer):
 
     def __init__(self, response, measurement):
@@ -123,20 +161,55 @@ class MeasurementPointSerializer(FlatFormattedSerieSerializer):
 
 
 class MeasurementQuerySet(object):
-
-    def __init__(self, flat_formatted_series, measurement, groups=None):
-        self.flat_formatted_series = flat_formatted_series
+    """
+    Points of a measurement. Given a `query` instead of formatted series,
+    the queryset is lazy: the query runs when the points are first needed,
+    and its rows are then kept. Until then, slicing pushes LIMIT and OFFSET
+    down to a new lazy queryset, count() may run a COUNT query, and bool(),
+    first() and last() fetch a single point.
+
+    Since LIMIT and OFFSET apply to each series, slices of queries returning
+    several series are taken from all their points instead.
+    """
+
+    def __init__(self, flat_formatted_series, measurement, groups=None, query=None):
         self.groups = groups
         self.measurement = measurement
-        timestamp_attributes = self.measurement._get_timestamp_attributes()
-        timestamp_attributes_names = [
-            ta.attribute_name
-            for ta in timestamp_attributes
-        ]
-        if 'time' not in timestamp_attributes_names:
-            timestamp_attributes_names.append('time')
+        self.query = query
+        self._result_cache = None
+        if flat_formatted_series is not None:
+            self._set_result_cache(flat_formatted_series)
 
+    def _set_result_cache(self, flat_formatted_series):
+        timestamp_attributes_names = get_timestamp_attribute_names(self.measurement)
         self.convert_to_seconds(timestamp_attributes_names, flat_formatted_series)
+        self._result_cache = flat_formatted_series
+
+    @property
+    def flat_formatted_series(self):
+        if self._result_cache is None:
+            self._fetch_all()
+        return self._result_cache
+
+    @staticmethod
+    def _execute(query):
+        response = InfluxDBResponse(query.execute())
+        response.raise_if_error()
+        return response
+
+    def _fetch_all(self):
+        serializer = FlatFormattedSerieSerializer(self._execute(self.query))
+        rows = serializer.convert()
+        self.groups = serializer.groups
+        self._set_result_cache(rows)
+
+    def _chain(self, query):
+        return self.__class__(None, self.measurement, query=query)
+
+    def _is_single_series(self):
+        query = self.query
+        grouped = query.has_group_by_tags or (query.has_group_by_time and query.selected_group_by_tags)
+        return not grouped and len(query.measurements) <= 1
 
     @staticmethod
     def convert_to_seconds(attr_names, series):
@@ -157,8 +230,40 @@ class MeasurementQuerySet(object):
         else:
             return iter(pd.DataFrame(self.flat_formatted_series))
 
+    def __len__(self):
+        return len(self.flat_formatted_series)
+
+    def __bool__(self):
+        if self._result_cache is None:
+            return bool(self._get_first_rows(self.query))
+        return bool(self._result_cache)
+
+    def _slice_query(self, start, stop):
+        """Query of the rows from `start` to `stop`, or None when empty."""
+        query = self.query
+        offset = (query.offset_value or 0) + start
+        limit = None if stop is None else stop - start
+        if query.limit_value is not None:
+            remaining = query.limit_value - start
+            limit = remaining if limit is None else min(limit, remaining)
+        if limit is not None and limit <= 0:
+            return None
+        query = query.reset('limit', 'offset')
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
     def __getitem__(self, k):
+        lazy = self._result_cache is None and self.query is not None and self._is_single_series()
         if isinstance(k, slice):
+            start, stop, step = k.start or 0, k.stop, k.step
+            if lazy and start >= 0 and (stop is None or stop >= 0):
+                query = self._slice_query(start, stop if stop is None else max(stop, start))
+                queryset = self._chain(query) if query is not None else \
+                    self.__class__([], self.measurement)
+                return queryset if step is None else list(queryset)[::step]
             if self.measurement:
                 return (self.measurement(**ffs) for ffs in self.flat_formatted_series[k])
             else:
@@ -166,6 +271,11 @@ class MeasurementQuerySet(object):
                 df['time'] = pd.to_datetime(df['time'], unit='s')
                 return df
         else:
+            if lazy and k >= 0:
+                points = list(self[k:k + 1])
+                if not points:
+                    raise IndexError('MeasurementQuerySet index out of range')
+                return points[0]
             if self.measurement:
                 return self.measurement(**self.flat_formatted_series[k])
             else:
@@ -173,6 +283,88 @@ class MeasurementQuerySet(object):
                 df['time'] = pd.to_datetime(df['time'], unit='s')
                 return df
 
+    def _get_count_field(self):
+        """
+        Field present in every point, when the queryset selects raw points
+        of a measurement declaring a single field, or a field that is not
+        nullable: COUNT(*) counts each field on its own, so it cannot count
+        points with sparse fields.
+        """
+        query = self.query
+        if not self.measurement or query.selected_fields or query.has_group_by_time \
+                or query.selected_into_measurement is not None:
+            return None
+        fields = [
+            attr for attr in self.measurement._get_attributes()
+            if not isinstance(attr, (TagFieldAttribute, TimestampFieldAttribute))
+        ]
+        if len(fields) == 1:
+            return fields[0].name
+        required_fields = [attr for attr in fields if not attr.is_nullable]
+        return required_fields[0].name if required_fields else None
+
+    def count(self):
+        """
+        Number of points, from a COUNT query of the only field of the
+        measurement, or of its first field with is_nullable=False, when the
+        queryset is lazy and selects raw points, less the offset and up to
+        the limit of each series. Otherwise the points are fetched: on a
+        measurement with several nullable fields, any of them may be missing
+        from a point, so neither COUNT of a field nor the largest COUNT(*)
+        column is its number of points.
+        """
+        count_field = None if self._result_cache is not None else self._get_count_field()
+        if count_field is None:
+            return len(self.flat_formatted_series)
+        query = self.query
+        count_query = query.reset('select', 'limit', 'offset', 'order_by') \
+            .select(Count('"{}"'.format(count_field.replace('"', '\\"'))))
+        total = 0
+        for serie in self._execute(count_query).series:
+            row = (serie.values or [[]])[0]
+            counts = [v for c, v in zip(serie.columns, row) if c != 'time' and isinstance(v, int)]
+            count = max(sum(counts) - (query.offset_value or 0), 0)
+            if query.limit_value is not None:
+                count = min(count, query.limit_value)
+            total += count
+        return total
+
+    def _get_first_rows(self, query):
+        rows = FlatFormattedSerieSerializer(self._execute(query.limit(1))).convert()
+        timestamp_attributes_names = get_timestamp_attribute_names(self.measurement)
+        self.convert_to_seconds(timestamp_attributes_names, rows)
+        return rows
+
+    def _get_edge_point(self, rows, last):
+        """
+        First, or last, point of `rows` in the order of the query. Rows of
+        several series are compared by time, since they come series by
+        series, and LIMIT 1 returns one row per series.
+        """
+        if not rows:
+            return None
+        if self.query is None or self._is_single_series():
+            return self.measurement(**rows[-1 if last else 0])
+        is_descending = self.query.is_chronological_sort is False
+        pick = max if last != is_descending else min
+        return self.measurement(**pick(rows, key=lambda row: row['time']))
+
+    def first(self):
+        if self._result_cache is not None:
+            rows = self._result_cache
+        else:
+            rows = self._get_first_rows(self.query)
+        return self._get_edge_point(rows, last=False)
+
+    def last(self):
+        query = self.query
+        if self._result_cache is not None or query.limit_value is not None or query.offset_value is not None:
+            rows = self.flat_formatted_series
+        else:
+            reversed_query = query.desc() if query.is_chronological_sort is not False else query.asc()
+            rows = self._get_first_rows(reversed_query)
+        return self._get_edge_point(rows, last=True)
+
     def dataframe(self):
         df = pd.DataFrame(self.flat_formatted_series)
         df['time'] = pd.to_datetime(df['time'], unit='s')
@@ -185,6 +377,8 @@ class MeasurementQuerySet(object):
         return self.flat_formatted_series
 
     def tagged_groups(self):
+        flat_formatted_series = self.flat_formatted_series
+
         def generate_group(series):
             if self.measurement:
                 return (self.measurement(**ffs) for ffs in series)
@@ -194,6 +388,6 @@ class MeasurementQuerySet(object):
                 return df
 
         return (
-            (group, generate_group([ffs for ffs in self.flat_formatted_series if ffs['group_id'] == group_id])) for
+            (group, generate_group([ffs for ffs in flat_formatted_series if ffs['group_id'] == group_id])) for
             group_id, group in self.groups.items()
         )
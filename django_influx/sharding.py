@@ -0,0 +1,143 @@
+import bisect
+import hashlib
+from .exceptions import InfluxDBAttributeValueError, InfluxDBInvalidChoiceError
+from .line_protocol import get_measurement_name, split_line
+
+DEFAULT_REPLICAS = 128
+
+_measurement_routes = {}
+
+
+class ShardKey:
+    MEASUREMENT = 'measurement'
+    SERIES = 'series'
+
+
+SHARD_KEY_CHOICES = (ShardKey.MEASUREMENT, ShardKey.SERIES)
+
+
+def register_route(measurement_name, node):
+    """Pins every point of a measurement to `node`, on any ShardRouter."""
+    if node is None:
+        _measurement_routes.pop(measurement_name, None)
+    else:
+        _measurement_routes[measurement_name] = node
+
+
+def hash_key(key):
+    digest = hashlib.md5(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring placing `replicas` virtual nodes per node, so that
+    adding or removing one of N nodes only moves about 1/N of the keys.
+    """
+
+    def __init__(self, nodes=(), replicas=DEFAULT_REPLICAS):
+        if type(replicas) != int or replicas <= 0:
+            raise InfluxDBAttributeValueError('replicas must be a positive integer')
+        self.replicas = replicas
+        self._hashes = []
+        self._nodes = []
+        for node in nodes:
+            self.add_node(node)
+
+    def __len__(self):
+        return len(set(self._nodes))
+
+    @property
+    def nodes(self):
+        return sorted(set(self._nodes))
+
+    def add_node(self, node):
+        if node in self._nodes:
+            return
+        for replica in range(self.replicas):
+            key_hash = hash_key('{}#{}'.format(node, replica))
+            index = bisect.bisect(self._hashes, key_hash)
+            self._hashes.insert(index, key_hash)
+            self._nodes.insert(index, node)
+
+    def remove_node(self, node):
+        entries = [(h, n) for h, n in zip(self._hashes, self._nodes) if n != node]
+        self._hashes = [h for h, _ in entries]
+        self._nodes = [n for _, n in entries]
+
+    def get_node(self, key):
+        if not self._hashes:
+            raise InfluxDBAttributeValueError('the hash ring has no node')
+        index = bisect.bisect(self._hashes, hash_key(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+class ShardRouter:
+    """
+    Routes writes across InfluxDB nodes, given as a dict of node names to
+    InfluxDBRequest. A point goes to the node its measurement is pinned to
+    (`routes`, or Measurement.shard), otherwise to the node owning the hash
+    of its measurement name, or of its series key when `shard_key` is
+    'series'.
+
+    Queries of a measurement go to the node owning its name, which holds
+    all of its points only when it is pinned or sharded by measurement:
+    sharding by series spreads a measurement across nodes, so it only suits
+    measurements that are not read back through the router.
+    """
+
+    def __init__(self, nodes, replicas=DEFAULT_REPLICAS, shard_key=ShardKey.MEASUREMENT, routes=None):
+        if not nodes:
+            raise InfluxDBAttributeValueError('at least one node is required')
+        if shard_key not in SHARD_KEY_CHOICES:
+            msg = 'shard_key `{}` must be one of value of {}'.format(
+                shard_key,
+                SHARD_KEY_CHOICES,
+            )
+            raise InfluxDBInvalidChoiceError(msg)
+        self.requests = dict(nodes)
+        self.shard_key = shard_key
+        self.routes = dict(routes or {})
+        self.ring = HashRing(self.requests, replicas)
+        self.database_name = next(iter(self.requests.values())).database_name
+        self.write_profiler = None
+
+    def add_node(self, name, request):
+        self.requests[name] = request
+        self.ring.add_node(name)
+
+    def remove_node(self, name):
+        self.ring.remove_node(name)
+        self.requests.pop(name, None)
+
+    def get_pinned_node(self, measurement_name):
+        node = self.routes.get(measurement_name, _measurement_routes.get(measurement_name))
+        if node is not None and node not in self.requests:
+            msg = 'node `{}` must be one of value of {}'.format(node, list(self.requests))
+            raise InfluxDBInvalidChoiceError(msg)
+        return node
+
+    def get_node_for_measurement(self, measurement_name):
+        node = self.get_pinned_node(measurement_name)
+        if node is None:
+            node = self.ring.get_node(measurement_name)
+        return node
+
+    def get_node_for_line(self, line):
+        measurement_name = get_measurement_name(line)
+        node = self.get_pinned_node(measurement_name)
+        if node is not None:
+            return node
+        if self.shard_key == ShardKey.MEASUREMENT:
+            return self.ring.get_node(measurement_name)
+        return self.ring.get_node(split_line(line)[0])
+
+    def get_request_for_measurement(self, measurement_name):
+        return self.requests[self.get_node_for_measurement(measurement_name)]
+
+    def split_lines(self, lines):
+        """Returns (request, lines) pairs, one per node."""
+        node_lines = {}
+        for line in lines:
+            node_lines.setdefault(self.get_node_for_line(line), []).append(line)
+        return [(self.requests[node], lines) for node, lines in node_lines.items()]
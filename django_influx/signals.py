@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent by a WriteProfiler with `measurement`, `tag_key` and `cardinality`
+# the first time the estimated cardinality of a tag crosses its threshold.
+tag_cardinality_exceeded = Signal()
@@ -0,0 +1,366 @@
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+from .api import InfluxDBApi
+from .exceptions import InfluxDBAttributeValueError, InfluxDBShardWriteError
+from .retry import get_transient_lines, is_transient_error, write_lines
+from .sharding import ShardRouter
+from .writer import get_default_request
+
+logger = logging.getLogger(__name__)
+
+RECORD_HEADER = struct.Struct('>II')
+SEGMENT_SUFFIX = '.seg'
+OPEN_SEGMENT_SUFFIX = '.open'
+ACK_SUFFIX = '.ack'
+
+SpoolRecord = namedtuple(
+    'SpoolRecord',
+    ['offset', 'next_offset', 'database', 'retention_policy', 'precision', 'points'],
+)
+
+
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _read_records(path, offset=0):
+    with open(path, 'rb') as segment:
+        segment.seek(offset)
+        while True:
+            header = segment.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            length, checksum = RECORD_HEADER.unpack(header)
+            payload = segment.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            next_offset = offset + RECORD_HEADER.size + length
+            raw_meta, _, points = payload.partition(b'\n')
+            meta = json.loads(raw_meta.decode('utf-8'))
+            yield SpoolRecord(
+                offset,
+                next_offset,
+                meta.get('db'),
+                meta.get('rp'),
+                meta.get('precision', 'ns'),
+                points.decode('utf-8'),
+            )
+            offset = next_offset
+
+
+class WriteSpool:
+    """
+    Append-only, on-disk spool of line protocol batches that could not be
+    delivered. Batches are appended to an open segment, which is sealed
+    (fsync'ed and renamed) once it reaches `segment_max_bytes`. When the
+    spool grows over `max_bytes`, the oldest sealed segments are evicted.
+
+    Each record carries a CRC so that a segment left open by a crash is
+    truncated to its last complete record when the spool is reopened.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_bytes=1024 * 1024 * 1024,
+        segment_max_bytes=16 * 1024 * 1024,
+        fsync=True,
+    ):
+        if type(max_bytes) != int or max_bytes <= 0:
+            raise InfluxDBAttributeValueError('max_bytes must be a positive integer')
+        if type(segment_max_bytes) != int or segment_max_bytes <= 0:
+            raise InfluxDBAttributeValueError('segment_max_bytes must be a positive integer')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync = fsync
+        self.evicted_segments = 0
+        self.evicted_bytes = 0
+        self._lock = threading.RLock()
+        self._active = None
+        self._active_path = None
+        self._active_size = 0
+        os.makedirs(directory, exist_ok=True)
+        self._next_sequence = self._get_last_sequence() + 1
+        self._recover()
+
+    def _get_sequence(self, file_name):
+        try:
+            return int(file_name.split('.')[0])
+        except ValueError:
+            return None
+
+    def _get_last_sequence(self):
+        sequences = [
+            self._get_sequence(f) for f in os.listdir(self.directory)
+            if f.endswith((SEGMENT_SUFFIX, OPEN_SEGMENT_SUFFIX))
+        ]
+        sequences = [s for s in sequences if s is not None]
+        return max(sequences) if sequences else 0
+
+    def _path(self, sequence, suffix):
+        return os.path.join(self.directory, '{:020d}{}'.format(sequence, suffix))
+
+    def _recover(self):
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith(OPEN_SEGMENT_SUFFIX):
+                continue
+            path = os.path.join(self.directory, file_name)
+            valid_size = 0
+            for record in _read_records(path):
+                valid_size = record.next_offset
+            if valid_size == 0:
+                os.remove(path)
+                continue
+            with open(path, 'r+b') as segment:
+                segment.truncate(valid_size)
+            os.replace(path, path[:-len(OPEN_SEGMENT_SUFFIX)] + SEGMENT_SUFFIX)
+        _fsync_directory(self.directory)
+
+    @property
+    def size(self):
+        with self._lock:
+            return sum(os.path.getsize(p) for p in self.segments()) + self._active_size
+
+    def segments(self):
+        """Sealed segments, oldest first."""
+        return sorted(
+            os.path.join(self.directory, f)
+            for f in os.listdir(self.directory)
+            if f.endswith(SEGMENT_SUFFIX)
+        )
+
+    def append(self, points, database=None, retention_policy=None, precision='ns'):
+        if isinstance(points, str):
+            points = points.encode('utf-8')
+        meta = json.dumps({'db': database, 'rp': retention_policy, 'precision': precision})
+        payload = meta.encode('utf-8') + b'\n' + bytes(points)
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._active is None:
+                self._active_path = self._path(self._next_sequence, OPEN_SEGMENT_SUFFIX)
+                self._next_sequence += 1
+                self._active = open(self._active_path, 'ab')
+                self._active_size = 0
+            self._active.write(record)
+            self._active.flush()
+            if self.fsync:
+                os.fsync(self._active.fileno())
+            self._active_size += len(record)
+            if self._active_size >= self.segment_max_bytes:
+                self.rotate()
+            self._evict()
+
+    def rotate(self):
+        with self._lock:
+            if self._active is None:
+                return False
+            self._active.close()
+            sealed_path = self._active_path[:-len(OPEN_SEGMENT_SUFFIX)] + SEGMENT_SUFFIX
+            os.replace(self._active_path, sealed_path)
+            if self.fsync:
+                _fsync_directory(self.directory)
+            self._active = None
+            self._active_path = None
+            self._active_size = 0
+            return True
+
+    def _evict(self):
+        segments = self.segments()
+        total_size = sum(os.path.getsize(p) for p in segments) + self._active_size
+        while segments and total_size > self.max_bytes:
+            oldest = segments.pop(0)
+            segment_size = os.path.getsize(oldest)
+            self.remove(oldest)
+            total_size -= segment_size
+            self.evicted_segments += 1
+            self.evicted_bytes += segment_size
+            logger.warning('Spool is full, evicted %s (%d bytes)', oldest, segment_size)
+
+    def get_offset(self, path):
+        try:
+            with open(path + ACK_SUFFIX, 'r') as ack:
+                return int(ack.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def ack(self, path, offset):
+        if not os.path.exists(path):
+            return
+        tmp_path = path + ACK_SUFFIX + '.tmp'
+        with open(tmp_path, 'w') as ack:
+            ack.write(str(offset))
+            ack.flush()
+            if self.fsync:
+                os.fsync(ack.fileno())
+        os.replace(tmp_path, path + ACK_SUFFIX)
+
+    def read(self, path):
+        return _read_records(path, self.get_offset(path))
+
+    def remove(self, path):
+        with self._lock:
+            for file_path in (path, path + ACK_SUFFIX):
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        self.rotate()
+
+
+class SpoolReplayer:
+    """
+    Drains a WriteSpool oldest segment first once `/ping` succeeds,
+    without exceeding `max_points_per_second` and `max_bytes_per_second`.
+
+    Malformed lines are isolated by bisecting their record and dropped,
+    since replaying them can never succeed; the rest is still delivered.
+    Records failing with any other non transient error are dropped as a
+    whole.
+    """
+
+    def __init__(
+        self,
+        spool,
+        request=None,
+        max_points_per_second=None,
+        max_bytes_per_second=None,
+        ping_interval=5.0,
+    ):
+        self.spool = spool
+        self.request = request
+        self.max_points_per_second = max_points_per_second
+        self.max_bytes_per_second = max_bytes_per_second
+        self.ping_interval = ping_interval
+        self.delivered = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _get_request(self):
+        return self.request or get_default_request()
+
+    def is_reachable(self):
+        request = self._get_request()
+        if isinstance(request, ShardRouter):
+            node_requests = list(request.requests.values())
+        else:
+            node_requests = [request]
+        try:
+            for node_request in node_requests:
+                InfluxDBApi.ping(node_request)
+            return True
+        except Exception:
+            return False
+
+    def _throttle(self, started_at, nb_points, nb_bytes):
+        durations = [0]
+        if self.max_points_per_second:
+            durations.append(nb_points / self.max_points_per_second)
+        if self.max_bytes_per_second:
+            durations.append(nb_bytes / self.max_bytes_per_second)
+        remaining = max(durations) - (time.monotonic() - started_at)
+        if remaining > 0:
+            self._stop.wait(remaining)
+
+    def _send(self, record):
+        params = {'database': record.database, 'precision': record.precision}
+        if record.retention_policy is not None:
+            params['retention_policy_name'] = record.retention_policy
+        lines = [line for line in record.points.split('\n') if line]
+        return write_lines(self._get_request(), lines, **params)
+
+    def drain(self):
+        """
+        Replays every spooled record, returning False when InfluxDB became
+        unreachable before the spool was empty.
+        """
+        segments = self.spool.segments()
+        if not segments and self.spool.rotate():
+            segments = self.spool.segments()
+        for path in segments:
+            for record in self.spool.read(path):
+                if self._stop.is_set():
+                    return False
+                started_at = time.monotonic()
+                try:
+                    rejected = self._send(record)
+                    self.delivered += 1
+                    if rejected:
+                        self.rejected += len(rejected)
+                        logger.warning(
+                            'Dropped %d spooled points rejected by InfluxDB',
+                            len(rejected),
+                        )
+                except InfluxDBShardWriteError as err:
+                    # the other nodes were written: only the lines of the
+                    # failed ones are spooled again, as a new record
+                    transient_lines = get_transient_lines(err, ())
+                    if transient_lines:
+                        self.spool.append(
+                            '\n'.join(transient_lines) + '\n',
+                            database=record.database,
+                            retention_policy=record.retention_policy,
+                            precision=record.precision,
+                        )
+                    if len(transient_lines) < len(err.lines):
+                        self.dropped += 1
+                        logger.warning('Dropped spooled points rejected by InfluxDB: %s', err)
+                    if transient_lines:
+                        self.spool.ack(path, record.next_offset)
+                        logger.info('InfluxDB node unreachable, replay paused: %s', err)
+                        return False
+                except Exception as err:
+                    if is_transient_error(err):
+                        logger.info('InfluxDB unreachable, replay paused: %s', err)
+                        return False
+                    self.dropped += 1
+                    logger.warning('Dropped a spooled batch rejected by InfluxDB: %s', err)
+                self.spool.ack(path, record.next_offset)
+                self._throttle(
+                    started_at,
+                    record.points.count('\n') or 1,
+                    len(record.points),
+                )
+            self.spool.remove(path)
+        return True
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='influx-spool-replayer',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.is_reachable():
+                self.drain()
+            self._stop.wait(self.ping_interval)
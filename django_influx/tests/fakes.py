@@ -0,0 +1,51 @@
+from influx import exceptions
+
+
+class FakeResponse:
+    status_code = 204
+    text = ''
+
+
+class FakeRequest:
+    """
+    Stands for an InfluxDBRequest. Posted bodies are joined to bytes and
+    recorded in `posts` as (url, kwargs) pairs; points holding `bad` are
+    rejected as invalid numbers. Every call raises `fail_with` when given.
+    """
+
+    gzip = False
+    gzip_level = 6
+    gzip_min_size = 1024
+    write_scheduler = None
+    write_profiler = None
+    query_cache = None
+
+    def __init__(self, database_name='mydb', fail_with=None, **options):
+        self.database_name = database_name
+        self.fail_with = fail_with
+        self.posts = []
+        for name, value in options.items():
+            setattr(self, name, value)
+
+    @property
+    def bodies(self):
+        return [kwargs['data'].decode('utf-8') for _, kwargs in self.posts]
+
+    def get(self, url, **kwargs):
+        if self.fail_with is not None:
+            raise self.fail_with
+        return FakeResponse()
+
+    def post(self, url, **kwargs):
+        if self.fail_with is not None:
+            raise self.fail_with
+        data = kwargs['data']
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = b''.join(data)
+        kwargs['data'] = bytes(data)
+        self.posts.append((url, kwargs))
+        self.check_points(kwargs['data'])
+
+    def check_points(self, data):
+        if b'bad' in data:
+            raise exceptions.InfluxDBInvalidNumberError(data.decode('utf-8'))
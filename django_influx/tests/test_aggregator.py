@@ -0,0 +1,88 @@
+import io
+import os
+import socket
+import stat
+import threading
+import pytest
+from influx import exceptions
+from influx.aggregator import Aggregator, AggregatorClient, encode_frame, get_default_socket_path, read_frame
+from influx.api import InfluxDBApi
+from influx.writer import BatchWriter
+from influx.tests.fakes import FakeRequest
+
+
+@pytest.mark.unit_test
+class TestAggregator:
+    def test_frame_success(self):
+        params = {'db': 'mydb', 'precision': 's'}
+        rfile = io.BytesIO(encode_frame(params, b'm v=1i\n') * 2)
+        assert read_frame(rfile) == (params, b'm v=1i\n')
+        assert read_frame(rfile) == (params, b'm v=1i\n')
+        assert read_frame(rfile) is None
+
+    def test_aggregate_clients_success(self, tmp_path):
+        path = str(tmp_path / 'influx.sock')
+        request = FakeRequest()
+        aggregator = Aggregator(path, writer=BatchWriter(request=request, flush_interval=60))
+        aggregator.bind()
+        thread = threading.Thread(target=aggregator.serve_forever, args=(0.05,))
+        thread.start()
+        clients = [AggregatorClient(path, 'mydb') for _ in range(3)]
+        for index, client in enumerate(clients):
+            InfluxDBApi.write_points(client, 'm v={}i\n'.format(index), precision='s')
+            InfluxDBApi.write_points(client, 'm v={}i\n'.format(index), database='other')
+            client.close()
+        while aggregator.received_count < 6:
+            thread.join(0.01)
+        aggregator.shutdown()
+        thread.join()
+        posts = sorted(request.posts, key=lambda post: post[1]['params']['db'])
+        assert [(kwargs['params']['db'], kwargs['params']['precision']) for _, kwargs in posts] == [
+            ('mydb', 's'),
+            ('other', 'ns'),
+        ]
+        assert sorted(posts[0][1]['data'].decode('utf-8').splitlines()) == ['m v=0i', 'm v=1i', 'm v=2i']
+
+    def test_line_separators_in_strings_success(self, tmp_path):
+        request = FakeRequest()
+        writer = BatchWriter(request=request, flush_interval=60)
+        aggregator = Aggregator(str(tmp_path / 'influx.sock'), writer=writer)
+        aggregator.write({'db': 'mydb'}, 'm s="a\rb\x1cc\u2028d" 1\n'.encode('utf-8'))
+        writer.close()
+        assert request.bodies == ['m s="a\rb\x1cc\u2028d" 1\n']
+
+    def test_unreachable_aggregator_fail(self, tmp_path):
+        client = AggregatorClient(str(tmp_path / 'missing.sock'), 'mydb')
+        with pytest.raises(exceptions.InfluxDBConnectionError):
+            InfluxDBApi.write_points(client, 'm v=1i\n')
+
+    def test_forward_query_fail(self, tmp_path):
+        client = AggregatorClient(str(tmp_path / 'influx.sock'), 'mydb')
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            client.post('/query', params={})
+
+    def test_bind_private_socket_success(self, tmp_path):
+        path = str(tmp_path / 'influx.sock')
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        aggregator = Aggregator(path, writer=BatchWriter(request=FakeRequest(), flush_interval=60))
+        server = aggregator.bind()
+        try:
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+            with pytest.raises(exceptions.InfluxDBAttributeValueError):
+                Aggregator(path, writer=aggregator.writer).bind()
+        finally:
+            server.server_close()
+
+    def test_bind_over_file_fail(self, tmp_path):
+        path = tmp_path / 'influx.sock'
+        path.write_text('data')
+        aggregator = Aggregator(str(path), writer=BatchWriter(request=FakeRequest(), flush_interval=60))
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            aggregator.bind()
+        assert path.read_text() == 'data'
+
+    def test_default_socket_path_success(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+        assert get_default_socket_path() == str(tmp_path / 'django-influx.sock')
@@ -1,6 +1,7 @@
 import pytest
-from datetime import datetime
+from datetime import datetime, timezone
 from decimal import Decimal as D
+import numpy as np
 from influx import attributes, exceptions
 
 
@@ -83,6 +84,28 @@ class TestBaseAttribute:
         base_attr.set_internal_value(5)
 
 
+@pytest.mark.unit_test
+class TestGenericFieldAttribute:
+    def test_to_influx_success(self):
+        attr = attributes.GenericFieldAttribute()
+        assert attr.to_influx(5) == '5i'
+        assert attr.to_influx(5.5) == '5.5'
+        assert attr.to_influx(True) == 'true'
+        assert attr.to_influx('hello') == '"hello"'
+
+    def test_to_influx_numpy_success(self):
+        attr = attributes.GenericFieldAttribute()
+        assert attr.to_influx(np.int64(5)) == '5i'
+        assert attr.to_influx(np.int32(5)) == '5i'
+        assert attr.to_influx(np.float64(5.5)) == '5.5'
+        assert attr.to_influx(np.float32(0.5)) == '0.5'
+        assert attr.to_influx(np.bool_(False)) == 'false'
+
+    def test_to_influx_escape_string_success(self):
+        attr = attributes.GenericFieldAttribute()
+        assert attr.to_influx('say "hi"') == '"say \\"hi\\""'
+
+
 @pytest.mark.unit_test
 class TestIntegerFieldAttribute:
     def test_to_python_success(self):
@@ -238,6 +261,26 @@ class TestTimestampFieldAttribute:
         with pytest.raises(exceptions.InfluxDBAttributeValueError):
             attributes.TimestampFieldAttribute(precision='k')
 
+    def test_to_nanoseconds_success(self):
+        expected = 1570209691123456789
+        assert attributes.to_nanoseconds(1570209691) == 1570209691000000000
+        assert attributes.to_nanoseconds(1570209691.5) == 1570209691500000000
+        assert attributes.to_nanoseconds(D('1570209691.123456789')) == expected
+        assert attributes.to_nanoseconds(np.datetime64(expected, 'ns')) == expected
+        dt = datetime(2019, 10, 4, 17, 21, 31, 123456, tzinfo=timezone.utc)
+        assert attributes.to_nanoseconds(dt) == 1570209691123456000
+
+    def test_to_python_with_precision_success(self):
+        attr = attributes.TimestampFieldAttribute(precision='ms')
+        dt = datetime(2019, 10, 4, 17, 21, 31, 123456, tzinfo=timezone.utc)
+        assert attr.to_python(dt) == 1570209691123
+
+    def test_clean_with_auto_now_success(self):
+        attr = attributes.TimestampFieldAttribute(precision='s')
+        attr.set_internal_value(None)
+        assert isinstance(attr.get_internal_value(), int)
+        assert attr.formatted_timestamp == attr.get_internal_value()
+
 
 @pytest.mark.unit_test
 class TestDateTimeFieldAttribute:
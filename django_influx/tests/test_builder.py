@@ -0,0 +1,121 @@
+import pytest
+from influx import attributes
+from influx.builder import LineProtocolBuilder, build_grouped_batches
+from influx.measurement import Measurement
+from influx.retry import write_lines
+from influx.writer import WriteGroup, write_grouped_batches
+from influx.tests.fakes import FakeRequest
+
+
+def append_line(builder, line):
+    builder.append_line(line)
+
+
+@pytest.mark.unit_test
+class TestLineProtocolBuilder:
+    def create_measurement_class(self):
+        class MySampleMeasurement(Measurement):
+            measurement_name = 'my sample'
+            time = attributes.TimestampFieldAttribute(precision='s')
+            host = attributes.TagFieldAttribute()
+            value = attributes.FloatFieldAttribute()
+            count = attributes.IntegerFieldAttribute()
+            is_up = attributes.BooleanFieldAttribute()
+            state = attributes.StringFieldAttribute()
+            other = attributes.GenericFieldAttribute()
+
+        return MySampleMeasurement
+
+    def test_append_point_success(self):
+        measurement_cls = self.create_measurement_class()
+        point = measurement_cls(
+            time=1570481055,
+            host='server 1',
+            value=0.5,
+            count=10,
+            is_up=True,
+            state='a "b"',
+            other='x',
+        )
+        builder = LineProtocolBuilder()
+        builder.append_point(point)
+        builder.append_point(point)
+        expected = point.get_prep_value() + '\n'
+        with builder.view() as data:
+            assert bytes(data) == (expected * 2).encode('utf-8')
+        assert builder.nb_points == 2
+
+    def test_series_key_cache_info_success(self):
+        measurement_cls = self.create_measurement_class()
+        builder = LineProtocolBuilder()
+        for i in range(100):
+            builder.append_point(measurement_cls(time=1570481055 + i, host='server {}'.format(i % 2), value=0.5))
+        measurement_cls(time=1570481055, host='server 0', value=0.5).get_prep_value()
+        cache_info = measurement_cls.series_key_cache_info()
+        assert (cache_info.hits, cache_info.misses, cache_info.currsize) == (99, 2, 2)
+
+    def test_append_row_success(self):
+        measurement_cls = self.create_measurement_class()
+        encoder = measurement_cls._encoder
+        row = {'time': 1570481055, 'host': 'a,b', 'count': 3, 'state': None}
+        builder = LineProtocolBuilder()
+        builder.append_row(encoder, row)
+        assert builder.lines() == [encoder.encode_row(row)]
+
+    def test_lines_separators_in_strings_success(self):
+        builder = LineProtocolBuilder()
+        assert builder.lines() == []
+        builder.append_line('m s="a\x1cb\rc" 1')
+        builder.append_line('m v=1i')
+        assert builder.lines() == ['m s="a\x1cb\rc" 1', 'm v=1i']
+
+    def test_view_blocks_append_fail(self):
+        builder = LineProtocolBuilder()
+        with builder.view():
+            with pytest.raises(BufferError):
+                builder.append_line('m v=1i')
+        builder.append_line('m v=1i')
+        builder.clear()
+        assert len(builder) == 0
+        assert builder.nb_points == 0
+
+    def test_build_grouped_batches_success(self):
+        items = [('a', 'm v={}i'.format(i)) for i in range(5)] + [('b', 'm v=9i')]
+        batches = list(build_grouped_batches(items, append_line, 2, 1000))
+        assert [(group, builder.lines()) for group, builder in batches] == [
+            ('a', ['m v=0i', 'm v=1i']),
+            ('a', ['m v=2i', 'm v=3i']),
+            ('a', ['m v=4i']),
+            ('b', ['m v=9i']),
+        ]
+
+    def test_build_batches_max_bytes_success(self):
+        items = [('a', 'm v={}i'.format(i)) for i in range(5)]
+        batches = list(build_grouped_batches(items, append_line, 100, 15))
+        assert [builder.lines() for _, builder in batches] == [
+            ['m v=0i', 'm v=1i'],
+            ['m v=2i', 'm v=3i'],
+            ['m v=4i'],
+        ]
+        assert all(len(builder) <= 15 for _, builder in batches)
+
+    def test_write_builder_success(self):
+        request = FakeRequest()
+        batches = build_grouped_batches(
+            [(WriteGroup(), 'm v=1i'), (WriteGroup(), 'm v=2i')],
+            append_line,
+            1000,
+            1000,
+        )
+        result = write_grouped_batches(batches, request=request)
+        assert result.nb_points == 2
+        assert result.nb_bytes == 14
+        assert request.bodies == ['m v=1i\nm v=2i\n']
+
+    def test_bisect_builder_success(self):
+        request = FakeRequest()
+        builder = LineProtocolBuilder()
+        for line in ('m v=1i', 'm v=bad', 'm v=3i'):
+            builder.append_line(line)
+        rejected = write_lines(request, builder)
+        assert [r.line for r in rejected] == ['m v=bad']
@@ -0,0 +1,215 @@
+import threading
+import pytest
+from django.core.cache import caches
+from influx import exceptions
+from influx.api import InfluxDBApi
+from influx.cache import DjangoQueryCache, QueryResultCache, dumps_response, get_modified_measurements, \
+    is_cacheable_query, loads_response, normalize_query
+from influx.db.query import Query
+from influx.tests.fakes import FakeRequest
+
+
+class FakeResponse:
+    def __init__(self, json_data):
+        self.json_data = json_data
+
+    def json(self):
+        return self.json_data
+
+
+class QueryRequest(FakeRequest):
+    def __init__(self, query_cache=None):
+        super().__init__(query_cache=query_cache)
+        self.queries = []
+
+    def request(self, method, url, params=None):
+        self.queries.append(params['q'])
+        if 'bad' in params['q']:
+            return FakeResponse({'results': [{'statement_id': 0, 'error': 'bad query'}]})
+        return FakeResponse({'results': [{'statement_id': 0, 'series': [{'values': [[len(self.queries)]]}]}]})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def get_value(response):
+    return response['results'][0]['series'][0]['values'][0][0]
+
+
+@pytest.mark.unit_test
+class TestQueryResultCache:
+    def test_normalize_query_success(self):
+        query = "SELECT *   FROM \"my  cpu\"\n WHERE host = 'a  b' "
+        assert normalize_query(query) == "SELECT * FROM \"my  cpu\" WHERE host = 'a  b'"
+
+    def test_is_cacheable_query_success(self):
+        assert is_cacheable_query('select * from cpu')
+        assert is_cacheable_query('SHOW MEASUREMENTS;')
+        assert is_cacheable_query("SELECT * FROM cpu WHERE host = 'a;b'")
+        assert not is_cacheable_query('SELECT * INTO other FROM cpu')
+        assert not is_cacheable_query('DROP MEASUREMENT cpu')
+        assert not is_cacheable_query('SELECT * FROM cpu; DROP MEASUREMENT cpu')
+
+    def test_cached_query_success(self):
+        cache = QueryResultCache()
+        request = QueryRequest(cache)
+        first = InfluxDBApi.execute_query(request, 'SELECT * FROM cpu')
+        second = InfluxDBApi.execute_query(request, 'SELECT *  FROM cpu')
+        other_epoch = InfluxDBApi.execute_query(request, 'SELECT * FROM cpu', epoch='s')
+        assert get_value(first) == get_value(second) == 1
+        assert get_value(other_epoch) == 2
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 2
+
+    def test_error_not_cached_success(self):
+        cache = QueryResultCache()
+        request = QueryRequest(cache)
+        InfluxDBApi.execute_query(request, 'SELECT bad FROM cpu')
+        InfluxDBApi.execute_query(request, 'SELECT bad FROM cpu')
+        assert len(request.queries) == 2
+        assert len(cache) == 0
+
+    def test_ttl_success(self):
+        clock = FakeClock()
+        cache = QueryResultCache(ttl=10, clock=clock)
+        request = QueryRequest(cache)
+        InfluxDBApi.execute_query(request, 'SELECT * FROM cpu')
+        InfluxDBApi.execute_query(request, 'SELECT * FROM mem', cache_ttl=60)
+        InfluxDBApi.execute_query(request, 'SELECT * FROM disk', cache_ttl=0)
+        clock.now = 30
+        InfluxDBApi.execute_query(request, 'SELECT * FROM cpu')
+        InfluxDBApi.execute_query(request, 'SELECT * FROM mem')
+        assert request.queries == ['SELECT * FROM cpu', 'SELECT * FROM mem', 'SELECT * FROM disk', 'SELECT * FROM cpu']
+        assert cache.stats()['expirations'] == 1
+
+    def test_max_bytes_eviction_success(self):
+        cache = QueryResultCache(max_bytes=150)
+        request = QueryRequest(cache)
+        for measurement in ('cpu', 'mem', 'cpu', 'disk'):
+            InfluxDBApi.execute_query(request, 'SELECT * FROM {}'.format(measurement))
+        assert cache.nb_bytes <= 150
+        assert cache.stats()['evictions'] == 1
+        InfluxDBApi.execute_query(request, 'SELECT * FROM cpu')
+        assert len(request.queries) == 3
+
+    def test_write_invalidation_success(self):
+        cache = QueryResultCache()
+        request = QueryRequest(cache)
+        InfluxDBApi.execute_query(request, 'SELECT * FROM cpu', measurements=['cpu'])
+        InfluxDBApi.execute_query(request, 'SELECT * FROM "my mem"', measurements=['my mem'])
+        InfluxDBApi.execute_query(request, 'SHOW MEASUREMENTS')
+        InfluxDBApi.write_points(request, 'cpu,host=a value=1i\n')
+        assert cache.get_cached_measurements() == ['my mem']
+        InfluxDBApi.write_points(request, iter(['my\\ mem value=1i']))
+        assert len(cache) == 0
+        assert request.bodies == ['cpu,host=a value=1i\n', 'my\\ mem value=1i\n']
+
+    def test_drop_invalidation_success(self):
+        cache = QueryResultCache()
+        request = QueryRequest(cache)
+        InfluxDBApi.execute_query(request, 'SELECT * FROM cpu', measurements=['cpu'])
+        InfluxDBApi.execute_query(request, 'SELECT * FROM mem', measurements=['mem'])
+        InfluxDBApi.execute_query(request, 'DROP MEASUREMENT cpu')
+        assert cache.get_cached_measurements() == ['mem']
+        InfluxDBApi.execute_query(request, 'SELECT * FROM cpu', measurements=['cpu'])
+        InfluxDBApi.execute_query(request, 'SELECT * FROM mem', measurements=['mem'])
+        assert request.queries == ['SELECT * FROM cpu', 'SELECT * FROM mem', 'DROP MEASUREMENT cpu', 'SELECT * FROM cpu']
+        InfluxDBApi.execute_query(request, 'DROP DATABASE mydb', cache_ttl=0)
+        assert len(cache) == 0
+
+    def test_modified_measurements_success(self):
+        assert get_modified_measurements('DROP MEASUREMENT cpu') == {'cpu'}
+        assert get_modified_measurements('DELETE FROM cpu, "my mem" WHERE time < 1') == {'cpu', 'my mem'}
+        assert get_modified_measurements('drop series from "a\\"b"') == {'a"b'}
+        assert get_modified_measurements('DELETE WHERE host = \'a\'') is None
+        assert get_modified_measurements('DROP SERIES FROM /cpu.*/') is None
+        assert get_modified_measurements('DROP MEASUREMENT cpu; DROP DATABASE mydb') is None
+        assert get_modified_measurements('CREATE RETENTION POLICY rp ON mydb DURATION 1d REPLICATION 1') is None
+
+    def test_written_measurements_of_view_success(self):
+        cache = QueryResultCache()
+        for name in ('cpu', 'cpu2', 'my mem', 'disk'):
+            cache.set(('SELECT * FROM x', name, None), {'results': []}, measurements=[name])
+        data = bytearray(b'cpu2 value=1i\nmy\\ mem,host=a value=1i\ndisk_io value=1i\n')
+        with memoryview(data) as view:
+            assert cache.get_written_measurements(view) == {'cpu2', 'my mem'}
+
+    def test_invalid_ttl_fail(self):
+        with pytest.raises(exceptions.InfluxDBInvalidTypeError):
+            Query().ttl(-1)
+
+
+@pytest.mark.unit_test
+class TestDjangoQueryCache:
+    def setup_method(self):
+        caches['default'].clear()
+
+    def test_dumps_response_success(self):
+        response = {'results': [{'statement_id': 0, 'series': [{'values': [[1, 'a']] * 100}]}]}
+        data = dumps_response(response)
+        assert len(data) < len(str(response))
+        assert loads_response(data) == response
+
+    def test_get_or_execute_success(self):
+        cache = DjangoQueryCache()
+        calls = []
+
+        def execute():
+            calls.append(1)
+            return {'results': [{'statement_id': 0}]}
+
+        key = cache.get_key('SELECT * FROM cpu', 'mydb', 'ns')
+        assert key == cache.get_key('SELECT  *  FROM cpu', 'mydb', 'ns')
+        assert key != cache.get_key('SELECT * FROM cpu', 'other', 'ns')
+        assert cache.get_or_execute(key, execute) == cache.get_or_execute(key, execute)
+        assert len(calls) == 1
+
+    def test_error_not_cached_success(self):
+        cache = DjangoQueryCache()
+        key = cache.get_key('SELECT bad FROM cpu', 'mydb', 'ns')
+        cache.get_or_execute(key, lambda: {'error': 'bad query'})
+        assert cache.get(key) is None
+
+    def test_stampede_protection_success(self):
+        cache = DjangoQueryCache(poll_interval=0.01)
+        key = cache.get_key('SELECT * FROM cpu', 'mydb', 'ns')
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def execute():
+            calls.append(1)
+            started.set()
+            release.wait(1)
+            return {'results': [{'statement_id': 0}]}
+
+        def run():
+            results.append(cache.get_or_execute(key, execute))
+
+        threads = [threading.Thread(target=run)]
+        threads[0].start()
+        started.wait(1)
+        threads += [threading.Thread(target=run) for _ in range(3)]
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert results == [{'results': [{'statement_id': 0}]}] * 4
+
+    def test_lock_timeout_success(self):
+        cache = DjangoQueryCache(lock_timeout=0.05, poll_interval=0.01)
+        key = cache.get_key('SELECT * FROM cpu', 'mydb', 'ns')
+        caches['default'].add('{}:lock'.format(key), 1)
+        assert cache.get_or_execute(key, lambda: {'results': []}) == {'results': []}
+
+    def test_invalid_alias_fail(self):
+        with pytest.raises(exceptions.InfluxDBInvalidChoiceError):
+            Query().cache(alias='missing')
@@ -0,0 +1,90 @@
+import pytest
+from influx import attributes, exceptions
+from influx.coalesce import LineBuffer, coalesce_lines
+from influx.line_protocol import split_fields, split_line
+from influx.measurement import Measurement
+from influx.writer import BatchWriter
+from influx.tests.fakes import FakeRequest
+
+
+@pytest.mark.unit_test
+class TestLineProtocolParsing:
+    def test_split_line_success(self):
+        assert split_line('m,host=a v=1i 10') == ('m,host=a', 'v=1i', '10')
+        assert split_line('m,host=a v=1i') == ('m,host=a', 'v=1i', None)
+
+    def test_split_escaped_line_success(self):
+        line = 'my\\ meas,host=a\\ b s="x y\\" z",v=1i 10'
+        assert split_line(line) == ('my\\ meas,host=a\\ b', 's="x y\\" z",v=1i', '10')
+
+    def test_split_fields_success(self):
+        assert split_fields('a=1i,b=2.0') == [['a', '1i'], ['b', '2.0']]
+        assert split_fields('s="a,b=c",v=1i') == [('s', '"a,b=c"'), ('v', '1i')]
+
+    def test_split_invalid_line_fail(self):
+        with pytest.raises(ValueError):
+            split_line('m')
+
+
+@pytest.mark.unit_test
+class TestLineBuffer:
+    def test_coalesce_last_success(self):
+        lines = ['m,h=a v=1i 10', 'm,h=b v=2i 10', 'm,h=a w=3i 10', 'm,h=a v=4i 20']
+        assert coalesce_lines(lines, 'last') == ['m,h=a w=3i 10', 'm,h=b v=2i 10', 'm,h=a v=4i 20']
+
+    def test_coalesce_merge_success(self):
+        lines = ['m,h=a v=1i,s="x" 10', 'm,h=a v=2i,w=3i 10']
+        assert coalesce_lines(lines, 'merge') == ['m,h=a v=2i,s="x",w=3i 10']
+
+    def test_keep_points_without_timestamp_success(self):
+        lines = ['m,h=a v=1i', 'm,h=a v=2i']
+        assert coalesce_lines(lines, 'last') == lines
+
+    def test_no_coalesce_success(self):
+        buffer = LineBuffer()
+        buffer.extend(['m v=1i 10', 'm v=1i 10'])
+        assert len(buffer) == 2
+        assert buffer.nb_bytes == 20
+
+    def test_nb_bytes_success(self):
+        buffer = LineBuffer('last')
+        buffer.extend(['m v=1i 10', 'm v=12i 10'])
+        assert len(buffer) == 1
+        assert buffer.nb_bytes == 11
+
+    def test_invalid_coalesce_fail(self):
+        with pytest.raises(exceptions.InfluxDBInvalidChoiceError):
+            LineBuffer('first')
+
+
+@pytest.mark.unit_test
+class TestMeasurementCoalesce:
+    def create_measurement_class(self, coalesce):
+        class MySampleMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            time = attributes.TimestampFieldAttribute()
+            host = attributes.TagFieldAttribute()
+            value = attributes.IntegerFieldAttribute()
+
+        MySampleMeasurement.coalesce = coalesce
+        return MySampleMeasurement
+
+    def test_writer_coalesce_success(self):
+        measurement_cls = self.create_measurement_class('last')
+        request = FakeRequest()
+        writer = BatchWriter(request=request, flush_interval=60)
+        measurement_cls.write_rows([
+            {'time': 1570481055, 'host': 'a', 'value': 1},
+            {'time': 1570481055, 'host': 'a', 'value': 2},
+        ], writer=writer)
+        assert writer.pending == 1
+        writer.close()
+        url, kwargs = request.posts[0]
+        assert kwargs['data'] == b'mysamplemeasurement,host=a value=2i 1570481055000000000\n'
+
+    def test_invalid_class_coalesce_fail(self):
+        with pytest.raises(exceptions.InfluxDBInvalidChoiceError):
+            class MySampleMeasurement(Measurement):
+                measurement_name = 'mysamplemeasurement'
+                coalesce = 'first'
+                value = attributes.IntegerFieldAttribute()
@@ -1,4 +1,6 @@
 import pytest
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from influx.db.criteria import Field
 from influx.db.query import RawQuery, Query, BulkInsertQuery
 from influx.db.function.transformations import Abs
@@ -749,3 +751,69 @@ class TestSelectAggregation:
         assert prepared_query == 'SELECT MEDIAN(*) FROM "default"'
         res = query.execute()
         assert 'results' in res
+
+
+@pytest.mark.unit_test
+class TestDBQueryClone:
+    def test_chain_clone_success(self):
+        base = Query().from_measurements('default').filter(host='a')
+        limited = base.limit(10)
+        ordered = base.order_by('-time')
+        assert base._get_prepared_query() == 'SELECT * FROM "default" WHERE "host" = \'a\''
+        assert limited._get_prepared_query() == 'SELECT * FROM "default" WHERE "host" = \'a\' LIMIT 10'
+        assert ordered._get_prepared_query() == 'SELECT * FROM "default" WHERE "host" = \'a\' ORDER BY time DESC'
+        assert base.selected_criteria is not limited.selected_criteria
+
+    def test_select_clone_success(self):
+        base = Query().select('field1').from_measurements('default')
+        base.select('field2')
+        assert base._get_prepared_query() == 'SELECT field1 FROM "default"'
+
+    def test_exclude_success(self):
+        query = Query().from_measurements('default').exclude(host='a')
+        assert query._get_prepared_query() == 'SELECT * FROM "default" WHERE "host" != \'a\''
+
+    def test_hash_success(self):
+        first = Query().select('field1').from_measurements('default').limit(5)
+        second = Query().select('field1').from_measurements('default').limit(5)
+        assert first == second
+        assert hash(first) == hash(second)
+        assert first != second.limit(6)
+        assert len({first, second}) == 1
+
+    def test_compiled_query_reused_success(self):
+        first = Query().from_measurements('default').group_by('host')
+        second = Query().from_measurements('default').group_by('host')
+        assert first._chain_key == second._chain_key
+        prepared_query = first._get_prepared_query()
+        second._compile_query = None
+        assert second._get_prepared_query() == prepared_query
+
+    def test_compiled_query_value_type_success(self):
+        base = Query().from_measurements('default')
+        assert [base.filter(value=value)._get_prepared_query() for value in (1, True, 1.0)] == [
+            'SELECT * FROM "default" WHERE "value" = 1',
+            'SELECT * FROM "default" WHERE "value" = True',
+            'SELECT * FROM "default" WHERE "value" = 1.0',
+        ]
+
+    def test_compiled_query_equal_values_success(self):
+        base = Query().from_measurements('default')
+        values = [
+            Decimal('1.5'),
+            Decimal('1.50'),
+            datetime(2020, 1, 1, 1, tzinfo=timezone(timedelta(hours=1))),
+            datetime(2020, 1, 1, tzinfo=timezone.utc),
+        ]
+        assert [base.filter(value=value)._get_prepared_query() for value in values] == [
+            'SELECT * FROM "default" WHERE "value" = 1.5',
+            'SELECT * FROM "default" WHERE "value" = 1.50',
+            'SELECT * FROM "default" WHERE "value" = \'2020-01-01 01:00:00+01:00\'',
+            'SELECT * FROM "default" WHERE "value" = \'2020-01-01 00:00:00+00:00\'',
+        ]
+
+    def test_compiled_query_functions_success(self):
+        base = Query().from_measurements('default')
+        assert base.mean('value')._chain_key == base.mean('value')._chain_key
+        assert base.where(Field('value') > 1)._chain_key == base.where(Field('value') > 1)._chain_key
+        assert base.subquery(Query().from_measurements('other'))._chain_key is None
@@ -0,0 +1,123 @@
+from datetime import timedelta
+import pytest
+from influx import attributes, exceptions, writer
+from influx.db.function.aggregations import Count, Mean, Median, StdDev, Sum
+from influx.db.function.selectors import First, Last, Max, Min
+from influx.downsampling import AggregationBuffer, Downsampling, aggregate_lines
+from influx.measurement import Measurement
+from influx.writer import BatchWriter
+from influx.tests.fakes import FakeRequest
+
+
+@pytest.mark.unit_test
+class TestDownsampling:
+    def test_aggregate_lines_success(self):
+        downsampling = Downsampling(10, [Mean('value'), Count('value'), Max('value')])
+        lines = [
+            'cpu,host=a value=1i 1000000000',
+            'cpu,host=a value=4i 9000000000',
+            'cpu,host=b value=2i 3000000000',
+            'cpu,host=a value=3i 12000000000',
+        ]
+        assert aggregate_lines(lines, downsampling) == [
+            'cpu,host=a mean_value=2.5,count_value=2i,max_value=4i 0',
+            'cpu,host=b mean_value=2.0,count_value=1i,max_value=2i 0',
+            'cpu,host=a mean_value=3.0,count_value=1i,max_value=3i 10000000000',
+        ]
+
+    def test_all_fields_success(self):
+        downsampling = Downsampling(timedelta(minutes=1), [Count('*'), Sum('value')])
+        lines = ['cpu value=1.5,state="on" 10', 'cpu value=2i,state="off" 20']
+        assert aggregate_lines(lines, downsampling, 's') == [
+            'cpu count_value=2i,sum_value=3.5,count_state=2i 0',
+        ]
+
+    def test_selectors_success(self):
+        downsampling = Downsampling(60, [First('state'), Last('state'), Min('v'), StdDev('v')])
+        lines = ['cpu state="b",v=4 20', 'cpu state="a",v=2 10', 'cpu state="c",v=6 30']
+        assert aggregate_lines(lines, downsampling, 's') == [
+            'cpu first_state="a",last_state="c",min_v=2.0,stddev_v=2.0 0',
+        ]
+
+    def test_split_open_windows_success(self):
+        buffer = AggregationBuffer(Downsampling(10, [Count('value')]), 's')
+        buffer.extend(['cpu value=1i 5', 'cpu value=1i 15'])
+        open_buffer = buffer.split(until=12)
+        assert buffer.lines() == ['cpu count_value=1i 0']
+        assert open_buffer.lines() == ['cpu count_value=1i 10']
+
+    def test_unsupported_function_fail(self):
+        with pytest.raises(exceptions.InfluxDBInvalidChoiceError):
+            Downsampling(10, [Median('value')])
+
+    def test_window_precision_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            Downsampling(0.5, [Count('value')]).get_window('s')
+
+    def test_invalid_window_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            Downsampling(0, [Count('value')])
+
+
+@pytest.mark.unit_test
+class TestMeasurementDownsampling:
+    def create_measurement_class(self):
+        class MyEventMeasurement(Measurement):
+            measurement_name = 'myeventmeasurement'
+            aggregation_window = 10
+            aggregations = (Mean('value'), Count('value'))
+            time = attributes.TimestampFieldAttribute()
+            host = attributes.TagFieldAttribute()
+            value = attributes.IntegerFieldAttribute()
+
+        return MyEventMeasurement
+
+    def test_writer_downsampling_success(self):
+        measurement_cls = self.create_measurement_class()
+        request = FakeRequest()
+        writer = BatchWriter(request=request, flush_interval=60)
+        measurement_cls.write_rows(
+            [{'time': 1570481050 + i, 'host': 'a', 'value': i} for i in range(10)],
+            writer=writer,
+        )
+        assert writer.pending == 1
+        writer.flush()
+        assert request.bodies == [
+            'myeventmeasurement,host=a mean_value=4.5,count_value=10i 1570481050000000000\n',
+        ]
+
+    def test_open_window_kept_on_flush_success(self):
+        measurement_cls = self.create_measurement_class()
+        request = FakeRequest()
+        writer = BatchWriter(request=request, flush_interval=60)
+        writer.write_measurements([measurement_cls(host='a', value=1)])
+        writer.flush()
+        assert request.posts == []
+        assert writer.pending == 1
+        writer.close()
+        assert len(request.posts) == 1
+
+    def test_save_without_writer_fail(self):
+        measurement_cls = self.create_measurement_class()
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            measurement_cls(time=1570481050, host='a', value=1).save()
+
+    def test_bulk_save_without_writer_success(self, monkeypatch):
+        measurement_cls = self.create_measurement_class()
+        request = FakeRequest()
+        monkeypatch.setattr(writer, 'get_default_request', lambda transport=None: request)
+        points = [measurement_cls(time=1570481050 + i, host='a', value=i) for i in range(10)]
+        measurement_cls.bulk_save(points[:5])
+        measurement_cls.bulk_save(points[5:])
+        # each call aggregates its own points, the second one replacing the first
+        assert request.bodies == [
+            'myeventmeasurement,host=a mean_value=2.0,count_value=5i 1570481050000000000\n',
+            'myeventmeasurement,host=a mean_value=7.0,count_value=5i 1570481050000000000\n',
+        ]
+
+    def test_aggregations_without_window_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            class MyEventMeasurement(Measurement):
+                measurement_name = 'myeventmeasurement'
+                aggregations = (Mean('value'),)
+                value = attributes.IntegerFieldAttribute()
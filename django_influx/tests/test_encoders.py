@@ -0,0 +1,119 @@
+import pytest
+import numpy as np
+import pandas as pd
+from influx import attributes, exceptions
+from influx.encoders import DataFrameEncoder
+from influx.measurement import Measurement
+
+
+@pytest.mark.unit_test
+class TestDataFrameEncoder:
+    def create_measurement_class(self):
+        class MySampleMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            time = attributes.TimestampFieldAttribute()
+            host = attributes.TagFieldAttribute()
+            value = attributes.FloatFieldAttribute()
+            count = attributes.IntegerFieldAttribute()
+            is_up = attributes.BooleanFieldAttribute()
+            state = attributes.StringFieldAttribute()
+
+        return MySampleMeasurement
+
+    def test_encode_declared_columns_success(self):
+        measurement_cls = self.create_measurement_class()
+        df = pd.DataFrame({
+            'time': pd.to_datetime(['2019-10-07 20:44:15']),
+            'host': ['server 1'],
+            'value': [0.5],
+            'count': [10.0],
+            'is_up': [True],
+            'state': ['ok'],
+        })
+        lines = DataFrameEncoder(measurement_cls).encode(df)
+        assert lines.tolist() == [
+            'mysamplemeasurement,host=server\\ 1 '
+            'value=0.5,count=10i,is_up=true,state="ok" 1570481055000000000'
+        ]
+
+    def test_encode_numpy_dtypes_success(self):
+        measurement_cls = self.create_measurement_class()
+        df = pd.DataFrame({
+            'a': np.array([1], dtype=np.int32),
+            'b': np.array([1.5], dtype=np.float32),
+            'c': np.array([False]),
+        })
+        lines = DataFrameEncoder(measurement_cls).encode(df)
+        assert lines.tolist() == ['mysamplemeasurement a=1i,b=1.5,c=false']
+
+    def test_encode_skip_null_values_success(self):
+        measurement_cls = self.create_measurement_class()
+        df = pd.DataFrame({
+            'host': ['a', None],
+            'value': [np.nan, 2.0],
+            'state': [None, None],
+        })
+        lines = DataFrameEncoder(measurement_cls).encode(df)
+        assert lines.tolist() == ['mysamplemeasurement value=2.0']
+
+    def test_encode_time_column_success(self):
+        measurement_cls = self.create_measurement_class()
+        df = pd.DataFrame({'ts': [1570481055], 'value': [1.0]})
+        lines = DataFrameEncoder(measurement_cls, time_column='ts').encode(df)
+        assert lines.tolist() == ['mysamplemeasurement value=1.0 1570481055000000000']
+
+    def test_encode_datetime_index_success(self):
+        measurement_cls = self.create_measurement_class()
+        index = pd.DatetimeIndex(['2019-10-07 22:44:15+02:00'])
+        df = pd.DataFrame({'value': [1.0]}, index=index)
+        lines = DataFrameEncoder(measurement_cls).encode(df)
+        assert lines.tolist() == ['mysamplemeasurement value=1.0 1570481055000000000']
+
+    def test_encode_tag_columns_success(self):
+        measurement_cls = self.create_measurement_class()
+        df = pd.DataFrame({'region': ['eu,west'], 'value': [1.0]})
+        lines = DataFrameEncoder(measurement_cls, tag_columns=['region']).encode(df)
+        assert lines.tolist() == ['mysamplemeasurement,region=eu\\,west value=1.0']
+
+    def test_encode_unknown_column_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            measurement_cls = self.create_measurement_class()
+            df = pd.DataFrame({'value': [1.0]})
+            DataFrameEncoder(measurement_cls, tag_columns=['region']).encode(df)
+
+    def test_encode_without_fields_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            measurement_cls = self.create_measurement_class()
+            df = pd.DataFrame({'host': ['a']})
+            DataFrameEncoder(measurement_cls).encode(df)
+
+    def test_encode_like_measurement_encoder_success(self):
+        class MyRoundedMeasurement(Measurement):
+            measurement_name = 'myroundedmeasurement'
+            time = attributes.TimestampFieldAttribute()
+            value = attributes.FloatFieldAttribute(max_nb_decimals=2)
+            count = attributes.IntegerFieldAttribute()
+            is_up = attributes.BooleanFieldAttribute()
+
+        values = [(0.125, 10.0, True), (1.0, -3, False), (2.675, 0, np.bool_(True)), (-0.001, 1, False)]
+        rows = [
+            {'time': 1570481055, 'value': value, 'count': count, 'is_up': is_up}
+            for value, count, is_up in values
+        ]
+        df = pd.DataFrame(rows).astype({'is_up': object})
+        lines = DataFrameEncoder(MyRoundedMeasurement, time_column='time').encode(df)
+        assert lines.tolist() == [MyRoundedMeasurement(**row).get_prep_value() for row in rows]
+        assert lines[2] == 'myroundedmeasurement value=2.67,count=0i,is_up=true 1570481055000000000'
+
+    def test_encode_non_integral_value_fail(self):
+        measurement_cls = self.create_measurement_class()
+        df = pd.DataFrame({'count': [10.0, 10.7]})
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            DataFrameEncoder(measurement_cls).encode(df)
+
+    def test_encode_non_boolean_value_fail(self):
+        measurement_cls = self.create_measurement_class()
+        for value in ('false', '0', 0):
+            df = pd.DataFrame({'is_up': [True, value]})
+            with pytest.raises(exceptions.InfluxDBAttributeValueError):
+                DataFrameEncoder(measurement_cls).encode(df)
@@ -1,8 +1,10 @@
+import gzip
 import pytest
 import requests
 from influx.app import Influxable
 from influx.api import InfluxDBApi
 from influx import exceptions
+from influx.tests.fakes import FakeRequest
 
 
 @pytest.mark.unit_test
@@ -126,3 +128,61 @@ class TestInfluxApi:
                 instance.connection.request,
                 points,
             )
+
+
+@pytest.mark.unit_test
+class TestInfluxApiCompression:
+    def test_write_points_gzip_success(self):
+        points = 'mymeas,mytag=1 myfield=90\n' * 100
+        request = FakeRequest(gzip=True)
+        res = InfluxDBApi.write_points(request, points)
+        assert res is True
+        _, kwargs = request.posts[0]
+        assert kwargs['headers'] == {'Content-Encoding': 'gzip'}
+        assert gzip.decompress(kwargs['data']) == points.encode('utf-8')
+        assert len(kwargs['data']) < len(points)
+
+    def test_write_points_below_min_size_success(self):
+        points = 'mymeas,mytag=1 myfield=90'
+        request = FakeRequest(gzip=True, gzip_min_size=1024)
+        InfluxDBApi.write_points(request, points)
+        _, kwargs = request.posts[0]
+        assert kwargs['headers'] == {}
+        assert kwargs['data'] == points.encode('utf-8')
+
+    def test_write_points_without_gzip_success(self):
+        points = 'mymeas,mytag=1 myfield=90\n' * 100
+        request = FakeRequest()
+        InfluxDBApi.write_points(request, points)
+        _, kwargs = request.posts[0]
+        assert kwargs['headers'] == {}
+        assert kwargs['data'] == points.encode('utf-8')
+
+    def test_write_points_retention_policy_param_success(self):
+        request = FakeRequest()
+        InfluxDBApi.write_points(request, 'mymeas myfield=90', retention_policy_name='myrp')
+        InfluxDBApi.write_points(request, 'mymeas myfield=90')
+        assert request.posts[0][1]['params']['rp'] == 'myrp'
+        assert 'rp' not in request.posts[1][1]['params']
+
+    def test_write_points_stream_success(self):
+        points = ('mymeas,mytag=1 myfield={}'.format(i) for i in range(3))
+        request = FakeRequest()
+        InfluxDBApi.write_points(request, points)
+        _, kwargs = request.posts[0]
+        assert kwargs['data'] == b'mymeas,mytag=1 myfield=0\n' \
+            b'mymeas,mytag=1 myfield=1\nmymeas,mytag=1 myfield=2\n'
+
+    def test_write_points_stream_gzip_success(self):
+        lines = ['mymeas,mytag=1 myfield={}'.format(i) for i in range(1000)]
+        request = FakeRequest(gzip=True, gzip_min_size=1024 * 1024)
+        InfluxDBApi.write_points(request, iter(lines))
+        _, kwargs = request.posts[0]
+        assert kwargs['headers'] == {'Content-Encoding': 'gzip'}
+        assert gzip.decompress(kwargs['data']) == ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def test_stream_points_chunks_success(self):
+        lines = ['m v=1'] * 10
+        chunks = list(InfluxDBApi.stream_points(lines, chunk_size=12))
+        assert len(chunks) == 5
+        assert b''.join(chunks) == b'm v=1\n' * 10
@@ -152,7 +152,123 @@ class TestMeasurement:
         measurement_cls = self.create_measurement_class()
         instance = measurement_cls(time=1570481055, value=10)
         prep_value = instance.get_prep_value()
-        assert prep_value == 'mysamplemeasurement value=10i 1570481055000000000'
+        assert prep_value == 'mysamplemeasurement value=10i 1570481055'
+
+    def test_get_prep_value_with_tags_success(self):
+        class MyTaggedMeasurement(Measurement):
+            measurement_name = 'my measurement'
+            time = attributes.TimestampFieldAttribute()
+            host = attributes.TagFieldAttribute()
+            region = attributes.TagFieldAttribute(attribute_name='my-region')
+            value = attributes.IntegerFieldAttribute()
+            state = attributes.StringFieldAttribute()
+
+        instance = MyTaggedMeasurement(
+            time=1570481055,
+            host='server 1',
+            region='eu,west',
+            value=10,
+            state='say "ok"',
+        )
+        prep_value = instance.get_prep_value()
+        assert prep_value == 'my\\ measurement,host=server\\ 1,my-region=eu\\,west ' \
+            'value=10i,state="say \\"ok\\"" 1570481055000000000'
+
+    def test_get_prep_value_skip_none_success(self):
+        class MyTaggedMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            host = attributes.TagFieldAttribute()
+            value = attributes.IntegerFieldAttribute()
+            state = attributes.StringFieldAttribute()
+
+        instance = MyTaggedMeasurement(value=10)
+        assert instance.get_prep_value() == 'mysamplemeasurement value=10i'
+
+    def test_meta_encoder_success(self):
+        measurement_cls = self.create_measurement_class()
+        encoder = measurement_cls._encoder
+        assert encoder.prefix == 'mysamplemeasurement'
+        assert [key for _, key, _ in encoder.fields] == ['value=']
+        assert len(encoder.timestamps) == 1
+
+    def test_series_key_cache_success(self):
+        class MyTaggedMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            host = attributes.TagFieldAttribute()
+            value = attributes.IntegerFieldAttribute()
+
+        lines = list(MyTaggedMeasurement.encode_points([
+            ('server 1', 1), ('server 1', 2), ('server 2', 3),
+        ]))
+        assert lines == [
+            'mysamplemeasurement,host=server\\ 1 value=1i',
+            'mysamplemeasurement,host=server\\ 1 value=2i',
+            'mysamplemeasurement,host=server\\ 2 value=3i',
+        ]
+        cache_info = MyTaggedMeasurement.series_key_cache_info()
+        assert (cache_info.hits, cache_info.misses) == (1, 2)
+
+    def test_series_key_cache_size_success(self):
+        class MyTaggedMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            series_key_cache_size = 1
+            host = attributes.TagFieldAttribute()
+            value = attributes.IntegerFieldAttribute()
+
+        list(MyTaggedMeasurement.encode_points([('a', 1), ('b', 2), ('a', 3)]))
+        cache_info = MyTaggedMeasurement.series_key_cache_info()
+        assert (cache_info.hits, cache_info.misses, cache_info.currsize) == (0, 3, 1)
+
+    def test_encode_points_tuple_success(self):
+        measurement_cls = self.create_measurement_class()
+        lines = list(measurement_cls.encode_points([(1570481055, 10), (1570481065, 20)]))
+        assert lines == [
+            'mysamplemeasurement value=10i 1570481055',
+            'mysamplemeasurement value=20i 1570481065',
+        ]
+
+    def test_encode_points_dict_success(self):
+        class MyTaggedMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            host_name = attributes.TagFieldAttribute(attribute_name='host-name')
+            value = attributes.FloatFieldAttribute(max_nb_decimals=2)
+
+        lines = list(MyTaggedMeasurement.encode_points([
+            {'host_name': 'server 1', 'value': 1.005},
+            {'host-name': 'server 2', 'value': '2'},
+            {'value': 3},
+        ]))
+        assert lines == [
+            'mysamplemeasurement,host-name=server\\ 1 value=1.00',
+            'mysamplemeasurement,host-name=server\\ 2 value=2.00',
+            'mysamplemeasurement value=3.00',
+        ]
+
+    def test_encode_points_same_as_instance_success(self):
+        measurement_cls = self.create_measurement_class()
+        instance = measurement_cls(time=1570481055, value=10)
+        line = next(measurement_cls.encode_points([{'time': 1570481055, 'value': 10}]))
+        assert line == instance.get_prep_value()
+
+    def test_encode_points_unknown_attribute_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            measurement_cls = self.create_measurement_class()
+            list(measurement_cls.encode_points([{'unknown': 1}]))
+
+    def test_encode_points_too_many_values_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            measurement_cls = self.create_measurement_class()
+            list(measurement_cls.encode_points([(1570481055, 10, 20)]))
+
+    def test_encode_points_required_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            measurement_cls = self.create_measurement_class_with_required()
+            list(measurement_cls.encode_points([{'time': 1570481055}]))
+
+    def test_encode_points_invalid_value_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            measurement_cls = self.create_measurement_class()
+            list(measurement_cls.encode_points([(1570481055, 'S')]))
 
     def test_items_success(self):
         measurement_cls = self.create_measurement_class()
@@ -168,7 +284,9 @@ class TestMeasurement:
             measurement_cls(time=1570481075, value=30),
         ]
         res = measurement_cls.bulk_save(measurements)
-        assert res is True
+        assert res
+        assert res.nb_points == 3
+        assert res.failed_batches == []
 
     def test_bulk_fail_1(self):
         with pytest.raises(exceptions.InfluxDBAttributeValueError):
@@ -0,0 +1,117 @@
+import pytest
+from influx import exceptions
+from influx.api import InfluxDBApi
+from influx.builder import LineProtocolBuilder
+from influx.profiler import HyperLogLog, TopK, WriteProfiler, load_profiles
+from influx.retry import write_lines
+from influx.signals import tag_cardinality_exceeded
+from influx.tests.fakes import FakeRequest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.unit_test
+class TestWriteProfiler:
+    def test_hyperloglog_count_success(self):
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add('request-{}'.format(i % 10000))
+        assert 9500 < sketch.count() < 10500
+
+    def test_hyperloglog_merge_success(self):
+        first, second = HyperLogLog(10), HyperLogLog(10)
+        for i in range(3000):
+            first.add(str(i))
+            second.add(str(i + 2000))
+        first.merge(second)
+        assert 4500 < first.count() < 5500
+
+    def test_hyperloglog_merge_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            HyperLogLog(10).merge(HyperLogLog(12))
+
+    def test_top_k_success(self):
+        top = TopK(2, capacity=3)
+        for key in ['a'] * 50 + ['b'] * 30 + list('cdefghij'):
+            top.add(key)
+        assert [key for key, _, _ in top.most_common()] == ['a', 'b']
+        assert top.most_common()[0][1] == 50
+
+    def test_profile_write_success(self):
+        clock = FakeClock()
+        profiler = WriteProfiler(top_k=2, clock=clock)
+        request = FakeRequest(write_profiler=profiler)
+        InfluxDBApi.write_points(request, 'cpu,host=a v=1i 1\ncpu,host=a v=2i 2\ncpu,host=b v=1i 3\n')
+        clock.now += 2
+        InfluxDBApi.write_points(request, b'mem,host=a,region=eu v=1i\n')
+        InfluxDBApi.write_points(request, iter(['cpu,host=c v=1i']))
+        assert request.bodies[-1] == 'cpu,host=c v=1i\n'
+        cpu, mem = profiler.report()
+        assert cpu['measurement'] == 'cpu'
+        assert cpu['points'] == 4
+        assert cpu['points_per_second'] == 2
+        assert cpu['top_series'][0] == ('cpu,host=a', 2, 0)
+        assert cpu['tag_cardinalities'] == {'host': 3}
+        assert mem['tag_cardinalities'] == {'host': 1, 'region': 1}
+
+    def test_profile_bisected_write_once_success(self):
+        profiler = WriteProfiler()
+        request = FakeRequest(write_profiler=profiler)
+        rejected = write_lines(request, ['cpu,host=a v=1i', 'cpu,host=b v=bad', 'cpu,host=c v=3i'])
+        assert len(rejected) == 1
+        assert len(request.posts) > 1
+        builder = LineProtocolBuilder()
+        builder.append_line('cpu,host=a v=1i')
+        write_lines(request, builder)
+        cpu, = profiler.report()
+        assert cpu['points'] == 4
+        assert cpu['bytes'] == 16 * 4 + 1
+
+    def test_observe_buffer_success(self):
+        lines = ['my\\ cpu,host=a\\ b v=1i,s="x y" 1', 'mem,host=é v=1i', 'invalid']
+        clock = FakeClock()
+        from_lines, from_buffer = WriteProfiler(clock=clock), WriteProfiler(clock=clock)
+        from_lines.observe('\n'.join(lines) + '\n')
+        from_buffer.observe(bytearray(('\n'.join(lines) + '\n').encode('utf-8')))
+        assert from_buffer.report() == from_lines.report()
+        assert [p['measurement'] for p in from_buffer.report()] == ['my cpu', 'mem']
+
+    def test_line_separators_in_strings_success(self):
+        profiler = WriteProfiler()
+        profiler.observe('cpu,host=a s="a\rb\x1cc" 1\n')
+        profiler.observe(memoryview('cpu,host=b s="\u2028" 1\n'.encode('utf-8')))
+        assert [(p['measurement'], p['points']) for p in profiler.report()] == [('cpu', 2)]
+
+    def test_cardinality_exceeded_success(self):
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append((kwargs['measurement'], kwargs['tag_key']))
+
+        tag_cardinality_exceeded.connect(receiver)
+        try:
+            profiler = WriteProfiler(cardinality_threshold=50)
+            profiler.observe(''.join('http,request_id={} v=1i\n'.format(i) for i in range(200)))
+            profiler.observe('http,request_id=x v=1i\n')
+        finally:
+            tag_cardinality_exceeded.disconnect(receiver)
+        assert received == [('http', 'request_id')]
+        assert profiler.report()[0]['exceeded_tags'] == ['request_id']
+
+    def test_dump_and_load_success(self, tmp_path):
+        first = WriteProfiler(directory=str(tmp_path))
+        second = WriteProfiler(directory=str(tmp_path))
+        first.observe('cpu,host=a v=1i\ncpu,host=b v=1i\n')
+        second.observe('cpu,host=b v=1i\ncpu,host=c v=1i\n')
+        first.dump(str(tmp_path / '1.profile.json'))
+        second.dump(str(tmp_path / '2.profile.json'))
+        profiles = load_profiles(str(tmp_path))
+        assert profiles['cpu'].nb_points == 4
+        assert profiles['cpu'].get_tag_cardinalities() == {'host': 3}
+        assert profiles['cpu'].series.most_common(1) == [('cpu,host=b', 2, 0)]
@@ -0,0 +1,149 @@
+import pytest
+from influx import attributes
+from influx.db.query import Query
+from influx.measurement import Measurement
+from influx.serializers import MeasurementQuerySet
+
+NANOSECONDS = 1000 * 1000 * 1000
+ROWS = [[i * NANOSECONDS, i] for i in range(10)]
+
+
+class FakeServer:
+    """Answers the queries of MySampleMeasurement from ROWS."""
+
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, query):
+        prepared_query = query._get_prepared_query()
+        self.queries.append(prepared_query)
+        if prepared_query.startswith('SELECT COUNT('):
+            return self.response(['time', 'count'], [[0, len(ROWS)]])
+        if not query.has_group_by_tags:
+            return self.response(['time', 'value'], self.paginate(query, ROWS))
+        # host b comes last, with earlier points than host a
+        series = [
+            {'name': 'mysamplemeasurement', 'tags': {'host': 'a'}, 'columns': ['time', 'value'],
+             'values': self.paginate(query, ROWS)},
+            {'name': 'mysamplemeasurement', 'tags': {'host': 'b'}, 'columns': ['time', 'value'],
+             'values': self.paginate(query, [[t, v + 100] for t, v in ROWS[1:5]])},
+        ]
+        return {'results': [{'statement_id': 0, 'series': series}]}
+
+    @staticmethod
+    def paginate(query, rows):
+        rows = list(rows)
+        if query.is_chronological_sort is False:
+            rows.reverse()
+        offset = query.offset_value or 0
+        limit = query.limit_value
+        return rows[offset:None if limit is None else offset + limit]
+
+    @staticmethod
+    def response(columns, values):
+        serie = {'name': 'mysamplemeasurement', 'columns': columns, 'values': values}
+        return {'results': [{'statement_id': 0, 'series': [serie]}]}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(Query, 'execute', lambda query: server.execute(query))
+    return server
+
+
+@pytest.mark.unit_test
+class TestMeasurementQuerySet:
+    def create_measurement_class(self):
+        class MySampleMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            time = attributes.TimestampFieldAttribute(precision='s')
+            value = attributes.IntegerFieldAttribute()
+
+        return MySampleMeasurement
+
+    def test_lazy_evaluate_success(self, server):
+        measurement_cls = self.create_measurement_class()
+        queryset = measurement_cls.get_query().evaluate()
+        assert isinstance(queryset, MeasurementQuerySet)
+        assert server.queries == []
+        assert [point.value for point in queryset] == list(range(10))
+        assert [point.value for point in queryset] == list(range(10))
+        assert len(server.queries) == 1
+
+    def test_slice_pushdown_success(self, server):
+        measurement_cls = self.create_measurement_class()
+        queryset = measurement_cls.get_query().evaluate()
+        assert [point.value for point in queryset[2:5]] == [2, 3, 4]
+        assert server.queries == ['SELECT * FROM "mysamplemeasurement" OFFSET 2 LIMIT 3']
+        assert queryset[7].value == 7
+        assert [point.value for point in queryset[3:][1:3]] == [4, 5]
+        assert list(queryset[5:5]) == []
+
+    def test_slice_within_limit_success(self, server):
+        measurement_cls = self.create_measurement_class()
+        queryset = measurement_cls.get_query().limit(4).evaluate()
+        assert [point.value for point in queryset[2:10]] == [2, 3]
+        assert list(queryset[4:]) == []
+
+    def test_count_success(self, server):
+        measurement_cls = self.create_measurement_class()
+        assert measurement_cls.get_query().evaluate().count() == 10
+        assert measurement_cls.get_query().offset(8).evaluate().count() == 2
+        assert measurement_cls.get_query().limit(3).evaluate().count() == 3
+        assert server.queries[0] == 'SELECT COUNT("value") FROM "mysamplemeasurement"'
+        assert all(query.startswith('SELECT COUNT(') for query in server.queries)
+
+    def test_count_sparse_fields_success(self, server):
+        class MySparseMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            time = attributes.TimestampFieldAttribute(precision='s')
+            value = attributes.IntegerFieldAttribute()
+            other = attributes.IntegerFieldAttribute()
+
+        queryset = MySparseMeasurement.get_query().evaluate()
+        assert queryset.count() == 10
+        assert server.queries == ['SELECT * FROM "mysamplemeasurement"']
+
+    def test_count_required_field_success(self, server):
+        class MyRequiredMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            time = attributes.TimestampFieldAttribute(precision='s')
+            other = attributes.IntegerFieldAttribute()
+            value = attributes.IntegerFieldAttribute(is_nullable=False)
+
+        assert MyRequiredMeasurement.get_query().evaluate().count() == 10
+        assert server.queries == ['SELECT COUNT("value") FROM "mysamplemeasurement"']
+
+    def test_len_evaluates_success(self, server):
+        measurement_cls = self.create_measurement_class()
+        queryset = measurement_cls.get_query().evaluate()
+        assert len(queryset) == len(list(queryset)) == 10
+        assert server.queries == ['SELECT * FROM "mysamplemeasurement"']
+
+    def test_first_last_success(self, server):
+        measurement_cls = self.create_measurement_class()
+        queryset = measurement_cls.get_query().evaluate()
+        assert bool(queryset)
+        assert queryset.first().value == 0
+        assert queryset.last().value == 9
+        assert server.queries[-1] == 'SELECT * FROM "mysamplemeasurement" ORDER BY DESC LIMIT 1'
+        assert all(query.endswith('LIMIT 1') for query in server.queries)
+
+    def test_grouped_first_last_success(self, server):
+        measurement_cls = self.create_measurement_class()
+        queryset = measurement_cls.get_query().group_by('host').evaluate()
+        assert (queryset.first().value, queryset.last().value) == (0, 9)
+        assert server.queries[-1] == 'SELECT * FROM "mysamplemeasurement" GROUP BY host ORDER BY DESC LIMIT 1'
+        queryset = measurement_cls.get_query().group_by('host').desc().evaluate()
+        assert (queryset.first().value, queryset.last().value) == (9, 0)
+        list(queryset)
+        assert (queryset.first().value, queryset.last().value) == (9, 0)
+
+    def test_evaluated_queryset_success(self, server):
+        measurement_cls = self.create_measurement_class()
+        queryset = measurement_cls.get_query().evaluate()
+        list(queryset)
+        assert (len(queryset), queryset.first().value, queryset.last().value) == (10, 0, 9)
+        assert [point.value for point in queryset[8:]] == [8, 9]
+        assert len(server.queries) == 1
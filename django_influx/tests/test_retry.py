@@ -0,0 +1,179 @@
+import json
+import pytest
+import requests
+from influx import exceptions
+from influx.decorators import raise_if_error
+from influx.request import InfluxDBRequest
+from influx.retry import RetryPolicy, is_transient_error, write_lines
+from influx.writer import BatchWriter, write_batches
+from influx.tests.fakes import FakeRequest
+
+
+class FailingRequest(FakeRequest):
+    def __init__(self, nb_failures=0, status_code=503):
+        super().__init__()
+        self.nb_failures = nb_failures
+        self.status_code = status_code
+
+    def check_points(self, data):
+        if self.nb_failures:
+            self.nb_failures -= 1
+            response = requests.models.Response()
+            response.status_code = self.status_code
+            raise requests.exceptions.HTTPError(response=response)
+        super().check_points(data)
+        points = data.decode('utf-8')
+        if 'unparsable' in points:
+            # InfluxDB writes the valid points, and names the other lines
+            errors = [
+                "unable to parse '{}': invalid field format".format(line)
+                for line in points.splitlines() if 'unparsable' in line
+            ]
+            raise exceptions.InfluxDBUnparsableLinesError('partial write: {} dropped={}'.format(
+                '\n'.join(errors),
+                len(errors),
+            ))
+        if 'nodb' in points:
+            raise exceptions.InfluxDBBadRequestError({}, 'database not found: "mydb"')
+
+
+def no_sleep(delay):
+    pass
+
+
+class TimingOutAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, nb_timeouts):
+        super().__init__()
+        self.nb_timeouts = nb_timeouts
+        self.timeouts = []
+
+    def send(self, request, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        if self.nb_timeouts:
+            self.nb_timeouts -= 1
+            raise requests.exceptions.ReadTimeout(request=request)
+        response = requests.models.Response()
+        response.status_code = 204
+        response._content = b''
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.mark.unit_test
+class TestRetryPolicy:
+    def test_retry_transient_error_success(self):
+        request = FailingRequest(nb_failures=2)
+        policy = RetryPolicy(max_retries=2, sleep=no_sleep)
+        assert write_lines(request, ['m v=1i'], retry_policy=policy) == []
+        assert len(request.posts) == 3
+
+    def test_retry_timeout_success(self):
+        request = InfluxDBRequest('http://influxdb:8086', 'mydb', auth=None, timeout=2.5)
+        adapter = TimingOutAdapter(nb_timeouts=1)
+        request.mount('http://', adapter)
+        policy = RetryPolicy(max_retries=2, sleep=no_sleep)
+        assert write_lines(request, ['m v=1i'], retry_policy=policy) == []
+        assert adapter.timeouts == [2.5, 2.5]
+
+    def test_timeout_fail(self):
+        request = InfluxDBRequest('http://influxdb:8086', 'mydb', auth=None, timeout=2.5)
+        request.mount('http://', TimingOutAdapter(nb_timeouts=1))
+        with pytest.raises(requests.exceptions.Timeout):
+            write_lines(request, ['m v=1i'])
+
+    def test_retry_exhausted_fail(self):
+        with pytest.raises(requests.exceptions.HTTPError):
+            request = FailingRequest(nb_failures=3)
+            policy = RetryPolicy(max_retries=2, sleep=no_sleep)
+            write_lines(request, ['m v=1i'], retry_policy=policy)
+
+    def test_no_retry_on_client_error_fail(self):
+        request = FailingRequest(nb_failures=1, status_code=401)
+        policy = RetryPolicy(max_retries=2, sleep=no_sleep)
+        with pytest.raises(requests.exceptions.HTTPError):
+            write_lines(request, ['m v=1i'], retry_policy=policy)
+        assert len(request.posts) == 1
+
+    def test_backoff_delay_success(self):
+        policy = RetryPolicy(backoff_base=1, backoff_max=5)
+        delays = [policy.get_delay(attempt) for attempt in range(10)]
+        assert all(0 <= d <= 5 for d in delays)
+        assert 0 <= policy.get_delay(0) <= 1
+
+    def test_invalid_max_retries_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            RetryPolicy(max_retries=-1)
+
+    def test_is_transient_error_success(self):
+        assert is_transient_error(exceptions.InfluxDBConnectionError('down'))
+        assert is_transient_error(requests.exceptions.ReadTimeout())
+        assert not is_transient_error(exceptions.InfluxDBInvalidNumberError('m v=x'))
+
+
+@pytest.mark.unit_test
+class TestBisect:
+    def test_bisect_rejected_lines_success(self):
+        request = FailingRequest()
+        lines = ['m v={}i'.format(i) for i in range(8)]
+        lines[5] = 'm v=bad'
+        rejected = write_lines(request, lines)
+        assert [r.line for r in rejected] == ['m v=bad']
+        assert isinstance(rejected[0].exception, exceptions.InfluxDBInvalidNumberError)
+        written = [p for p in request.bodies if 'bad' not in p]
+        assert sum(p.count('\n') for p in written) == 7
+
+    def test_partial_write_rejected_lines_success(self):
+        request = FailingRequest()
+        lines = ['m v=1i', "m unparsable': x", 'm v=3i', 'm unparsable']
+        rejected = write_lines(request, lines)
+        assert [r.line for r in rejected] == ["m unparsable': x", 'm unparsable']
+        assert len(request.posts) == 1
+
+    def test_bad_request_not_bisected_fail(self):
+        request = FailingRequest()
+        with pytest.raises(exceptions.InfluxDBBadRequestError):
+            write_lines(request, ['nodb v={}i'.format(i) for i in range(8)])
+        assert len(request.posts) == 1
+
+    def test_partial_write_error_fail(self):
+        response = requests.models.Response()
+        response.status_code = 400
+        response._content = json.dumps({
+            'error': "partial write: unable to parse 'm v=': missing field value dropped=1",
+        }).encode('utf-8')
+
+        @raise_if_error
+        def post(self, url, **kwargs):
+            return response
+
+        with pytest.raises(exceptions.InfluxDBUnparsableLinesError):
+            post(FailingRequest(), '/write', data=b'm v=1i\nm v=\n')
+
+    def test_bisect_disabled_fail(self):
+        with pytest.raises(exceptions.InfluxDBInvalidNumberError):
+            write_lines(FailingRequest(), ['m v=1i', 'm v=bad'], bisect=False)
+
+    def test_write_batches_report_rejected_lines_success(self):
+        request = FailingRequest()
+        batches = [['m v=1i', 'm v=bad'], ['m v=3i']]
+        result = write_batches(batches, request=request)
+        assert not result
+        assert result.nb_points == 2
+        assert [r.line for r in result.rejected_lines] == ['m v=bad']
+        with pytest.raises(exceptions.InfluxDBBulkSaveError):
+            result.raise_if_error()
+
+    def test_batch_writer_rejected_lines_success(self):
+        request = FailingRequest()
+        rejected = []
+        writer = BatchWriter(request=request, flush_interval=60, on_reject=rejected.extend)
+        writer.write(['m v=1i', 'm v=bad', 'm v=3i'])
+        writer.close()
+        assert writer.flush_count == 1
+        assert writer.failed_count == 0
+        assert writer.rejected_count == 1
+        assert [r.line for r in writer.rejected_lines] == ['m v=bad']
+        assert [r.line for r in rejected] == ['m v=bad']
@@ -0,0 +1,153 @@
+import pytest
+from influx import attributes, exceptions
+from influx.api import InfluxDBApi
+from influx.line_protocol import get_measurement_name
+from influx.measurement import Measurement
+from influx.retry import RetryPolicy, is_transient_error, write_lines
+from influx.sharding import HashRing, ShardRouter
+from influx.spool import SpoolReplayer, WriteSpool
+from influx.writer import BatchWriter
+from influx.tests.fakes import FakeRequest
+
+
+def create_router(nb_nodes=3, **kwargs):
+    nodes = {'node{}'.format(i): FakeRequest() for i in range(nb_nodes)}
+    return ShardRouter(nodes, **kwargs)
+
+
+@pytest.mark.unit_test
+class TestHashRing:
+    def test_get_node_success(self):
+        ring = HashRing(['a', 'b', 'c'])
+        assert ring.get_node('cpu,host=1') == ring.get_node('cpu,host=1')
+        assert ring.nodes == ['a', 'b', 'c']
+
+    def test_spread_keys_success(self):
+        ring = HashRing(['a', 'b', 'c'])
+        nodes = [ring.get_node('cpu,host={}'.format(i)) for i in range(3000)]
+        for node in ('a', 'b', 'c'):
+            assert 600 < nodes.count(node) < 1400
+
+    def test_add_node_moves_few_keys_success(self):
+        keys = ['cpu,host={}'.format(i) for i in range(3000)]
+        ring = HashRing(['a', 'b', 'c'])
+        before = [ring.get_node(key) for key in keys]
+        ring.add_node('d')
+        after = [ring.get_node(key) for key in keys]
+        moved = [(b, a) for b, a in zip(before, after) if b != a]
+        assert all(a == 'd' for _, a in moved)
+        assert len(moved) < 3000 * 0.4
+
+    def test_remove_node_success(self):
+        ring = HashRing(['a', 'b'])
+        ring.remove_node('b')
+        assert ring.get_node('cpu') == 'a'
+        assert len(ring) == 1
+
+    def test_empty_ring_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            HashRing().get_node('cpu')
+
+
+@pytest.mark.unit_test
+class TestShardRouter:
+    def test_get_measurement_name_success(self):
+        assert get_measurement_name('cpu,host=a value=1i') == 'cpu'
+        assert get_measurement_name('my\\ cpu value=1i') == 'my cpu'
+        assert get_measurement_name('my\\,cpu,host=a') == 'my,cpu'
+
+    def test_split_lines_by_series_success(self):
+        router = create_router(shard_key='series')
+        lines = ['cpu,host={} value=1i'.format(i) for i in range(100)]
+        split = router.split_lines(lines)
+        assert len(split) > 1
+        assert sorted(line for _, node_lines in split for line in node_lines) == sorted(lines)
+
+    def test_split_lines_by_measurement_success(self):
+        router = create_router()
+        lines = ['cpu,host={} value=1i'.format(i) for i in range(100)]
+        assert router.split_lines(lines) == [(router.get_request_for_measurement('cpu'), lines)]
+
+    def test_routes_success(self):
+        router = create_router(routes={'cpu': 'node2'})
+        lines = ['cpu,host={} value=1i'.format(i) for i in range(10)]
+        assert router.split_lines(lines) == [(router.requests['node2'], lines)]
+        assert router.get_request_for_measurement('cpu') is router.requests['node2']
+
+    def test_measurement_shard_success(self):
+        class MyPinnedMeasurement(Measurement):
+            measurement_name = 'mypinnedmeasurement'
+            shard = 'node1'
+            value = attributes.IntegerFieldAttribute()
+
+        router = create_router()
+        with BatchWriter(request=router, flush_interval=60) as writer:
+            MyPinnedMeasurement.bulk_save(
+                [MyPinnedMeasurement(value=i) for i in range(10)],
+                writer=writer,
+            )
+        assert len(router.requests['node1'].posts) == 1
+        assert router.requests['node1'].bodies[0].count('\n') == 10
+
+    def test_write_points_success(self):
+        router = create_router(shard_key='series')
+        lines = ['cpu,host={} value=1i'.format(i) for i in range(100)]
+        InfluxDBApi.write_points(router, '\n'.join(lines))
+        posts = [post for request in router.requests.values() for post in request.bodies]
+        assert len(posts) > 1
+        assert sum(post.count('\n') for post in posts) == 100
+
+    def test_write_line_separators_in_strings_success(self):
+        router = create_router()
+        InfluxDBApi.write_points(router, 'cpu s="a\rb\x1cc" 1\n'.encode('utf-8'))
+        posts = [post for request in router.requests.values() for post in request.bodies]
+        assert posts == ['cpu s="a\rb\x1cc" 1\n']
+
+    def test_retry_failed_node_only_success(self):
+        router = create_router(shard_key='series')
+        lines = ['cpu,host={} value=1i'.format(i) for i in range(30)]
+        failing = router.requests['node1']
+        failing.fail_with = exceptions.InfluxDBConnectionError('unreachable')
+        retry_policy = RetryPolicy(max_retries=1, sleep=lambda delay: setattr(failing, 'fail_with', None))
+        assert write_lines(router, lines, retry_policy=retry_policy) == []
+        for node_lines in router.requests.values():
+            assert len(node_lines.posts) == 1
+        posts = [post for request in router.requests.values() for post in request.bodies]
+        assert sorted(line for post in posts for line in post.split('\n') if line) == sorted(lines)
+
+    def test_write_failed_node_fail(self):
+        router = create_router(shard_key='series')
+        lines = ['cpu,host={} value=1i'.format(i) for i in range(30)]
+        failing = router.requests['node1']
+        failing.fail_with = exceptions.InfluxDBConnectionError('unreachable')
+        with pytest.raises(exceptions.InfluxDBShardWriteError) as exc_info:
+            write_lines(router, lines)
+        node_lines = dict((request, lines) for request, lines in router.split_lines(lines))[failing]
+        assert exc_info.value.lines == node_lines
+        assert is_transient_error(exc_info.value)
+        assert sum(len(request.posts) for request in router.requests.values()) == 2
+
+    def test_spool_failed_node_only_success(self, tmp_path):
+        router = create_router(shard_key='series')
+        lines = ['cpu,host={} value=1i'.format(i) for i in range(30)]
+        failing = router.requests['node1']
+        failing.fail_with = exceptions.InfluxDBConnectionError('unreachable')
+        spool = WriteSpool(str(tmp_path))
+        writer = BatchWriter(request=router, flush_interval=60, spool=spool)
+        writer.write(lines)
+        writer.close()
+        node_lines = dict((request, lines) for request, lines in router.split_lines(lines))[failing]
+        assert writer.failed_flushes[0].points == '\n'.join(node_lines) + '\n'
+        failing.fail_with = None
+        assert SpoolReplayer(spool, request=router).drain()
+        assert failing.bodies == ['\n'.join(node_lines) + '\n']
+        for request in router.requests.values():
+            assert len(request.posts) == 1
+
+    def test_unknown_route_fail(self):
+        with pytest.raises(exceptions.InfluxDBInvalidChoiceError):
+            create_router(routes={'cpu': 'unknown'}).get_node_for_line('cpu value=1i')
+
+    def test_invalid_shard_key_fail(self):
+        with pytest.raises(exceptions.InfluxDBInvalidChoiceError):
+            create_router(shard_key='tag')
@@ -0,0 +1,124 @@
+import os
+import pytest
+from influx import exceptions
+from influx.spool import SpoolReplayer, WriteSpool
+from influx.writer import BatchWriter
+from influx.tests.fakes import FakeRequest
+
+
+@pytest.mark.unit_test
+class TestWriteSpool:
+    def test_append_and_read_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), fsync=False)
+        spool.append('m v=1i\n', database='db1')
+        spool.append('m v=2i\n', database='db2', precision='s')
+        assert spool.rotate() is True
+        segments = spool.segments()
+        assert len(segments) == 1
+        records = list(spool.read(segments[0]))
+        assert [(r.database, r.precision, r.points) for r in records] == [
+            ('db1', 'ns', 'm v=1i\n'),
+            ('db2', 's', 'm v=2i\n'),
+        ]
+
+    def test_segment_rotation_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), segment_max_bytes=10, fsync=False)
+        spool.append('m v=1i\n')
+        spool.append('m v=2i\n')
+        assert len(spool.segments()) == 2
+
+    def test_eviction_oldest_first_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), max_bytes=100, segment_max_bytes=10, fsync=False)
+        for i in range(10):
+            spool.append('m v={}i\n'.format(i))
+        assert spool.size <= 100
+        assert spool.evicted_segments > 0
+        records = [r for path in spool.segments() for r in spool.read(path)]
+        assert records[-1].points == 'm v=9i\n'
+        assert records[0].points != 'm v=0i\n'
+
+    def test_recover_truncated_segment_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), fsync=False)
+        spool.append('m v=1i\n')
+        spool.append('m v=2i\n')
+        active_path = spool._active_path
+        spool._active.close()
+        with open(active_path, 'r+b') as segment:
+            segment.truncate(os.path.getsize(active_path) - 3)
+
+        recovered_spool = WriteSpool(str(tmp_path), fsync=False)
+        segments = recovered_spool.segments()
+        assert len(segments) == 1
+        assert [r.points for r in recovered_spool.read(segments[0])] == ['m v=1i\n']
+
+    def test_ack_resume_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), fsync=False)
+        spool.append('m v=1i\n')
+        spool.append('m v=2i\n')
+        spool.rotate()
+        path = spool.segments()[0]
+        first_record = next(spool.read(path))
+        spool.ack(path, first_record.next_offset)
+        assert [r.points for r in WriteSpool(str(tmp_path)).read(path)] == ['m v=2i\n']
+
+    def test_invalid_options_fail(self, tmp_path):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            WriteSpool(str(tmp_path), max_bytes=0)
+
+
+@pytest.mark.unit_test
+class TestSpoolReplayer:
+    def test_drain_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), fsync=False)
+        spool.append('m v=1i\n', database='db1')
+        spool.append('m v=2i\n', database='db2')
+        request = FakeRequest()
+        replayer = SpoolReplayer(spool, request=request)
+        assert replayer.drain() is True
+        assert replayer.delivered == 2
+        assert [kwargs['params']['db'] for _, kwargs in request.posts] == ['db1', 'db2']
+        assert spool.segments() == []
+
+    def test_drain_line_separators_in_strings_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), fsync=False)
+        spool.append('m s="a\rb\x1cc\u2028d" 1\n')
+        request = FakeRequest()
+        SpoolReplayer(spool, request=request).drain()
+        assert [kwargs['data'] for _, kwargs in request.posts] == ['m s="a\rb\x1cc\u2028d" 1\n'.encode('utf-8')]
+
+    def test_drain_unreachable_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), fsync=False)
+        spool.append('m v=1i\n')
+        error = exceptions.InfluxDBConnectionError('unreachable')
+        replayer = SpoolReplayer(spool, request=FakeRequest(fail_with=error))
+        assert replayer.is_reachable() is False
+        assert replayer.drain() is False
+        assert len(spool.segments()) == 1
+
+    def test_drain_drop_rejected_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), fsync=False)
+        spool.append('m v=invalid\n')
+        error = exceptions.InfluxDBInvalidNumberError('m v=invalid')
+        replayer = SpoolReplayer(spool, request=FakeRequest(fail_with=error))
+        assert replayer.drain() is True
+        assert replayer.rejected == 1
+        assert spool.segments() == []
+
+    def test_drain_drop_non_transient_error_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), fsync=False)
+        spool.append('m v=1i\n')
+        error = exceptions.InfluxDBUnauthorizedError('unauthorized')
+        replayer = SpoolReplayer(spool, request=FakeRequest(fail_with=error))
+        assert replayer.drain() is True
+        assert replayer.dropped == 1
+        assert spool.segments() == []
+
+    def test_batch_writer_spool_success(self, tmp_path):
+        spool = WriteSpool(str(tmp_path), fsync=False)
+        error = exceptions.InfluxDBConnectionError('unreachable')
+        writer = BatchWriter(request=FakeRequest(fail_with=error), spool=spool)
+        writer.write('m v=1i')
+        writer.close()
+        spool.rotate()
+        records = [r for path in spool.segments() for r in spool.read(path)]
+        assert [r.points for r in records] == ['m v=1i\n']
@@ -0,0 +1,113 @@
+import json
+import pytest
+from influx import exceptions
+from influx.api import InfluxDBApi
+from influx.decorators import raise_if_error
+from influx.response import iter_json_lines, merge_chunked_responses
+from influx.serializers import iter_formatted_rows
+from influx.tests.fakes import FakeRequest
+
+CHUNKS = [
+    {'results': [{'statement_id': 0, 'series': [
+        {'name': 'cpu', 'tags': {'host': 'a'}, 'columns': ['time', 'value'], 'values': [[1, 0.5], [2, 0.6]]},
+    ], 'partial': True}]},
+    {'results': [{'statement_id': 0, 'series': [
+        {'name': 'cpu', 'tags': {'host': 'a'}, 'columns': ['time', 'value'], 'values': [[3, 0.7]]},
+        {'name': 'cpu', 'tags': {'host': 'b'}, 'columns': ['time', 'value'], 'values': [[1, 0.1]]},
+    ]}]},
+]
+
+
+def encode_body(responses):
+    return b''.join(json.dumps(response).encode('utf-8') + b'\n' for response in responses)
+
+
+class FakeStreamResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.closed = False
+        self.json_calls = 0
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), 7):
+            yield self.body[start:start + 7]
+
+    def json(self):
+        self.json_calls += 1
+        return json.loads(self.body)
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class StreamingRequest(FakeRequest):
+    def __init__(self, body):
+        super().__init__()
+        self.calls = []
+        self.response = FakeStreamResponse(body)
+
+    def request(self, method, url, params=None, stream=False):
+        self.calls.append((params, stream))
+        return self.response
+
+
+@pytest.mark.unit_test
+class TestStreaming:
+    def test_iter_json_lines_success(self):
+        body = encode_body(CHUNKS)
+        chunks = [body[i:i + 5] for i in range(0, len(body), 5)]
+        assert list(iter_json_lines(chunks)) == CHUNKS
+        assert list(iter_json_lines([body.rstrip(b'\n')])) == CHUNKS
+
+    def test_merge_chunked_responses_success(self):
+        merged = merge_chunked_responses(json.loads(json.dumps(CHUNKS)))
+        series = merged['results'][0]['series']
+        assert [serie['tags']['host'] for serie in series] == ['a', 'b']
+        assert series[0]['values'] == [[1, 0.5], [2, 0.6], [3, 0.7]]
+
+    def test_iter_query_success(self):
+        request = StreamingRequest(encode_body(CHUNKS))
+        responses = InfluxDBApi.iter_query(request, 'SELECT * FROM cpu', chunk_size=2)
+        assert request.calls == []
+        assert next(responses) == CHUNKS[0]
+        params, stream = request.calls[0]
+        assert (params['chunked'], params['chunk_size'], stream) == ('true', 2, True)
+        assert list(responses) == CHUNKS[1:]
+        assert request.response.closed
+
+    def test_execute_chunked_query_success(self):
+        request = StreamingRequest(encode_body(CHUNKS))
+        response = InfluxDBApi.execute_query(request, 'SELECT * FROM cpu', chunked=True)
+        assert len(response['results'][0]['series'][0]['values']) == 3
+
+    def test_iter_formatted_rows_success(self):
+        rows = list(iter_formatted_rows(CHUNKS))
+        assert [(row['host'], row['time'], row['group_id']) for row in rows] == [
+            ('a', 1, 0),
+            ('a', 2, 0),
+            ('a', 3, 0),
+            ('b', 1, 1),
+        ]
+
+    def test_iter_formatted_rows_error_fail(self):
+        rows = iter_formatted_rows(CHUNKS[:1] + [{'results': [{'statement_id': 0, 'error': 'timeout'}]}])
+        assert next(rows)['time'] == 1
+        with pytest.raises(exceptions.InfluxDBError):
+            list(rows)
+
+    def test_streamed_body_not_read_success(self):
+        response = FakeStreamResponse(encode_body(CHUNKS))
+
+        @raise_if_error
+        def request(self, url, **kwargs):
+            return response
+
+        request(None, '/query', stream=True)
+        assert response.json_calls == 0
+        request(None, '/query')
+        assert response.json_calls == 1
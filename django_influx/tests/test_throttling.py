@@ -0,0 +1,191 @@
+import pytest
+from influx import exceptions
+from influx.api import InfluxDBApi
+from influx.line_protocol import count_lines
+from influx.retry import is_transient_error
+from influx.sharding import ShardRouter
+from influx.throttling import AdaptiveBatchSize, TokenBucket, WriteScheduler
+from influx.writer import BatchWriter, write_batches
+from influx.tests.fakes import FakeRequest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.now += delay
+
+
+@pytest.mark.unit_test
+class TestTokenBucket:
+    def test_refill_success(self):
+        clock = FakeClock()
+        bucket = TokenBucket(100, clock=clock)
+        assert bucket.get_delay(100) == 0
+        bucket.consume(100)
+        assert bucket.get_delay(50) == 0.5
+        clock.now = 0.5
+        assert bucket.get_delay(50) == 0
+
+    def test_capacity_success(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10, capacity=20, clock=clock)
+        clock.now = 100
+        bucket.refill()
+        assert bucket.tokens == 20
+
+    def test_invalid_rate_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            TokenBucket(0)
+
+
+@pytest.mark.unit_test
+class TestWriteScheduler:
+    def test_block_success(self):
+        clock = FakeClock()
+        scheduler = WriteScheduler(points_per_second=100, clock=clock, sleep=clock.sleep)
+        assert scheduler.acquire(100, 1000)
+        assert scheduler.acquire(50, 500)
+        assert clock.now == 0.5
+        assert scheduler.throttled_seconds == 0.5
+
+    def test_bytes_rate_success(self):
+        clock = FakeClock()
+        scheduler = WriteScheduler(bytes_per_second=1000, clock=clock, sleep=clock.sleep)
+        scheduler.acquire(1, 3000)
+        assert scheduler.acquire(1, 1000)
+        assert clock.now == 3.0
+
+    def test_drop_success(self):
+        clock = FakeClock()
+        scheduler = WriteScheduler(points_per_second=100, overflow='drop', clock=clock)
+        assert scheduler.acquire(100, 1000)
+        assert not scheduler.acquire(10, 100)
+        assert scheduler.dropped_points == 10
+        assert scheduler.dropped_batches == 1
+
+    def test_raise_fail(self):
+        clock = FakeClock()
+        scheduler = WriteScheduler(points_per_second=100, overflow='raise', clock=clock)
+        scheduler.acquire(100, 1000)
+        with pytest.raises(exceptions.InfluxDBWriteThrottledError):
+            scheduler.acquire(10, 100)
+
+    def test_max_wait_fail(self):
+        clock = FakeClock()
+        scheduler = WriteScheduler(points_per_second=100, max_wait=1, clock=clock)
+        scheduler.acquire(100, 1000)
+        with pytest.raises(exceptions.InfluxDBWriteThrottledError) as exc_info:
+            scheduler.acquire(500, 1000)
+        assert is_transient_error(exc_info.value)
+
+    def test_invalid_overflow_fail(self):
+        with pytest.raises(exceptions.InfluxDBInvalidChoiceError):
+            WriteScheduler(overflow='wait')
+
+
+@pytest.mark.unit_test
+class TestAdaptiveBatchSize:
+    def test_grow_and_shrink_success(self):
+        batch_size = AdaptiveBatchSize(0.1, min_size=100, max_size=1000, increase_step=100)
+        batch_size.observe(1.0)
+        assert batch_size.size == 500
+        batch_size.observe(1.0)
+        batch_size.observe(1.0)
+        batch_size.observe(1.0)
+        assert batch_size.size == 100
+        batch_size.observe(0.01)
+        assert batch_size.size == 200
+
+    def test_invalid_sizes_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            AdaptiveBatchSize(0.1, min_size=1000, max_size=100)
+
+
+@pytest.mark.unit_test
+class TestThrottledWrites:
+    def test_write_points_dropped_success(self):
+        scheduler = WriteScheduler(points_per_second=2, overflow='drop')
+        request = FakeRequest(write_scheduler=scheduler)
+        assert InfluxDBApi.write_points(request, 'm v=1i\nm v=2i\n')
+        assert InfluxDBApi.write_points(request, 'm v=3i\n') is False
+        assert request.bodies == ['m v=1i\nm v=2i\n']
+
+    def test_write_batches_dropped_fail(self):
+        scheduler = WriteScheduler(points_per_second=1, overflow='drop')
+        request = FakeRequest(write_scheduler=scheduler)
+        result = write_batches([['m v=1i', 'm v=2i'], ['m v=3i', 'm v=4i']], request=request)
+        assert request.posts == []
+        assert len(result.dropped_batches) == len(result.failed_batches) == 2
+        with pytest.raises(exceptions.InfluxDBBulkSaveError):
+            result.raise_if_error()
+
+    def test_batch_writer_dropped_fail(self):
+        scheduler = WriteScheduler(points_per_second=1, overflow='drop')
+        writer = BatchWriter(request=FakeRequest(write_scheduler=scheduler), flush_interval=60)
+        writer.write(['m v=1i', 'm v=2i'])
+        writer.close()
+        assert (writer.flush_count, writer.failed_count) == (0, 1)
+        assert isinstance(writer.failed_flushes[0].exception, exceptions.InfluxDBWriteDroppedError)
+
+    def test_write_points_nb_points_success(self):
+        scheduler = WriteScheduler(points_per_second=2, overflow='drop')
+        request = FakeRequest(write_scheduler=scheduler)
+        assert InfluxDBApi.write_points(request, b'm v=1i\nm v=2i\n', nb_points=1)
+        assert InfluxDBApi.write_points(request, b'm v=3i\n')
+        assert InfluxDBApi.write_points(request, b'm v=4i\n') is False
+
+    def test_count_lines_success(self):
+        data = bytearray(b'm v=1i\nm s="a\rb" 1\n')
+        with memoryview(data) as view:
+            assert count_lines(view) == 2
+            assert count_lines(view[7:]) == 1
+        assert count_lines('m v=1i\n'.encode('utf-8')) == 1
+
+    def test_write_points_observe_latency_success(self):
+        scheduler = WriteScheduler(target_latency=60, min_batch_size=10, max_batch_size=100)
+        scheduler.adaptive_batch_size.size = 10
+        InfluxDBApi.write_points(FakeRequest(write_scheduler=scheduler), 'm v=1i\n')
+        assert scheduler.get_batch_size(1000) == 15
+
+    def test_batch_writer_adaptive_batch_size_success(self):
+        scheduler = WriteScheduler(target_latency=60, min_batch_size=10, max_batch_size=100)
+        scheduler.adaptive_batch_size.size = 10
+        request = FakeRequest(write_scheduler=scheduler)
+        writer = BatchWriter(request=request, flush_interval=60)
+        writer.write(['m v={}i'.format(i) for i in range(25)])
+        writer.close()
+        assert [post.count('\n') for post in request.bodies] == [10, 10, 5]
+
+    def test_batch_writer_sharded_batch_size_success(self):
+        schedulers = [
+            WriteScheduler(target_latency=60, min_batch_size=10, max_batch_size=100),
+            WriteScheduler(target_latency=60, min_batch_size=10, max_batch_size=100),
+        ]
+        schedulers[0].adaptive_batch_size.size = 20
+        schedulers[1].adaptive_batch_size.size = 10
+        router = ShardRouter({
+            'node{}'.format(index): FakeRequest(write_scheduler=scheduler)
+            for index, scheduler in enumerate(schedulers)
+        })
+        writer = BatchWriter(request=router, batch_size=1000, flush_interval=60)
+        assert writer._get_batch_size() == 10
+        writer.close()
+
+    def test_streamed_latency_without_throttling_success(self):
+        scheduler = WriteScheduler(
+            points_per_second=250,
+            burst=0.4,
+            target_latency=0.1,
+            min_batch_size=10,
+            max_batch_size=100,
+        )
+        scheduler.adaptive_batch_size.size = 10
+        request = FakeRequest(write_scheduler=scheduler)
+        InfluxDBApi.write_points(request, iter(['m v={}i'.format(i) for i in range(150)]))
+        assert scheduler.throttled_seconds > 0.1
+        assert scheduler.get_batch_size(1000) == 15
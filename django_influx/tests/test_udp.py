@@ -0,0 +1,70 @@
+import socket
+import pytest
+from influx import attributes, exceptions
+from influx.api import InfluxDBApi
+from influx.measurement import Measurement
+from influx.udp import UDPClient, pack_datagrams
+from influx.writer import BatchWriter
+
+
+@pytest.fixture
+def listener():
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_socket.bind(('127.0.0.1', 0))
+    udp_socket.settimeout(1)
+    yield udp_socket
+    udp_socket.close()
+
+
+def receive_datagrams(listener, nb_datagrams):
+    return [listener.recv(65535) for _ in range(nb_datagrams)]
+
+
+@pytest.mark.unit_test
+class TestUDP:
+    def test_pack_datagrams_success(self):
+        data = b''.join(b'm v=%di\n' % i for i in range(100))
+        datagrams = list(pack_datagrams(data, mtu=64))
+        assert all(len(datagram) <= 64 for datagram in datagrams)
+        assert all(datagram.endswith(b'\n') for datagram in datagrams)
+        assert b''.join(datagrams) == data
+
+    def test_pack_large_point_success(self):
+        data = b'm v="' + b'x' * 100 + b'"\nm v=1i\n'
+        datagrams = list(pack_datagrams(data, mtu=64))
+        assert datagrams == [b'm v="' + b'x' * 100 + b'"\n', b'm v=1i\n']
+
+    def test_write_points_success(self, listener):
+        client = UDPClient(*listener.getsockname(), database_name='mydb', mtu=16)
+        InfluxDBApi.write_points(client, 'm v=1i\nm v=2i\nm v=3i\n')
+        assert receive_datagrams(listener, 2) == [b'm v=1i\nm v=2i\n', b'm v=3i\n']
+        assert client.sent_datagrams == 2
+
+    def test_other_database_fail(self, listener):
+        client = UDPClient(*listener.getsockname(), database_name='mydb')
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            InfluxDBApi.write_points(client, 'm v=1i\n', database='other')
+
+    def test_other_precision_fail(self, listener):
+        client = UDPClient(*listener.getsockname(), database_name='mydb')
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            InfluxDBApi.write_points(client, 'm v=1i\n', precision='s')
+
+    def test_measurement_transport_success(self, listener):
+        class MyMetricMeasurement(Measurement):
+            measurement_name = 'mymetricmeasurement'
+            transport = 'udp'
+            value = attributes.IntegerFieldAttribute()
+
+        client = UDPClient(*listener.getsockname(), database_name='mydb')
+        with BatchWriter(request=client, flush_interval=60) as writer:
+            MyMetricMeasurement.bulk_save([MyMetricMeasurement(value=1)], writer=writer)
+            assert [key[0].transport for key in writer._buffers] == ['udp']
+        assert receive_datagrams(listener, 1) == [b'mymetricmeasurement value=1i\n']
+
+    def test_invalid_transport_fail(self):
+        with pytest.raises(exceptions.InfluxDBInvalidChoiceError):
+            class MyMetricMeasurement(Measurement):
+                measurement_name = 'mymetricmeasurement'
+                transport = 'tcp'
+                value = attributes.IntegerFieldAttribute()
@@ -0,0 +1,245 @@
+import time
+import pytest
+import pandas as pd
+from influx import attributes, exceptions
+from influx.measurement import Measurement
+from influx.writer import BatchWriter, WriteGroup, split_batches, split_grouped_batches, \
+    write_batches, write_grouped_batches, write_stream
+from influx.tests.fakes import FakeRequest
+
+
+@pytest.mark.unit_test
+class TestBatchWriter:
+    def create_measurement_class(self):
+        class MySampleMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            value = attributes.IntegerFieldAttribute()
+
+        return MySampleMeasurement
+
+    def test_write_and_flush_success(self):
+        request = FakeRequest()
+        writer = BatchWriter(request=request, flush_interval=60)
+        writer.write('mymeas value=1i\nmymeas value=2i')
+        writer.write(['mymeas value=3i'])
+        assert writer.pending == 3
+        assert request.posts == []
+        writer.flush()
+        assert writer.pending == 0
+        assert len(request.posts) == 1
+        url, kwargs = request.posts[0]
+        assert url == '/write'
+        assert kwargs['data'] == b'mymeas value=1i\nmymeas value=2i\nmymeas value=3i\n'
+        writer.close()
+
+    def test_flush_per_database_success(self):
+        request = FakeRequest()
+        writer = BatchWriter(request=request, flush_interval=60)
+        writer.write('mymeas value=1i', database='db1')
+        writer.write('mymeas value=2i', database='db2')
+        writer.close()
+        databases = sorted(kwargs['params']['db'] for _, kwargs in request.posts)
+        assert databases == ['db1', 'db2']
+
+    def test_split_by_batch_size_success(self):
+        batches = list(split_batches(['m v=1i', 'm v=2i', 'm v=3i'], batch_size=2))
+        assert batches == [['m v=1i', 'm v=2i'], ['m v=3i']]
+
+    def test_split_by_batch_bytes_success(self):
+        batches = list(split_batches(['m v=1i', 'm v=2i'], max_batch_bytes=10))
+        assert batches == [['m v=1i'], ['m v=2i']]
+
+    def test_flush_when_batch_is_full_success(self):
+        request = FakeRequest()
+        writer = BatchWriter(request=request, batch_size=2, flush_interval=60)
+        writer.write(['m v=1i', 'm v=2i'])
+        for _ in range(50):
+            if request.posts:
+                break
+            time.sleep(0.01)
+        assert len(request.posts) == 1
+        writer.close()
+
+    def test_failed_flush_success(self):
+        errors = []
+        writer = BatchWriter(
+            request=FakeRequest(fail_with=exceptions.InfluxDBConnectionError('unreachable')),
+            flush_interval=60,
+            on_error=errors.append,
+        )
+        writer.write('mymeas value=1i')
+        writer.flush()
+        assert writer.failed_count == 1
+        assert len(writer.failed_flushes) == 1
+        failed_flush = writer.failed_flushes[0]
+        assert failed_flush.points == 'mymeas value=1i\n'
+        assert isinstance(failed_flush.exception, exceptions.InfluxDBConnectionError)
+        assert errors == [failed_flush]
+        writer.close()
+
+    def test_write_after_close_fail(self):
+        writer = BatchWriter(request=FakeRequest())
+        writer.close()
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            writer.write('mymeas value=1i')
+
+    def test_invalid_options_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            BatchWriter(batch_size=0)
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            BatchWriter(flush_interval=-1)
+
+    def test_measurement_save_with_writer_success(self):
+        request = FakeRequest()
+        measurement_cls = self.create_measurement_class()
+        with BatchWriter(request=request, flush_interval=60) as writer:
+            assert measurement_cls(value=10).save(writer=writer) is True
+            assert measurement_cls.bulk_save(
+                [measurement_cls(value=20), measurement_cls(value=30)],
+                writer=writer,
+            ) is True
+            assert writer.pending == 3
+        assert len(request.posts) == 1
+
+    def test_measurement_save_with_precision_success(self):
+        class MySecondsMeasurement(Measurement):
+            measurement_name = 'mysamplemeasurement'
+            time = attributes.TimestampFieldAttribute(precision='s')
+            value = attributes.IntegerFieldAttribute()
+
+        request = FakeRequest()
+        with BatchWriter(request=request, flush_interval=60) as writer:
+            MySecondsMeasurement(time=1570481055, value=10).save(writer=writer)
+            writer.write('mymeas value=1i')
+        posts = sorted((kwargs['params']['precision'], kwargs['data']) for _, kwargs in request.posts)
+        assert posts == [
+            ('ns', b'mymeas value=1i\n'),
+            ('s', b'mysamplemeasurement value=10i 1570481055\n'),
+        ]
+
+    def test_measurement_write_dataframe_with_writer_success(self):
+        request = FakeRequest()
+        measurement_cls = self.create_measurement_class()
+        df = pd.DataFrame({'value': [1, 2, 3]})
+        with BatchWriter(request=request, flush_interval=60) as writer:
+            res = measurement_cls.write_dataframe(df, batch_size=2, writer=writer)
+            assert res is True
+            assert writer.pending == 3
+        _, kwargs = request.posts[0]
+        assert kwargs['data'] == (
+            b'mysamplemeasurement value=1i\n'
+            b'mysamplemeasurement value=2i\n'
+            b'mysamplemeasurement value=3i\n'
+        )
+
+    def test_write_batches_success(self):
+        request = FakeRequest()
+        batches = split_batches(['m v={}i'.format(i) for i in range(10)], batch_size=3)
+        result = write_batches(batches, request=request, max_workers=2)
+        assert result
+        assert result.nb_points == 10
+        assert [b.index for b in result.batches] == [0, 1, 2, 3]
+        assert [b.nb_points for b in result.batches] == [3, 3, 3, 1]
+        assert len(request.posts) == 4
+
+    def test_write_batches_failed_success(self):
+        result = write_batches([['m v=1i']], request=FakeRequest(fail_with=exceptions.InfluxDBConnectionError('unreachable')))
+        assert not result
+        assert len(result.failed_batches) == 1
+        with pytest.raises(exceptions.InfluxDBBulkSaveError):
+            result.raise_if_error()
+
+    def test_write_batches_invalid_workers_fail(self):
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            write_batches([['m v=1i']], request=FakeRequest(), max_workers=0)
+
+    def test_write_stream_success(self):
+        request = FakeRequest()
+        lines = ('m v={}i'.format(i) for i in range(3))
+        result = write_stream(lines, request=request)
+        assert result
+        assert result.nb_points == 3
+        assert len(request.posts) == 1
+        _, kwargs = request.posts[0]
+        assert kwargs['data'] == b'm v=0i\nm v=1i\nm v=2i\n'
+
+    def test_write_stream_failed_success(self):
+        result = write_stream(iter(['m v=1i']), request=FakeRequest(fail_with=exceptions.InfluxDBConnectionError('unreachable')))
+        assert not result
+        assert len(result.failed_batches) == 1
+
+    def test_measurement_bulk_save_generator_with_writer_success(self):
+        request = FakeRequest()
+        measurement_cls = self.create_measurement_class()
+        points = (measurement_cls(value=i) for i in range(5))
+        with BatchWriter(request=request, flush_interval=60) as writer:
+            res = measurement_cls.bulk_save(points, writer=writer, batch_size=2)
+            assert res is True
+            assert writer.pending == 5
+
+    def test_measurement_bulk_save_invalid_point_fail(self):
+        measurement_cls = self.create_measurement_class()
+        points = iter([measurement_cls(value=1), True])
+        with pytest.raises(exceptions.InfluxDBAttributeValueError):
+            with BatchWriter(request=FakeRequest(), flush_interval=60) as writer:
+                measurement_cls.bulk_save(points, writer=writer)
+
+    def test_measurement_write_rows_with_writer_success(self):
+        request = FakeRequest()
+        measurement_cls = self.create_measurement_class()
+        with BatchWriter(request=request, flush_interval=60) as writer:
+            res = measurement_cls.write_rows([(1,), {'value': 2}], writer=writer)
+            assert res is True
+        _, kwargs = request.posts[0]
+        assert kwargs['data'] == b'mysamplemeasurement value=1i\nmysamplemeasurement value=2i\n'
+
+    def test_split_grouped_batches_success(self):
+        items = [('a', 'm v=1i'), ('b', 'm v=2i'), ('a', 'm v=3i'), ('a', 'm v=4i')]
+        batches = list(split_grouped_batches(items, batch_size=2))
+        assert batches == [('a', ['m v=1i', 'm v=3i']), ('a', ['m v=4i']), ('b', ['m v=2i'])]
+
+    def test_write_grouped_batches_success(self):
+        request = FakeRequest()
+        grouped_batches = [
+            (WriteGroup('db1', 'rp1', 's'), ['m v=1i']),
+            (WriteGroup('db2'), ['m v=2i']),
+        ]
+        result = write_grouped_batches(grouped_batches, max_workers=2, request=request)
+        assert result.nb_points == 2
+        params = sorted(
+            (kwargs['params']['db'], kwargs['params'].get('rp'), kwargs['params']['precision'])
+            for _, kwargs in request.posts
+        )
+        assert params == [('db1', 'rp1', 's'), ('db2', None, 'ns')]
+
+    def test_write_measurements_of_many_classes_success(self):
+        class MyCpuMeasurement(Measurement):
+            measurement_name = 'cpu'
+            database = 'db1'
+            retention_policy = 'one_week'
+            value = attributes.IntegerFieldAttribute()
+
+        class MyMemMeasurement(Measurement):
+            measurement_name = 'mem'
+            database = 'db2'
+            time = attributes.TimestampFieldAttribute(precision='s')
+            value = attributes.IntegerFieldAttribute()
+
+        request = FakeRequest()
+        points = [
+            MyCpuMeasurement(value=1),
+            MyMemMeasurement(time=1570481055, value=2),
+            MyCpuMeasurement(value=3),
+        ]
+        with BatchWriter(request=request, flush_interval=60, max_workers=2) as writer:
+            assert Measurement.bulk_save(points, writer=writer) is True
+        posts = sorted(
+            (kwargs['params']['db'], kwargs['params'].get('rp'),
+             kwargs['params']['precision'], kwargs['data'])
+            for _, kwargs in request.posts
+        )
+        assert posts == [
+            ('db1', 'one_week', 'ns', b'cpu value=1i\ncpu value=3i\n'),
+            ('db2', None, 's', b'mem value=2i 1570481055\n'),
+        ]
+
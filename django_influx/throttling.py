@@ -0,0 +1,235 @@
+import logging
+import threading
+import time
+from .exceptions import InfluxDBAttributeValueError, InfluxDBInvalidChoiceError, \
+    InfluxDBWriteThrottledError
+from .writer import DEFAULT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_BATCH_SIZE = 100
+
+
+class Overflow:
+    BLOCK = 'block'
+    DROP = 'drop'
+    RAISE = 'raise'
+
+
+OVERFLOW_CHOICES = (Overflow.BLOCK, Overflow.DROP, Overflow.RAISE)
+
+
+class TokenBucket:
+    """
+    Bucket refilled with `rate` tokens per second, holding at most
+    `capacity` tokens (`rate` by default, i.e. one second of burst).
+
+    Tokens are reserved even when the bucket does not hold enough of them,
+    the bucket going into debt, so that requests larger than its capacity
+    are delayed instead of never being served. Not thread-safe on its own.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        if not isinstance(rate, (int, float)) or rate <= 0:
+            raise InfluxDBAttributeValueError('rate must be a positive number')
+        capacity = rate if capacity is None else capacity
+        if not isinstance(capacity, (int, float)) or capacity <= 0:
+            raise InfluxDBAttributeValueError('capacity must be a positive number')
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self._timestamp = clock()
+
+    def refill(self):
+        now = self.clock()
+        elapsed = now - self._timestamp
+        self._timestamp = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def get_delay(self, amount):
+        """Seconds to wait before `amount` tokens are available."""
+        self.refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount):
+        self.tokens -= amount
+
+
+class AdaptiveBatchSize:
+    """
+    Batch size adapted to the observed /write latency: it grows by
+    `increase_step` points while latency stays under `target_latency`
+    seconds and is multiplied by `decrease_factor` when it rises above
+    (additive increase, multiplicative decrease).
+    """
+
+    def __init__(
+        self,
+        target_latency,
+        min_size=DEFAULT_MIN_BATCH_SIZE,
+        max_size=DEFAULT_BATCH_SIZE,
+        increase_step=None,
+        decrease_factor=0.5,
+    ):
+        if not isinstance(target_latency, (int, float)) or target_latency <= 0:
+            raise InfluxDBAttributeValueError('target_latency must be a positive number')
+        if type(min_size) != int or type(max_size) != int or not 0 < min_size <= max_size:
+            raise InfluxDBAttributeValueError('min_size and max_size must be ordered positive integers')
+        if not 0 < decrease_factor < 1:
+            raise InfluxDBAttributeValueError('decrease_factor must be between 0 and 1')
+        self.target_latency = target_latency
+        self.min_size = min_size
+        self.max_size = max_size
+        self.increase_step = increase_step or max(1, max_size // 20)
+        self.decrease_factor = decrease_factor
+        self.size = max_size
+        self._lock = threading.Lock()
+
+    def observe(self, latency):
+        with self._lock:
+            if latency <= self.target_latency:
+                self.size = min(self.max_size, self.size + self.increase_step)
+            else:
+                self.size = max(self.min_size, int(self.size * self.decrease_factor))
+
+
+class WriteScheduler:
+    """
+    Admission control in front of InfluxDBApi.write_points, holding a token
+    bucket for `points_per_second` and one for `bytes_per_second`
+    (uncompressed), each one allowing bursts of `burst` seconds.
+
+    When a write exceeds the rate, `overflow` decides what happens:
+
+    - 'block': the caller waits for the tokens, at most `max_wait` seconds
+      (no limit when None), then InfluxDBWriteThrottledError is raised
+    - 'drop': the points are dropped and counted in `dropped_points`;
+      write_points returns False, and batch writes report the batch as
+      failed with InfluxDBWriteDroppedError
+    - 'raise': InfluxDBWriteThrottledError is raised at once
+
+    Streamed writes always block, chunk by chunk. InfluxDBWriteThrottledError
+    is a transient error, so batches are retried or spooled by writers.
+
+    With a `target_latency`, the latency of every /write is fed to an
+    AdaptiveBatchSize that BatchWriter uses to size its batches.
+    """
+
+    def __init__(
+        self,
+        points_per_second=None,
+        bytes_per_second=None,
+        burst=1.0,
+        overflow=Overflow.BLOCK,
+        max_wait=None,
+        target_latency=None,
+        min_batch_size=DEFAULT_MIN_BATCH_SIZE,
+        max_batch_size=DEFAULT_BATCH_SIZE,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        if overflow not in OVERFLOW_CHOICES:
+            msg = 'overflow `{}` must be one of value of {}'.format(
+                overflow,
+                OVERFLOW_CHOICES,
+            )
+            raise InfluxDBInvalidChoiceError(msg)
+        if not isinstance(burst, (int, float)) or burst <= 0:
+            raise InfluxDBAttributeValueError('burst must be a positive number')
+        self.points_bucket = None
+        self.bytes_bucket = None
+        if points_per_second is not None:
+            self.points_bucket = TokenBucket(points_per_second, points_per_second * burst, clock)
+        if bytes_per_second is not None:
+            self.bytes_bucket = TokenBucket(bytes_per_second, bytes_per_second * burst, clock)
+        self.overflow = overflow
+        self.max_wait = max_wait
+        self.adaptive_batch_size = None
+        if target_latency is not None:
+            self.adaptive_batch_size = AdaptiveBatchSize(
+                target_latency,
+                min_size=min_batch_size,
+                max_size=max_batch_size,
+            )
+        self.sleep = sleep
+        self.throttled_seconds = 0.0
+        self.dropped_points = 0
+        self.dropped_batches = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<WriteScheduler {} points/s {} bytes/s {}>'.format(
+            self.points_bucket.rate if self.points_bucket else None,
+            self.bytes_bucket.rate if self.bytes_bucket else None,
+            self.overflow,
+        )
+
+    def get_batch_size(self, batch_size):
+        if self.adaptive_batch_size is None:
+            return batch_size
+        return min(batch_size, self.adaptive_batch_size.size)
+
+    def observe(self, latency):
+        if self.adaptive_batch_size is not None:
+            self.adaptive_batch_size.observe(latency)
+
+    def _reserve(self, nb_points, nb_bytes, overflow):
+        """Reserves tokens and returns the seconds to wait, or None to drop."""
+        buckets = [
+            (bucket, amount)
+            for bucket, amount in ((self.points_bucket, nb_points), (self.bytes_bucket, nb_bytes))
+            if bucket is not None
+        ]
+        with self._lock:
+            delay = max([bucket.get_delay(amount) for bucket, amount in buckets] or [0.0])
+            if delay > 0:
+                if overflow == Overflow.DROP:
+                    self.dropped_points += nb_points
+                    self.dropped_batches += 1
+                    return None
+                if overflow == Overflow.RAISE or (
+                    self.max_wait is not None and delay > self.max_wait
+                ):
+                    raise InfluxDBWriteThrottledError(delay)
+                self.throttled_seconds += delay
+            for bucket, amount in buckets:
+                bucket.consume(amount)
+        return delay
+
+    def acquire(self, nb_points, nb_bytes, overflow=None):
+        """
+        Waits until `nb_points` points of `nb_bytes` bytes may be written.
+        Returns False when they must be dropped.
+        """
+        delay = self._reserve(nb_points, nb_bytes, overflow or self.overflow)
+        if delay is None:
+            logger.warning('Write rate exceeded, dropped %d points', nb_points)
+            return False
+        if delay > 0:
+            self.sleep(delay)
+        return True
+
+    def throttle_chunks(self, chunks):
+        return ThrottledChunks(self, chunks)
+
+
+class ThrottledChunks:
+    """
+    Chunks of a streamed /write body, each one waiting for its tokens
+    before being sent. `waited` is the number of seconds spent waiting, so
+    that it is not taken for the latency of InfluxDB.
+    """
+
+    def __init__(self, scheduler, chunks):
+        self.scheduler = scheduler
+        self.chunks = chunks
+        self.waited = 0.0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            delay = self.scheduler._reserve(chunk.count(b'\n'), len(chunk), Overflow.BLOCK)
+            if delay > 0:
+                self.scheduler.sleep(delay)
+                self.waited += delay
+            yield chunk
@@ -0,0 +1,128 @@
+import logging
+import os
+import socket
+import threading
+from .exceptions import InfluxDBAttributeValueError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UDP_PORT = 8089
+DEFAULT_UDP_MTU = 1400
+MAX_DATAGRAM_SIZE = 65507
+
+
+def pack_datagrams(data, mtu=DEFAULT_UDP_MTU):
+    """
+    Packs newline separated points into datagrams of at most `mtu` bytes,
+    without splitting a point across datagrams. A point larger than `mtu`
+    is sent alone.
+    """
+    datagram = []
+    datagram_size = 0
+    for line in data.split(b'\n'):
+        if not line:
+            continue
+        line_size = len(line) + 1
+        if datagram and datagram_size + line_size > mtu:
+            yield b''.join(datagram)
+            datagram = []
+            datagram_size = 0
+        datagram.append(line)
+        datagram.append(b'\n')
+        datagram_size += line_size
+    if datagram:
+        yield b''.join(datagram)
+
+
+class UDPClient:
+    """
+    Stands for an InfluxDBRequest to send /write bodies to the UDP listener
+    of InfluxDB, packed into datagrams of at most `mtu` bytes.
+
+    The socket is non-blocking: datagrams that cannot be sent at once are
+    dropped and counted, as are points too large for a datagram. Since the
+    listener writes to the database and precision of its configuration,
+    writes to another database or precision are refused.
+    """
+
+    gzip = False
+    write_profiler = None
+    query_cache = None
+
+    def __init__(
+        self,
+        host,
+        port=DEFAULT_UDP_PORT,
+        database_name=None,
+        precision='ns',
+        mtu=DEFAULT_UDP_MTU,
+    ):
+        if type(mtu) != int or not 0 < mtu <= MAX_DATAGRAM_SIZE:
+            raise InfluxDBAttributeValueError(
+                'mtu must be a positive integer up to {}'.format(MAX_DATAGRAM_SIZE)
+            )
+        self.host = host
+        self.port = port
+        self.database_name = database_name
+        self.precision = precision
+        self.mtu = mtu
+        self.sent_datagrams = 0
+        self.dropped_datagrams = 0
+        self._socket = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<UDPClient {}:{}>'.format(self.host, self.port)
+
+    def _get_socket(self):
+        if self._socket is None or self._pid != os.getpid():
+            udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp_socket.setblocking(False)
+            udp_socket.connect((self.host, self.port))
+            self._socket = udp_socket
+            self._pid = os.getpid()
+        return self._socket
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def check_params(self, params):
+        database = params.get('db')
+        if database is not None and database != self.database_name:
+            raise InfluxDBAttributeValueError(
+                'the UDP listener writes to `{}`, not `{}`'.format(self.database_name, database)
+            )
+        precision = params.get('precision', 'ns')
+        if precision != self.precision:
+            raise InfluxDBAttributeValueError(
+                'the UDP listener expects the precision `{}`, not `{}`'.format(
+                    self.precision,
+                    precision,
+                )
+            )
+
+    def post(self, url, params=None, data=b'', headers=None, **kwargs):
+        if url != '/write':
+            raise InfluxDBAttributeValueError('only /write requests can be sent over UDP')
+        self.check_params(params or {})
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = b''.join(data)
+        sent = dropped = 0
+        with self._lock:
+            udp_socket = self._get_socket()
+            for datagram in pack_datagrams(bytes(data), self.mtu):
+                if len(datagram) > MAX_DATAGRAM_SIZE:
+                    dropped += 1
+                    continue
+                try:
+                    udp_socket.send(datagram)
+                    sent += 1
+                except OSError:
+                    dropped += 1
+            self.sent_datagrams += sent
+            self.dropped_datagrams += dropped
+        if dropped:
+            logger.warning('Dropped %d of %d UDP datagrams', dropped, sent + dropped)
@@ -0,0 +1,604 @@
+import atexit
+import logging
+import threading
+import time
+import weakref
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from .api import InfluxDBApi
+from .builder import LineProtocolBuilder
+from .coalesce import LineBuffer, validate_coalesce
+from .downsampling import AggregationBuffer
+from .exceptions import InfluxDBAttributeValueError, InfluxDBBulkSaveError, \
+    InfluxDBInvalidChoiceError, InfluxDBWriteDroppedError
+from .retry import get_transient_lines, write_lines
+from .sharding import ShardRouter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_MAX_BATCH_BYTES = 4 * 1024 * 1024
+
+FailedFlush = namedtuple(
+    'FailedFlush',
+    ['database', 'points', 'exception', 'timestamp', 'precision', 'retention_policy'],
+    defaults=('ns', None),
+)
+
+
+class Transport:
+    HTTP = 'http'
+    UDP = 'udp'
+
+
+TRANSPORT_CHOICES = (Transport.HTTP, Transport.UDP)
+
+
+def validate_transport(transport):
+    if transport not in TRANSPORT_CHOICES:
+        msg = 'transport `{}` must be one of value of {}'.format(
+            transport,
+            TRANSPORT_CHOICES,
+        )
+        raise InfluxDBInvalidChoiceError(msg)
+
+
+class WriteGroup(namedtuple(
+    'WriteGroup',
+    ['database', 'retention_policy', 'precision', 'transport'],
+    defaults=(None, None, 'ns', Transport.HTTP),
+)):
+    """Destination of a /write request, sent over `transport`."""
+
+    def get_params(self):
+        return {
+            'database': self.database,
+            'retention_policy_name': self.retention_policy,
+            'precision': self.precision,
+        }
+
+
+_live_writers = weakref.WeakSet()
+
+
+def get_default_request(transport=Transport.HTTP):
+    from .app import Influxable
+    return Influxable.get_instance().connection.get_write_request(transport)
+
+
+def get_write_schedulers(request):
+    """
+    WriteSchedulers of the requests actually writing to InfluxDB for
+    `request`: those of the nodes of a ShardRouter, or of the direct write
+    request of the connection for an AggregatorClient.
+    """
+    from .aggregator import AggregatorClient, get_direct_write_request
+    if isinstance(request, AggregatorClient):
+        request = get_direct_write_request()
+    node_requests = request.requests.values() if isinstance(request, ShardRouter) else [request]
+    schedulers = [getattr(node_request, 'write_scheduler', None) for node_request in node_requests]
+    return [scheduler for scheduler in schedulers if scheduler is not None]
+
+
+def validate_batch_options(batch_size, max_batch_bytes):
+    if type(batch_size) != int or batch_size <= 0:
+        raise InfluxDBAttributeValueError('batch_size must be a positive integer')
+    if type(max_batch_bytes) != int or max_batch_bytes <= 0:
+        raise InfluxDBAttributeValueError('max_batch_bytes must be a positive integer')
+
+
+def split_batches(lines, batch_size=DEFAULT_BATCH_SIZE, max_batch_bytes=DEFAULT_MAX_BATCH_BYTES):
+    batch = []
+    batch_bytes = 0
+    for line in lines:
+        line_bytes = len(line) + 1
+        if batch and (len(batch) >= batch_size
+                      or batch_bytes + line_bytes > max_batch_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(line)
+        batch_bytes += line_bytes
+    if batch:
+        yield batch
+
+
+def split_grouped_batches(
+    items,
+    batch_size=DEFAULT_BATCH_SIZE,
+    max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+):
+    """
+    Splits (group, line) items into (group, batch) pairs, each batch only
+    holding lines of its group. A batch is yielded as soon as it is full,
+    the remaining ones once `items` is exhausted.
+    """
+    batches = {}
+    for group, line in items:
+        line_bytes = len(line) + 1
+        batch = batches.get(group)
+        if batch is None:
+            batch = batches[group] = [[], 0]
+        elif len(batch[0]) >= batch_size or batch[1] + line_bytes > max_batch_bytes:
+            yield group, batch[0]
+            batch[0], batch[1] = [], 0
+        batch[0].append(line)
+        batch[1] += line_bytes
+    for group, (lines, _) in batches.items():
+        if lines:
+            yield group, lines
+
+
+class BatchResult(namedtuple(
+    'BatchResult',
+    ['index', 'nb_points', 'nb_bytes', 'exception', 'rejected', 'group'],
+    defaults=((), None),
+)):
+    @property
+    def success(self):
+        return self.exception is None and not self.rejected
+
+
+class BulkSaveResult:
+    def __init__(self, batches=None):
+        self.batches = sorted(batches or [], key=lambda b: b.index)
+
+    def __repr__(self):
+        return '<BulkSaveResult {} points in {} batches, {} failed>'.format(
+            self.nb_points,
+            len(self.batches),
+            len(self.failed_batches),
+        )
+
+    def __bool__(self):
+        return not self.failed_batches
+
+    @property
+    def nb_points(self):
+        return sum(b.nb_points for b in self.batches)
+
+    @property
+    def nb_bytes(self):
+        return sum(b.nb_bytes for b in self.batches)
+
+    @property
+    def failed_batches(self):
+        return [b for b in self.batches if not b.success]
+
+    @property
+    def dropped_batches(self):
+        return [b for b in self.batches if isinstance(b.exception, InfluxDBWriteDroppedError)]
+
+    @property
+    def rejected_lines(self):
+        return [line for b in self.batches for line in b.rejected]
+
+    def raise_if_error(self):
+        if self.failed_batches:
+            raise InfluxDBBulkSaveError(self)
+
+
+def write_grouped_batches(
+    grouped_batches,
+    max_workers=1,
+    request=None,
+    retry_policy=None,
+    bisect=True,
+):
+    """
+    Writes each (group, batch) pair, a batch being a list of lines or a
+    LineProtocolBuilder, with one /write request to the database,
+    retention policy and precision of its WriteGroup, on up to `max_workers`
+    threads sharing the connection pool of `request`. Batches are pulled
+    lazily, at most two per worker being in flight.
+
+    Transient errors are retried according to `retry_policy`, and batches
+    rejected because of malformed lines are bisected (see write_lines).
+    """
+    if type(max_workers) != int or max_workers <= 0:
+        raise InfluxDBAttributeValueError('max_workers must be a positive integer')
+
+    def send(index, group, lines):
+        if isinstance(lines, LineProtocolBuilder):
+            nb_lines, nb_bytes = lines.nb_points, lines.nb_bytes
+        else:
+            nb_lines, nb_bytes = len(lines), sum(len(line) + 1 for line in lines)
+        exception = None
+        rejected = ()
+        try:
+            rejected = write_lines(
+                request or get_default_request(group.transport),
+                lines,
+                retry_policy=retry_policy,
+                bisect=bisect,
+                **group.get_params()
+            )
+        except Exception as err:
+            exception = err
+        nb_points = nb_lines - len(rejected)
+        return BatchResult(index, nb_points, nb_bytes, exception, tuple(rejected), group)
+
+    if max_workers == 1:
+        return BulkSaveResult([
+            send(index, group, batch)
+            for index, (group, batch) in enumerate(grouped_batches)
+        ])
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for index, (group, batch) in enumerate(grouped_batches):
+            if len(pending) >= max_workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(f.result() for f in done)
+            pending.add(executor.submit(send, index, group, batch))
+        done, _ = wait(pending)
+        results.extend(f.result() for f in done)
+    return BulkSaveResult(results)
+
+
+def write_batches(
+    batches,
+    database=None,
+    max_workers=1,
+    request=None,
+    retry_policy=None,
+    bisect=True,
+    precision='ns',
+    retention_policy=None,
+    transport=Transport.HTTP,
+):
+    """Writes batches of lines sharing the same destination."""
+    group = WriteGroup(database, retention_policy, precision, transport)
+    return write_grouped_batches(
+        ((group, batch) for batch in batches),
+        max_workers=max_workers,
+        request=request,
+        retry_policy=retry_policy,
+        bisect=bisect,
+    )
+
+
+def write_stream(
+    lines,
+    database=None,
+    request=None,
+    precision='ns',
+    retention_policy=None,
+    transport=Transport.HTTP,
+):
+    """
+    Writes every line with a single /write request whose body is streamed
+    with chunked transfer encoding, so `lines` is consumed lazily and never
+    held in memory as a whole. Since the body cannot be sent twice, the
+    request is neither retried nor bisected.
+    """
+    counter = {'nb_points': 0, 'nb_bytes': 0}
+
+    def count(lines):
+        for line in lines:
+            counter['nb_points'] += 1
+            counter['nb_bytes'] += len(line) + 1
+            yield line
+
+    exception = None
+    try:
+        InfluxDBApi.write_points(
+            request or get_default_request(transport),
+            count(lines),
+            database=database,
+            precision=precision,
+            retention_policy_name=retention_policy,
+        )
+    except Exception as err:
+        exception = err
+    if isinstance(exception, InfluxDBAttributeValueError):
+        raise exception
+    batch = BatchResult(0, counter['nb_points'], counter['nb_bytes'], exception)
+    return BulkSaveResult([batch])
+
+
+class BatchWriter:
+    """
+    Buffers line protocol points in memory and writes them to InfluxDB in
+    batches, either when a batch reaches `batch_size` points or
+    `max_batch_bytes` bytes, or every `flush_interval` seconds.
+
+    Flushes that raise are kept in `failed_flushes` (and passed to
+    `on_error` when given) instead of being raised in the caller thread.
+    When a `spool` is given, batches that failed because InfluxDB was
+    unreachable are appended to it, to be replayed later.
+
+    Points are buffered per destination (database, retention policy,
+    precision and transport, see WriteGroup), so a single writer can serve many
+    Measurement classes; on flush, destinations are written in parallel on
+    up to `max_workers` threads. Points written with `coalesce` are
+    deduplicated by series key and timestamp while they are buffered (see
+    LineBuffer). Points written with `downsampling` are folded into one
+    point per series and window (see AggregationBuffer), a window being
+    flushed once it has ended, or on close. Points arriving after their
+    window was flushed start a new aggregate of it, which overwrites the
+    flushed one in InfluxDB.
+
+    Batches are capped by the adaptive batch size of the WriteScheduler of
+    the request, if any.
+
+    Transient errors are retried according to `retry_policy` before a flush
+    is considered failed. Malformed lines are isolated by bisecting the
+    batch and kept in `rejected_lines` (and passed to `on_reject`).
+    """
+
+    def __init__(
+        self,
+        request=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+        flush_interval=1.0,
+        max_failed_flushes=100,
+        on_error=None,
+        spool=None,
+        retry_policy=None,
+        bisect=True,
+        max_rejected_lines=1000,
+        on_reject=None,
+        max_workers=4,
+    ):
+        self.validate_options(batch_size, max_batch_bytes, flush_interval)
+        if type(max_workers) != int or max_workers <= 0:
+            raise InfluxDBAttributeValueError('max_workers must be a positive integer')
+        self.request = request
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.flush_interval = flush_interval
+        self.on_error = on_error
+        self.spool = spool
+        self.retry_policy = retry_policy
+        self.bisect = bisect
+        self.on_reject = on_reject
+        self.max_workers = max_workers
+        self.failed_flushes = deque(maxlen=max_failed_flushes)
+        self.rejected_lines = deque(maxlen=max_rejected_lines)
+        self.flush_count = 0
+        self.failed_count = 0
+        self.rejected_count = 0
+        self._buffers = {}
+        self._nb_points = 0
+        self._nb_bytes = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._executor = None
+        _live_writers.add(self)
+
+    @staticmethod
+    def validate_options(batch_size, max_batch_bytes, flush_interval):
+        validate_batch_options(batch_size, max_batch_bytes)
+        if not isinstance(flush_interval, (int, float)) or flush_interval <= 0:
+            raise InfluxDBAttributeValueError('flush_interval must be a positive number')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def pending(self):
+        return self._nb_points
+
+    def write(
+        self,
+        points,
+        database=None,
+        precision='ns',
+        coalesce=None,
+        retention_policy=None,
+        downsampling=None,
+        transport=Transport.HTTP,
+    ):
+        if self._closed:
+            raise InfluxDBAttributeValueError('the writer is closed')
+        validate_coalesce(coalesce)
+        validate_transport(transport)
+        if coalesce is not None and downsampling is not None:
+            raise InfluxDBAttributeValueError('coalesce and downsampling cannot be combined')
+        if isinstance(points, str):
+            # not splitlines(): \r and other separators are legal in string fields
+            points = points.split('\n')
+        lines = [p for p in points if p]
+        if not lines:
+            return
+        with self._lock:
+            group = WriteGroup(database, retention_policy, precision, transport)
+            key = (group, coalesce, downsampling)
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                if downsampling is not None:
+                    buffer = AggregationBuffer(downsampling, precision)
+                else:
+                    buffer = LineBuffer(coalesce)
+                self._buffers[key] = buffer
+            nb_points, nb_bytes = len(buffer), buffer.nb_bytes
+            buffer.extend(lines)
+            self._nb_points += len(buffer) - nb_points
+            self._nb_bytes += buffer.nb_bytes - nb_bytes
+            is_full = self._nb_points >= self.batch_size \
+                or self._nb_bytes >= self.max_batch_bytes
+        self._ensure_thread()
+        if is_full:
+            self._wakeup.set()
+
+    def write_measurements(self, points, database=None):
+        """
+        Buffers Measurement instances of any class, each one being routed
+        to the destination of its class unless `database` is given.
+        """
+        groups = {}
+        for point in points:
+            key = type(point).get_write_key(database)
+            groups.setdefault(key, []).append(point.get_prep_value())
+        for (group, coalesce, downsampling), lines in groups.items():
+            self.write(
+                lines,
+                database=group.database,
+                precision=group.precision,
+                coalesce=coalesce,
+                retention_policy=group.retention_policy,
+                downsampling=downsampling,
+                transport=group.transport,
+            )
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                buffers = self._buffers
+                self._buffers = {}
+                self._nb_points = 0
+                self._nb_bytes = 0
+                if not self._closed:
+                    self._keep_open_windows(buffers)
+            batch_size = self._get_batch_size() if buffers else self.batch_size
+            batches = [
+                (group, batch)
+                for (group, _, _), buffer in buffers.items()
+                for batch in split_batches(buffer.lines(), batch_size, self.max_batch_bytes)
+            ]
+            if len(batches) <= 1 or self.max_workers == 1:
+                for group, batch in batches:
+                    self._send(group, batch)
+                return
+            executor = self._get_executor()
+            futures = []
+            for group, batch in batches:
+                try:
+                    futures.append(executor.submit(self._send, group, batch))
+                except RuntimeError:
+                    # no new futures can be scheduled once the interpreter exits
+                    self._send(group, batch)
+            wait(futures)
+            for future in futures:
+                future.result()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        try:
+            self.flush()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+            _live_writers.discard(self)
+
+    def _keep_open_windows(self, buffers):
+        for key, buffer in buffers.items():
+            if isinstance(buffer, AggregationBuffer):
+                open_buffer = buffer.split()
+                if len(open_buffer):
+                    self._buffers[key] = open_buffer
+                    self._nb_points += len(open_buffer)
+                    self._nb_bytes += open_buffer.nb_bytes
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='influx-batch-writer',
+                )
+            return self._executor
+
+    def _get_request(self, transport=Transport.HTTP):
+        return self.request or get_default_request(transport)
+
+    def _get_batch_size(self):
+        """`batch_size`, capped by the smallest adaptive size of the WriteSchedulers."""
+        schedulers = get_write_schedulers(self._get_request())
+        return min((scheduler.get_batch_size(self.batch_size) for scheduler in schedulers), default=self.batch_size)
+
+    def _send(self, group, lines):
+        try:
+            rejected = write_lines(
+                self._get_request(group.transport),
+                lines,
+                retry_policy=self.retry_policy,
+                bisect=self.bisect,
+                **group.get_params()
+            )
+            with self._stats_lock:
+                self.flush_count += 1
+        except Exception as err:
+            # through a ShardRouter, only the lines of the failed nodes
+            lines = getattr(err, 'lines', lines)
+            str_points = '\n'.join(lines) + '\n'
+            failed_flush = FailedFlush(
+                group.database,
+                str_points,
+                err,
+                time.time(),
+                group.precision,
+                group.retention_policy,
+            )
+            with self._stats_lock:
+                self.failed_count += 1
+                self.failed_flushes.append(failed_flush)
+            logger.warning('Failed to flush %d points: %s', len(lines), err)
+            transient_lines = get_transient_lines(err, lines)
+            if self.spool is not None and transient_lines:
+                self.spool.append(
+                    '\n'.join(transient_lines) + '\n',
+                    database=group.database,
+                    retention_policy=group.retention_policy,
+                    precision=group.precision,
+                )
+            if self.on_error is not None:
+                self.on_error(failed_flush)
+            return
+        if rejected:
+            with self._stats_lock:
+                self.rejected_count += len(rejected)
+                self.rejected_lines.extend(rejected)
+            logger.warning('InfluxDB rejected %d of %d points', len(rejected), len(lines))
+            if self.on_reject is not None:
+                self.on_reject(rejected)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name='influx-batch-writer',
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._closed:
+                break
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Unexpected error in the batch writer')
+
+
+@atexit.register
+def _close_live_writers():
+    for writer in list(_live_writers):
+        writer.close()